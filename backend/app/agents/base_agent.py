@@ -1,11 +1,22 @@
 import asyncio
+import hashlib
 import json
+import time
 from abc import ABC
+from collections import Counter
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from ..ai.ag2_engine import AgenticDecisionEngine
+from ..ai.circuit_breaker import llm_breaker
+from ..ai.decision_memory import decision_memory
 from ..ai.groq_client import groq_client
+from ..ai.hedging import LatencyTracker, hedged_race
+from ..ai.id_aliases import IdAliasTable, drop_stale_entries, record_ids
+from ..ai.model_router import model_router
+from ..ai.rate_limiter import estimate_tokens
+from ..ai.structured_output import SchemaValidationError, validate_decision
+from ..ai.usage import llm_call_scope, usage_ledger
 from ..core.config import settings
 
 class BaseAgent(ABC):
@@ -17,6 +28,39 @@ class BaseAgent(ABC):
         self.is_active = True
         self.last_action_time: Optional[str] = None
         self.decision_engine = AgenticDecisionEngine(agent_type)
+        self.primary_latency = LatencyTracker()
+        # Per-cycle counters (e.g. LLM calls avoided by deterministic policies).
+        self.cycle_counters: Counter = Counter()
+        self.last_cycle_counters: Dict[str, int] = {}
+        self.total_counters: Counter = Counter()
+        # Sub-task -> (time, resolved decision) served while the LLM circuit is open.
+        self.last_known_good: Dict[str, Tuple[float, Any]] = {}
+        # Sub-task -> fingerprint of the last-known-good decision and inputs last served.
+        self.lkg_served: Dict[str, str] = {}
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.cycle_counters[name] += amount
+
+    @property
+    def over_budget(self) -> bool:
+        """True once this agent type used its LLM token budget for the rolling window."""
+        return usage_ledger.over_budget(self.agent_type)
+
+    @property
+    def budget_exhausted(self) -> bool:
+        """Skip LLM calls entirely (``LLM_BUDGET_ACTION`` heuristic/both) while over budget."""
+        return settings.LLM_BUDGET_ACTION in {"heuristic", "both"} and self.over_budget
+
+    @property
+    def heuristic_only(self) -> bool:
+        """Decide with local heuristics only: budget exhausted or the LLM circuit is open."""
+        return self.budget_exhausted or not llm_breaker.accepting
+
+    def next_interval(self) -> float:
+        """Seconds until the next cycle, lengthened while over the token budget."""
+        if settings.LLM_BUDGET_ACTION in {"throttle", "both"} and self.over_budget:
+            return settings.AGENT_UPDATE_INTERVAL * settings.LLM_BUDGET_THROTTLE_FACTOR
+        return settings.AGENT_UPDATE_INTERVAL
     
     async def log_action(self, action: str, details: Dict[str, Any], status: str = "completed"):
         """Log agent action to Supabase"""
@@ -147,50 +191,167 @@ class BaseAgent(ABC):
             print(f"Error calculating reasoning similarity: {e}")
             return False
     
-    async def make_decision(self, prompt: str, response_format: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Make a decision using AG2 (Groq-backed) with Supabase logging."""
+    @staticmethod
+    def build_alias_table(
+        context: Dict[str, Any],
+        id_sources: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    ) -> IdAliasTable:
+        """Build the per-decision UUID alias table from the context and caller records."""
+        aliases = IdAliasTable()
+        aliases.register_records("inventory", context.get("recent_inventory", []))
+        aliases.register_records("fleet", context.get("recent_fleet", []))
+        aliases.register_records("orders", context.get("recent_orders", []))
+        for kind, records in (id_sources or {}).items():
+            aliases.register_records(kind, records)
+        return aliases
+
+    async def make_decision(
+        self,
+        prompt: str,
+        response_format: Dict[str, Any],
+        id_sources: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        expected_items: Optional[int] = None,
+        task: Optional[str] = None,
+        urgency: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Make a decision using AG2 (Groq-backed) with Supabase logging.
+
+        ``id_sources`` maps table names (``inventory``, ``orders``, ``fleet``...) to the
+        records embedded in ``prompt`` so their UUIDs are aliased with the right prefix.
+        ``expected_items`` (default: the largest ``id_sources`` list) sizes the reply's
+        token budget. ``task`` names the agent sub-task (e.g. ``check_low_stock``) and,
+        with ``urgency``, picks the model through ``ModelRouter``.
+        """
+        if task:
+            try:
+                remembered = decision_memory.recall(task, id_sources, response_format)
+            except Exception as memory_error:
+                print(f"❌ [DECISION MEMORY ERROR] {self.agent_id} - Error: {memory_error}")
+                remembered = None
+            if remembered:
+                decision, similarity = remembered
+                print(f"🧠 [DECISION MEMORY] {self.agent_id} - reusing a similar decision for {task} (similarity {similarity:.2f})")
+                self.count("memory_decisions_reused")
+                return await self.record_decision(prompt, decision, response_format, source="memory")
+
+        if self.budget_exhausted:
+            print(f"⏸️ [TOKEN BUDGET] {self.agent_id} over budget - skipping LLM for {task or 'decision'}")
+            self.count("llm_calls_skipped_budget")
+            return None
+        if not llm_breaker.allow():
+            return await self.degraded_decision(task, id_sources)
+
+        scope = llm_call_scope.set((self.agent_id, self.agent_type, task or "unknown"))
         try:
             print(f"\n🤖 [AGENT DECISION] {self.agent_id} ({self.agent_type})")
             print(f"📋 Prompt: {prompt[:200]}{'...' if len(prompt) > 200 else ''}")
 
+            if expected_items is None and id_sources:
+                expected_items = max(len(records or []) for records in id_sources.values())
+
             context = await self.get_context()
-            enhanced_prompt = (
+            aliases = self.build_alias_table(context, id_sources)
+            context = json.loads(aliases.encode(json.dumps(context)))
+            enhanced_prompt = aliases.encode(
                 "Current System Context:\n"
                 f"{json.dumps(context, indent=2)}\n"
                 "Decision Request:\n"
                 f"{prompt}\n"
-                "Please analyze the context and provide a decision in the specified format."
+                "Please analyze the context and provide a decision in the specified format.\n"
+                "Record identifiers are short aliases such as I1 or V3; copy them exactly as given."
             )
 
+            model = model_router.select(task, estimate_tokens([{"content": enhanced_prompt}], 0), urgency)
+            print(f"🧭 Model: {model} (task: {task or 'unknown'})")
             print(f"📋 Enhanced Prompt: {enhanced_prompt[:300]}{'...' if len(enhanced_prompt) > 300 else ''}")
             print(f"📋 Response Format: {json.dumps(response_format, indent=2)}")
 
-            decision: Optional[Any] = None
+            schema_errors: Dict[str, List[str]] = {}
 
-            if self.decision_engine.is_configured:
-                decision = await self.decision_engine.a_make_decision(
+            def checked(source: str, result: Optional[Any]) -> Optional[Any]:
+                # Malformed output counts as no answer, so the other path can still win.
+                if result is None:
+                    return None
+                try:
+                    validate_decision(result, response_format)
+                except SchemaValidationError as error:
+                    print(f"⚠️ [SCHEMA REJECTED] {self.agent_id} ({source}) - {error}")
+                    schema_errors[source] = error.errors[:20]
+                    return None
+                return result
+
+            async def primary() -> Optional[Any]:
+                return checked("primary", await self.decision_engine.a_make_decision(
                     context=context,
                     prompt=enhanced_prompt,
                     response_format=response_format,
-                )
-                if decision:
-                    print(f"✅ [AG2 DECISION SUCCESS] {self.agent_id}")
+                    expected_items=expected_items,
+                    model=model,
+                ))
 
-            if not decision:
-                decision = await groq_client.get_structured_response(
+            async def fallback() -> Optional[Any]:
+                return checked("fallback", await groq_client.get_structured_response(
                     enhanced_prompt,
                     response_format,
                     temperature=settings.GROQ_TEMPERATURE,
-                )
-                if decision:
-                    print(f"✅ [GROQ FALLBACK SUCCESS] {self.agent_id}")
+                    expected_items=expected_items,
+                    model=model,
+                ))
+
+            started = time.monotonic()
+            decision, winner = await hedged_race(
+                primary if self.decision_engine.is_configured else None,
+                fallback,
+                deadline=settings.AGENT_DECISION_DEADLINE,
+                hedge_delay=self.primary_latency.hedge_delay(),
+                primary_latency=self.primary_latency,
+            )
+            if decision or schema_errors:
+                # A malformed answer is still an answer; only silence counts against the LLM.
+                llm_breaker.record_success(time.monotonic() - started)
+            else:
+                llm_breaker.record_failure("no answer before the deadline")
+            if winner == "primary":
+                print(f"✅ [AG2 DECISION SUCCESS] {self.agent_id}")
+            elif winner == "fallback":
+                print(f"✅ [GROQ FALLBACK SUCCESS] {self.agent_id}")
 
+            if schema_errors:
+                await self.log_action("schema_rejected", {"errors": schema_errors}, "rejected")
             if not decision:
                 print(f"❌ [AGENT DECISION FAILED] {self.agent_id} - No decision returned from LLM")
                 return None
 
+            decision, rejected = aliases.resolve_decision(decision)
+            if rejected:
+                print(f"⚠️ [ALIAS REJECTED] {self.agent_id} - {len(rejected)} entries referenced unknown IDs")
+                await self.log_action("alias_rejected", {"rejected": rejected}, "rejected")
+            if not decision:
+                print(f"❌ [AGENT DECISION FAILED] {self.agent_id} - Decision referenced unknown IDs")
+                return None
+
             print(f"📊 Decision: {json.dumps(decision, indent=2)}")
+            if task:
+                self.last_known_good[task] = (time.time(), decision)
+                decision_memory.remember(self.agent_type, task, id_sources, decision)
+
+            return await self.record_decision(prompt, decision, response_format)
+        except Exception as e:
+            print(f"❌ [AGENT DECISION ERROR] {self.agent_id} - Error: {e}")
+            await self.log_action("decision_error", {"error": str(e)}, "error")
+            return None
+        finally:
+            llm_call_scope.reset(scope)
 
+    async def record_decision(
+        self,
+        prompt: str,
+        decision: Any,
+        response_format: Dict[str, Any],
+        source: str = "llm",
+    ) -> Any:
+        """Drop duplicate entries, then log the decision and store it as a pending action."""
+        try:
             # Duplicate avoidance
             if isinstance(decision, dict):
                 if await self.check_for_duplicate_decision(decision):
@@ -210,7 +371,7 @@ class BaseAgent(ABC):
 
             await self.log_action(
                 "decision_made",
-                {"prompt": prompt, "decision": decision, "response_format": response_format},
+                {"prompt": prompt, "decision": decision, "response_format": response_format, "source": source},
             )
 
             action_data = {
@@ -232,20 +393,70 @@ class BaseAgent(ABC):
             await self.log_action("decision_error", {"error": str(e)}, "error")
             return None
 
+    async def degraded_decision(
+        self, task: Optional[str], id_sources: Optional[Dict[str, List[Dict[str, Any]]]] = None
+    ) -> Optional[Any]:
+        """Last-known-good decision for ``task`` while the LLM circuit is open.
+
+        Entries referencing ids that are no longer among the current ``id_sources``
+        records are dropped, so a stale decision never acts on orders or vehicles
+        that have moved on. A decision is served once per change of its inputs.
+        Returns None when nothing recent enough (or new) is left.
+        """
+        self.count("llm_calls_short_circuited")
+        saved = self.last_known_good.get(task or "")
+        if not saved or time.time() - saved[0] > settings.LLM_LKG_MAX_AGE:
+            print(f"🔌 [LLM CIRCUIT OPEN] {self.agent_id} - no last-known-good decision for {task or 'decision'}")
+            return None
+        decision = drop_stale_entries(saved[1], record_ids(id_sources))
+        if not decision:
+            print(f"🔌 [LLM CIRCUIT OPEN] {self.agent_id} - last-known-good decision for {task} is stale")
+            return None
+        # Callers act on what they get each cycle; replaying the same decision on the
+        # same inputs would queue its actions again.
+        fingerprint = hashlib.sha1(
+            json.dumps([saved[0], decision, id_sources], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        if self.lkg_served.get(task or "") == fingerprint:
+            print(f"🔌 [LLM CIRCUIT OPEN] {self.agent_id} - last-known-good decision for {task} already served")
+            self.count("lkg_decisions_repeated")
+            return None
+        self.lkg_served[task or ""] = fingerprint
+        print(f"🔌 [LLM CIRCUIT OPEN] {self.agent_id} - serving last-known-good decision for {task}")
+        self.count("lkg_decisions_served")
+        await self.log_action("degraded_decision", {"task": task, "decision": decision, "source": "last_known_good"})
+        return decision
+
+    async def run_cycle(self) -> bool:
+        """Run one ``process()`` pass and roll its counters into the totals."""
+        self.cycle_counters = Counter()
+        try:
+            return await self.process()
+        finally:
+            usage_ledger.flush()
+            self.last_cycle_counters = dict(self.cycle_counters)
+            self.total_counters.update(self.cycle_counters)
+            if self.last_cycle_counters:
+                print(f"📈 [CYCLE COUNTERS] {self.agent_id} - {self.last_cycle_counters}")
+                await self.log_action("cycle_counters", self.last_cycle_counters)
+
     async def run(self) -> None:
         """Background execution loop for autonomous behaviour."""
         print(f"▶️  Starting loop for {self.agent_id} ({self.agent_type})")
         try:
             while self.is_active:
                 try:
-                    await self.process()
+                    await self.run_cycle()
                     self.last_action_time = datetime.utcnow().isoformat()
                 except asyncio.CancelledError:
                     raise
                 except Exception as loop_error:
                     print(f"❌ [AGENT LOOP ERROR] {self.agent_id} - {loop_error}")
                     await self.log_action("loop_error", {"error": str(loop_error)}, "error")
-                await asyncio.sleep(settings.AGENT_UPDATE_INTERVAL)
+                interval = self.next_interval()
+                if interval > settings.AGENT_UPDATE_INTERVAL:
+                    print(f"⏸️ [TOKEN BUDGET] {self.agent_id} over budget - next cycle in {interval:.0f}s")
+                await asyncio.sleep(interval)
         except asyncio.CancelledError:
             pass
         finally:
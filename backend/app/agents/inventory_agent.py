@@ -1,6 +1,7 @@
 import asyncio
 from typing import Dict, Any, Optional, List
 from .base_agent import BaseAgent
+from ..services.inventory_policy import inventory_policy, reorder_threshold
 # Avoid circular import by importing broadcast_agent_action lazily inside methods
 from datetime import datetime
 
@@ -35,12 +36,25 @@ class InventoryAgent(BaseAgent):
             inventory_response = self.supabase.table("inventory").select("*").execute()
             inventory = inventory_response.data if inventory_response.data else []
             
-            low_stock_items = [item for item in inventory if item.get("quantity", 0) < item.get("min_threshold", 10)]
+            low_stock_items = [item for item in inventory if item.get("quantity", 0) < reorder_threshold(item)]
             
             if low_stock_items:
+                policy = inventory_policy.reorder(
+                    low_stock_items, self.get_recent_orders(), escalate=not self.heuristic_only
+                )
+                for rec in policy.decided:
+                    await self.create_reorder_action(rec)
+                self.count("policy_reorder_decisions", len(policy.decided))
+                if not policy.escalated:
+                    self.count("llm_calls_avoided")
+                    return
+                self.count("llm_escalated_items", len(policy.escalated))
+
                 prompt = f"""
                 Analyze the following low stock items and determine reorder quantities:
-                {low_stock_items}
+                {policy.escalated}
+                
+                These items sit close to their reorder point; decide whether and how much to reorder.
                 
                 Consider:
                 - Current demand patterns
@@ -71,7 +85,7 @@ class InventoryAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(prompt, response_format, id_sources={"inventory": policy.escalated}, task="check_low_stock")
                 
                 if decision:
                     # Create separate reorder actions for each recommendation
@@ -89,6 +103,15 @@ class InventoryAgent(BaseAgent):
             # Create a fallback action on error
             await self.create_inventory_check_action()
     
+    def get_recent_orders(self, limit: int = 500) -> List[Dict[str, Any]]:
+        """Recent orders used by the policy engine to estimate per-item demand."""
+        try:
+            orders_response = self.supabase.table("orders").select("*").order("created_at", desc=True).limit(limit).execute()
+            return orders_response.data if orders_response.data else []
+        except Exception as e:
+            print(f"Error fetching recent orders: {e}")
+            return []
+
     async def optimize_inventory(self):
         """Optimize inventory levels based on demand patterns"""
         try:
@@ -130,7 +153,7 @@ class InventoryAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(prompt, response_format, id_sources={"orders": recent_orders}, task="optimize_inventory")
                 
                 if decision:
                     # Create separate actions for each optimization recommendation
@@ -173,11 +196,25 @@ class InventoryAgent(BaseAgent):
             if not expiring_items:
                 await self.log_action("expiry_check", {"status": "no_expiring_items_detected"})
                 return
+
+            policy = inventory_policy.expiry(
+                expiring_items, self.get_recent_orders(), escalate=not self.heuristic_only
+            )
+            for rec in policy.decided:
+                await self.create_expiry_action(rec)
+            self.count("policy_expiry_decisions", len(policy.decided))
+            if not policy.escalated:
+                self.count("llm_calls_avoided")
+                return
+            self.count("llm_escalated_items", len(policy.escalated))
+            expiring_items = policy.escalated
             
             prompt = f"""
             The following inventory items are expired or close to expiry (<= 3 days):
             {expiring_items}
             
+            Expected sales before expiry roughly match the stock on hand, so the right action is unclear.
+            
             Recommend the best course of action for each item. Options include donation,
             clearance sale, disposal, or maintaining stock if justified. Provide reasoning,
             urgency, and expected impact on waste/cost.
@@ -206,7 +243,7 @@ class InventoryAgent(BaseAgent):
                 },
             }
             
-            decision = await self.make_decision(prompt, response_format)
+            decision = await self.make_decision(prompt, response_format, id_sources={"inventory": expiring_items}, task="handle_expired_items")
             if decision:
                 for rec in decision.get("expiry_recommendations", []):
                     await self.create_expiry_action(rec)
@@ -260,7 +297,7 @@ class InventoryAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(prompt, response_format, id_sources={"inventory": inventory}, task="handle_inventory_optimization")
                 
                 if decision:
                     # Create separate actions for each recommendation
@@ -7,6 +7,7 @@ from .inventory_agent import InventoryAgent
 from .routing_agent import RoutingAgent
 from .pricing_agent import PricingAgent
 from ..core.supabase import supabase_client
+from ..ai.usage import usage_ledger
 
 class AgentManager:
     def __init__(self):
@@ -40,6 +41,10 @@ class AgentManager:
                 "routing": RoutingAgent(),
                 "pricing": PricingAgent()
             }
+
+            # Build LLM configs / AG2 agents now so the first cycle doesn't pay for it
+            for agent in self.agents.values():
+                agent.decision_engine.warm_up()
             
             # Log agent initialization
             await self.log_manager_action("agents_initialized", {
@@ -110,7 +115,10 @@ class AgentManager:
                 status[agent_id] = {
                     "is_active": agent.is_active,
                     "agent_type": agent.agent_type,
-                    "last_action_time": agent.last_action_time
+                    "last_action_time": agent.last_action_time,
+                    "last_cycle_counters": agent.last_cycle_counters,
+                    "total_counters": dict(agent.total_counters),
+                    "token_usage": usage_ledger.agent_usage(agent.agent_type),
                 }
             
             return {
@@ -82,7 +82,12 @@ class PricingAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(
+                    prompt,
+                    response_format,
+                    id_sources={"orders": recent_orders, "inventory": inventory},
+                    task="analyze_market_conditions",
+                )
                 
                 if decision:
                     await self.log_action("market_analysis", decision)
@@ -143,7 +148,12 @@ class PricingAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(
+                    prompt,
+                    response_format,
+                    id_sources={"inventory": inventory, "orders": recent_orders},
+                    task="optimize_inventory_pricing",
+                )
                 
                 if decision:
                     await self.execute_pricing_updates(decision.get("pricing_recommendations", []))
@@ -203,7 +213,7 @@ class PricingAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(prompt, response_format, id_sources={"inventory": dynamic_pricing_items}, task="handle_dynamic_pricing")
                 
                 if decision:
                     await self.execute_dynamic_pricing_updates(decision.get("dynamic_pricing_recommendations", []))
@@ -1,12 +1,28 @@
 import asyncio
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from .base_agent import BaseAgent
+from ..core.config import settings
+from ..services.assignment import AssignmentResult, assignment_engine
+from ..services.distance_matrix import distance_matrix
+from ..services.eta import eta_engine
+from ..services.geo import merchant_depots, order_demand, order_location
+from ..services.load_planner import load_planner
+from ..services.order_clusters import OrderClusterer, order_clusters
+from ..services.rebalancer import fleet_rebalancer
+from ..services.replanner import OPEN_ORDER_STATUSES, incremental_replanner
+from ..services.route_commit import commit_stats
+from ..services.spatial_index import fleet_index
+from ..services.vrp_solver import VRPSolution, stops_from_orders, vehicles_from_fleet, vrp_solver
 # Avoid circular import by importing broadcast_agent_action lazily inside methods
 
 class RoutingAgent(BaseAgent):
     def __init__(self, agent_id: str = "bb0e8400-e29b-41d4-a716-446655440001"):
         super().__init__(agent_id, "route_optimization")
+        # Unassigned orders are a different set from the pending backlog the global clusterer tracks.
+        self.assignment_clusters = OrderClusterer()
+        self.last_rebalance: Optional[float] = None
     
     async def process(self) -> bool:
         """Process routing and delivery optimization decisions"""
@@ -19,6 +35,9 @@ class RoutingAgent(BaseAgent):
             
             # Handle dynamic routing updates
             await self.handle_dynamic_routing()
+
+            # Reposition idle vehicles toward forecast demand
+            await self.rebalance_fleet()
             
             return True
         except Exception as e:
@@ -35,8 +54,18 @@ class RoutingAgent(BaseAgent):
             # Get available fleet
             fleet_response = self.supabase.table("fleet").select("*").eq("status", "available").execute()
             available_fleet = fleet_response.data if fleet_response.data else []
+            # Vehicles that moved since the last cycle refresh their rows in cached matrices.
+            distance_matrix.track_positions(available_fleet)
             
-            if pending_orders and available_fleet:
+            if pending_orders and available_fleet and settings.ROUTING_ENGINE == "local":
+                await self.solve_routes_locally(pending_orders, available_fleet)
+            elif pending_orders and available_fleet:
+                load_plan = await asyncio.to_thread(load_planner.pack, pending_orders, available_fleet)
+                plan_stats = load_plan.stats()
+                print(
+                    f"📦 [LOAD] {plan_stats['orders_packed']} orders packed into {plan_stats['vehicles_used']} vehicles "
+                    f"({plan_stats['utilization']:.0%} full), {plan_stats['orders_unpacked']} over capacity"
+                )
                 prompt = f"""
                 Optimize delivery routes for the following orders and available fleet:
                 
@@ -46,6 +75,15 @@ class RoutingAgent(BaseAgent):
                 Available Fleet:
                 {available_fleet}
                 
+                Capacity-feasible load plan (vehicle -> orders, in item units):
+                {load_plan.as_prompt()}
+                
+                Orders that do not fit any vehicle this cycle:
+                {load_plan.unpacked}
+                
+                Keep each vehicle's assigned orders within its capacity; start from the load plan
+                and only move orders between vehicles when the totals still fit.
+                
                 Consider:
                 - Order priorities and delivery windows
                 - Vehicle capacity and capabilities
@@ -84,14 +122,116 @@ class RoutingAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(
+                    prompt,
+                    response_format,
+                    id_sources={"orders": pending_orders, "fleet": available_fleet},
+                    task="optimize_routes",
+                )
                 
                 if decision:
-                    await self.create_route_assignments(decision.get("route_assignments", []))
+                    route_assignments = decision.get("route_assignments", [])
+                    overloaded = load_planner.enforce(route_assignments, pending_orders, available_fleet)
+                    if overloaded:
+                        print(f"📦 [LOAD] Dropped {len(overloaded)} orders the LLM put over vehicle capacity")
+                        self.count("orders_over_capacity", len(overloaded))
+                    await self.create_route_assignments(route_assignments)
         
         except Exception as e:
             print(f"Error optimizing routes: {e}")
     
+    def cluster_batches(
+        self, orders: List[Dict[str, Any]], fleet: List[Dict[str, Any]], clusters: OrderClusterer = order_clusters
+    ) -> List[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """Split a very large backlog into per-cluster ``(orders, fleet)`` problems; others stay whole.
+
+        Batches route about a quarter more km than one whole solve (each uses only its
+        depot's vehicles), so they are only worth it once the whole solve gets slow.
+        """
+        clusters.sync(orders, fleet)
+        if len(orders) <= settings.ROUTING_CLUSTER_MIN_BACKLOG:
+            return [(orders, fleet)]
+        batches = [(batch.orders, batch.fleet) for batch in clusters.partition(orders, fleet) if batch.fleet]
+        self.count("order_batches", len(batches))
+        return batches
+
+    @staticmethod
+    def solve_routes(orders: List[Dict[str, Any]], fleet: List[Dict[str, Any]]) -> Tuple[VRPSolution, List[str]]:
+        stops, unlocated = stops_from_orders(orders, fleet)
+        return vrp_solver.solve(stops, vehicles_from_fleet(fleet)), unlocated
+
+    async def solve_routes_locally(self, pending_orders: List[Dict[str, Any]], available_fleet: List[Dict[str, Any]]):
+        """Plan routes with the local VRP solver, one thread per order cluster; the LLM at most explains them."""
+        started = time.perf_counter()
+        batches = self.cluster_batches(pending_orders, available_fleet)
+        # CPU-bound for large instances; keep the event loop (and the other agents) responsive.
+        results = await asyncio.gather(*(asyncio.to_thread(self.solve_routes, orders, fleet) for orders, fleet in batches))
+        solution = VRPSolution(
+            routes=[route for result, _ in results for route in result.routes],
+            unassigned=[order_id for result, _ in results for order_id in result.unassigned],
+            seconds=time.perf_counter() - started,
+        )
+        batched = sum(len(orders) for orders, _ in batches)
+        unlocated = [order_id for _, missing in results for order_id in missing]
+        stats = solution.stats()
+        print(
+            f"🗺️ [VRP] {stats['routes']} routes, {stats['stops_routed']} stops routed, "
+            f"{stats['unassigned'] + len(unlocated) + len(pending_orders) - batched} left pending "
+            f"in {stats['seconds']:.3f}s ({len(batches)} batches)"
+        )
+        self.count("vrp_routes", stats["routes"])
+        self.count("vrp_stops_routed", stats["stops_routed"])
+        self.count("llm_calls_avoided")
+
+        assignments = [route.as_assignment() for route in solution.routes]
+        if assignments and settings.ROUTING_LLM_EXPLANATIONS:
+            await self.explain_routes(assignments, available_fleet)
+        await self.create_route_assignments(assignments)
+        await self.log_action("routes_optimized", {**stats, "unlocated_orders": len(unlocated)})
+
+    async def explain_routes(self, assignments: List[Dict[str, Any]], available_fleet: List[Dict[str, Any]]):
+        """Ask the LLM for a short dispatcher-facing explanation of each solved route."""
+        summary = [
+            {key: assignment[key] for key in ("vehicle_id", "vehicle_type", "assigned_orders", "estimated_distance", "estimated_duration")}
+            for assignment in assignments
+        ]
+        prompt = f"""
+        These delivery routes were already computed by the route optimizer. Do not change them.
+        {summary}
+        
+        For each vehicle, explain in one or two sentences why its route makes sense for a dispatcher.
+        """
+        response_format = {
+            "type": "object",
+            "properties": {
+                "route_explanations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "vehicle_id": {"type": "string"},
+                            "explanation": {"type": "string"},
+                        },
+                    },
+                }
+            },
+        }
+        planned_fleet = {assignment["vehicle_id"] for assignment in assignments}
+        decision = await self.make_decision(
+            prompt,
+            response_format,
+            id_sources={"fleet": [vehicle for vehicle in available_fleet if vehicle.get("id") in planned_fleet]},
+            task="explain_routes",
+        )
+        explanations = {
+            entry.get("vehicle_id"): entry.get("explanation")
+            for entry in (decision or {}).get("route_explanations", [])
+            if entry.get("explanation")
+        }
+        for assignment in assignments:
+            if assignment["vehicle_id"] in explanations:
+                assignment["reasoning"] = f"{assignment['reasoning']} {explanations[assignment['vehicle_id']]}"
+
     async def assign_vehicles(self):
         """Assign vehicles to orders based on capacity and requirements"""
         try:
@@ -103,15 +243,38 @@ class RoutingAgent(BaseAgent):
             fleet_response = self.supabase.table("fleet").select("*").eq("status", "available").execute()
             available_vehicles = fleet_response.data if fleet_response.data else []
             
-            if unassigned_orders and available_vehicles:
+            if unassigned_orders and available_vehicles and settings.ROUTING_ENGINE == "local":
+                await self.assign_vehicles_locally(unassigned_orders, available_vehicles)
+            elif unassigned_orders and available_vehicles:
+                fleet_index.sync(available_vehicles)
+                candidates = self.candidate_vehicles(unassigned_orders, available_vehicles)
+                if not candidates:
+                    return
+                shortlisted_ids = {vehicle_id for options in candidates.values() for vehicle_id, _ in options}
+                shortlisted = [vehicle for vehicle in available_vehicles if vehicle.get("id") in shortlisted_ids]
+                orders_with_candidates = [
+                    {
+                        **order,
+                        "candidate_vehicles": [
+                            {"vehicle_id": vehicle_id, "distance_km": round(km, 2)} for vehicle_id, km in candidates[order["id"]]
+                        ],
+                    }
+                    for order in unassigned_orders
+                    if order.get("id") in candidates
+                ]
+                self.count(
+                    "vehicle_pairs_pruned",
+                    len(unassigned_orders) * len(available_vehicles) - sum(len(options) for options in candidates.values()),
+                )
                 prompt = f"""
-                Assign vehicles to the following unassigned orders:
+                Assign vehicles to the following unassigned orders. Each order lists its
+                nearest vehicles with enough capacity; only assign one of its candidate_vehicles.
                 
                 Unassigned Orders:
-                {unassigned_orders}
+                {orders_with_candidates}
                 
                 Available Vehicles:
-                {available_vehicles}
+                {shortlisted}
                 
                 Consider:
                 - Order size and vehicle capacity
@@ -143,20 +306,99 @@ class RoutingAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(
+                    prompt,
+                    response_format,
+                    id_sources={"orders": orders_with_candidates, "fleet": shortlisted},
+                    task="assign_vehicles",
+                )
                 
                 if decision:
-                    await self.execute_vehicle_assignments(decision.get("vehicle_assignments", []))
+                    allowed = {order_id: {vehicle_id for vehicle_id, _ in options} for order_id, options in candidates.items()}
+                    await self.execute_vehicle_assignments([
+                        assignment
+                        for assignment in decision.get("vehicle_assignments", [])
+                        if assignment.get("vehicle_id") in allowed.get(assignment.get("order_id"), ())
+                    ])
         
         except Exception as e:
             print(f"Error assigning vehicles: {e}")
     
+    async def assign_vehicles_locally(self, unassigned_orders: List[Dict[str, Any]], available_vehicles: List[Dict[str, Any]]):
+        """Match orders to vehicles with the min-cost assignment engine instead of the LLM, per order cluster."""
+        started = time.perf_counter()
+        batches = self.cluster_batches(unassigned_orders, available_vehicles, self.assignment_clusters)
+        results = await asyncio.gather(*(asyncio.to_thread(assignment_engine.solve, orders, fleet) for orders, fleet in batches))
+        result = AssignmentResult(
+            assignments=[assignment for part in results for assignment in part.assignments],
+            unassigned=[order_id for part in results for order_id in part.unassigned],
+            cost=sum(part.cost for part in results),
+            seconds=time.perf_counter() - started,
+        )
+        stats = result.stats()
+        print(
+            f"🚚 [Assignment] {stats['assigned']} orders matched, {len(unassigned_orders) - stats['assigned']} left pending "
+            f"in {stats['seconds']:.3f}s ({len(batches)} batches)"
+        )
+        self.count("orders_matched", stats["assigned"])
+        self.count("llm_calls_avoided")
+        await self.execute_vehicle_assignments(result.assignments)
+
+    def candidate_vehicles(
+        self, orders: List[Dict[str, Any]], fleet: List[Dict[str, Any]]
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """Nearest available vehicles that can carry each order, from the fleet spatial index.
+
+        Orders that cannot be located or that no vehicle can carry are left out.
+        """
+        depots = merchant_depots(fleet)
+        candidates = {}
+        for order in orders:
+            location = order_location(order, depots)
+            if location is None or not order.get("id"):
+                continue
+            options = fleet_index.nearest(location[0], location[1], min_capacity=order_demand(order))
+            if options:
+                candidates[order["id"]] = options
+        return candidates
+
     async def handle_dynamic_routing(self):
-        """Handle dynamic routing updates for in-progress deliveries"""
+        """Re-plan only the active routes hit by a vehicle issue, a delay or a new urgent order"""
         try:
-            # Get in-progress deliveries
-            orders_response = self.supabase.table("orders").select("*").eq("status", "in_transit").execute()
-            in_transit_orders = orders_response.data if orders_response.data else []
+            routes_response = self.supabase.table("routes").select("*").eq("status", "active").execute()
+            fleet_response = self.supabase.table("fleet").select("*").execute()
+            pending_response = self.supabase.table("orders").select("*").eq("status", "pending").execute()
+            fleet = fleet_response.data if fleet_response.data else []
+            pending_orders = pending_response.data if pending_response.data else []
+            open_orders = {}
+            for status in OPEN_ORDER_STATUSES:
+                response = self.supabase.table("orders").select("*").eq("status", status).execute()
+                open_orders.update({order["id"]: order for order in response.data or []})
+
+            incremental_replanner.sync(routes_response.data or [])
+            eta_sync = await asyncio.to_thread(eta_engine.sync, routes_response.data or [], fleet, open_orders.keys())
+            self.count("eta_routes_reanchored", eta_sync["reanchored"])
+            events = incremental_replanner.detect(fleet, open_orders, pending_orders)
+            if not events:
+                return
+            self.count("route_events", len(events))
+
+            if settings.ROUTING_ENGINE == "local":
+                result = await asyncio.to_thread(incremental_replanner.replan, events, fleet, open_orders, pending_orders)
+                stats = result.stats()
+                print(
+                    f"🔁 [Replan] {stats['events']} events, {stats['routes_replanned']} routes re-planned, "
+                    f"{stats['orders_moved']} orders moved, {stats['orders_released']} released in {stats['seconds']:.4f}s"
+                )
+                self.count("routes_replanned", stats["routes_replanned"])
+                self.count("llm_calls_avoided")
+                await self.apply_route_changes(result)
+                return
+
+            # LLM mode: only the orders behind this cycle's events are sent for review.
+            incremental_replanner.acknowledge(events)
+            affected = {order_id for event in events for order_id in event.order_ids}
+            in_transit_orders = [order for order in [*open_orders.values(), *pending_orders] if order.get("id") in affected]
             
             if in_transit_orders:
                 prompt = f"""
@@ -165,6 +407,9 @@ class RoutingAgent(BaseAgent):
                 In-Transit Orders:
                 {in_transit_orders}
                 
+                Events on their routes:
+                {[{"kind": event.kind, "order_ids": event.order_ids} for event in events]}
+                
                 Consider:
                 - Traffic conditions and delays
                 - Customer requests for time changes
@@ -195,7 +440,7 @@ class RoutingAgent(BaseAgent):
                     }
                 }
                 
-                decision = await self.make_decision(prompt, response_format)
+                decision = await self.make_decision(prompt, response_format, id_sources={"orders": in_transit_orders}, task="handle_dynamic_routing")
                 
                 if decision:
                     await self.execute_dynamic_updates(decision.get("dynamic_updates", []))
@@ -203,50 +448,251 @@ class RoutingAgent(BaseAgent):
         except Exception as e:
             print(f"Error handling dynamic routing: {e}")
     
-    async def create_route_assignments(self, assignments: List[Dict[str, Any]]):
-        """Create route assignments in the system"""
+    async def rebalance_fleet(self):
+        """Free vehicles whose work is done and move idle ones toward forecast demand, every ROUTING_REBALANCE_INTERVAL"""
         try:
-            for assignment in assignments:
-                assignment_data = {
+            interval = settings.ROUTING_REBALANCE_INTERVAL
+            if interval <= 0 or (self.last_rebalance is not None and time.monotonic() - self.last_rebalance < interval):
+                return
+            self.last_rebalance = time.monotonic()
+
+            fleet_response = self.supabase.table("fleet").select("*").execute()
+            fleet = fleet_response.data if fleet_response.data else []
+            busy = set()
+            for status in OPEN_ORDER_STATUSES:
+                response = self.supabase.table("orders").select("*").eq("status", status).execute()
+                busy.update(order.get("vehicle_id") for order in response.data or [] if order.get("vehicle_id"))
+
+            # Assigned vehicles with nothing left to deliver return to the pool and close their routes.
+            released = [vehicle for vehicle in fleet if vehicle.get("status") in ("assigned", "in_transit") and vehicle.get("id") not in busy]
+            for vehicle in released:
+                self.supabase.table("fleet").update({"status": "available"}).eq("id", vehicle["id"]).execute()
+                routes = self.supabase.table("routes").select("*").eq("vehicle_id", vehicle["id"]).eq("status", "active").execute()
+                for route in routes.data or []:
+                    self.supabase.table("routes").update({"status": "completed"}).eq("id", route["id"]).execute()
+                vehicle["status"] = "available"
+            self.count("vehicles_released", len(released))
+
+            since = fleet_rebalancer.since().isoformat()
+            recent_response = self.supabase.table("orders").select("*").gte("created_at", since).execute()
+            idle = [vehicle for vehicle in fleet if vehicle.get("status") == "available"]
+            plan = await asyncio.to_thread(fleet_rebalancer.plan, recent_response.data or [], idle, fleet)
+            # Moves are proposals for dispatch; positions keep coming from the vehicles' GPS.
+            # A new plan replaces the previous one that was never acted on.
+            pending = self.supabase.table("agent_actions").select("*").eq("action_type", "fleet_rebalance").eq("status", "pending").execute()
+            for action in pending.data or []:
+                self.supabase.table("agent_actions").update({
+                    "status": "superseded",
+                    "updated_at": datetime.utcnow().isoformat(),
+                }).eq("id", action["id"]).execute()
+            if plan.moves:
+                action_data = {
                     "agent_id": self.agent_id,
-                    "action_type": "route_assignment",
-                    "payload": assignment,
+                    "action_type": "fleet_rebalance",
+                    "target_table": "fleet",
+                    "payload": {"moves": [move.as_dict() for move in plan.moves], "stats": plan.stats()},
                     "status": "pending",
-                    "created_at": datetime.utcnow().isoformat()
+                    "created_at": datetime.utcnow().isoformat(),
                 }
-
-                result = self.supabase.table("agent_actions").insert(assignment_data).execute()
+                self.supabase.table("agent_actions").insert(action_data).execute()
                 # Avoid circular import by importing broadcast_agent_action lazily inside methods
                 from app.main import broadcast_agent_action
+                broadcast_agent_action(action_data)
+            fleet_rebalancer.record(plan)
+
+            stats = plan.stats()
+            print(
+                f"🧭 [Rebalance] {len(released)} vehicles released, {stats['moves']} of {stats['idle_vehicles']} idle proposed to move "
+                f"({stats['distance_km']:.1f} km, {stats['unmet_slots']} unmet) in {stats['seconds']:.4f}s"
+            )
+            self.count("rebalance_moves", stats["moves"])
+            if plan.moves or released:
+                await self.log_action("fleet_rebalance", {
+                    **stats,
+                    "released": [vehicle["id"] for vehicle in released],
+                    "moves": [move.as_dict() for move in plan.moves],
+                })
+        
+        except Exception as e:
+            print(f"Error rebalancing fleet: {e}")
+    
+    async def apply_route_changes(self, result):
+        """Write re-planned routes and the orders that moved between them"""
+        try:
+            for change in result.changes.values():
+                self.supabase.table("routes").update({
+                    "route_points": {"points": change.route_points},
+                    "status": change.status,
+                }).eq("id", change.route_id).execute()
+                await self.log_action("dynamic_routing_update", change.as_update())
+
+            for order_id, update in result.order_updates.items():
+                self.supabase.table("orders").update(update).eq("id", order_id).execute()
+        
+        except Exception as e:
+            print(f"Error applying route changes: {e}")
+    
+    async def create_route_assignments(self, assignments: List[Dict[str, Any]], resolve: bool = True) -> int:
+        """Commit route assignments in one transaction; returns the number of orders committed.
+
+        Vehicles are claimed only while still ``available`` and orders only while still
+        ``pending``; assignments whose vehicle was taken are re-solved or rejected in bulk.
+        """
+        try:
+            committed, conflicts, orders_taken = [], [], 0
+            departure = datetime.utcnow()
+            with self.supabase.transaction() as tx:
+                for assignment in assignments:
+                    vehicle_id = assignment.get("vehicle_id")
+                    claim = tx.table("fleet").update({"status": "assigned"}).eq("id", vehicle_id).eq("status", "available").execute()
+                    if not claim.data:
+                        conflicts.append(assignment)
+                        continue
+
+                    # Routed orders leave the pending pool so the next cycle does not plan them again;
+                    # solved routes also give each order a computed delivery time.
+                    arrivals = eta_engine.route_arrivals(assignment.get("route_points") or [], departure)
+                    order_ids = assignment.get("assigned_orders") or []
+                    kept = []
+                    for order_id in order_ids:
+                        order_update = {"vehicle_id": vehicle_id, "status": "assigned"}
+                        if order_id in arrivals:
+                            order_update["estimated_pickup_time"] = departure.isoformat()
+                            order_update["estimated_delivery_time"] = arrivals[order_id].isoformat()
+                        if tx.table("orders").update(order_update).eq("id", order_id).eq("status", "pending").execute().data:
+                            kept.append(order_id)
+                    orders_taken += len(order_ids) - len(kept)
+                    if order_ids and not kept:
+                        # Every order went to another route first; the vehicle stays free.
+                        tx.table("fleet").update({"status": "available"}).eq("id", vehicle_id).execute()
+                        continue
+                    if len(kept) < len(order_ids):
+                        keep = set(kept)
+                        assignment["assigned_orders"] = kept
+                        if assignment.get("route_sequence"):
+                            assignment["route_sequence"] = [order_id for order_id in assignment["route_sequence"] if order_id in keep]
+                        if assignment.get("route_points"):
+                            assignment["route_points"] = [
+                                point for point in assignment["route_points"] if not point.get("order_id") or point["order_id"] in keep
+                            ]
+
+                    assignment_data = {
+                        "agent_id": self.agent_id,
+                        "action_type": "route_assignment",
+                        "payload": assignment,
+                        "status": "pending",
+                        "created_at": datetime.utcnow().isoformat()
+                    }
+                    tx.table("agent_actions").insert(assignment_data).execute()
+                    if assignment.get("route_points"):
+                        tx.table("routes").insert({
+                            "vehicle_id": vehicle_id,
+                            "status": "active",
+                            "route_points": {"points": assignment["route_points"]},
+                        }).execute()
+                    committed.append((assignment, assignment_data))
+
+            # Avoid circular import by importing broadcast_agent_action lazily inside methods
+            from app.main import broadcast_agent_action
+            for assignment, assignment_data in committed:
                 broadcast_agent_action(assignment_data)
-                
-                # Update vehicle status
-                self.supabase.table("fleet").update({"status": "assigned"}).eq("id", assignment.get("vehicle_id")).execute()
+                fleet_index.remove(assignment.get("vehicle_id"))
+
+            commit_stats.record("routes", len(assignments), len(committed), len(conflicts), orders_taken)
+            self.count("route_commits", len(committed))
+            if conflicts or orders_taken:
+                print(
+                    f"⚠️ [COMMIT] {len(conflicts)} of {len(assignments)} routes lost their vehicle, "
+                    f"{orders_taken} orders were already taken"
+                )
+                self.count("route_conflicts", len(conflicts))
+            if conflicts:
+                await self.resolve_conflicts("routes", conflicts, resolve)
+            return sum(len(assignment.get("assigned_orders") or []) for assignment, _ in committed)
         
         except Exception as e:
             print(f"Error creating route assignments: {e}")
+            return 0
     
-    async def execute_vehicle_assignments(self, assignments: List[Dict[str, Any]]):
-        """Execute vehicle assignments"""
+    async def execute_vehicle_assignments(self, assignments: List[Dict[str, Any]], resolve: bool = True) -> int:
+        """Commit order-to-vehicle assignments in one transaction; returns the number committed.
+
+        A vehicle is claimed only while still ``available`` (so one vehicle never takes two
+        orders) and its order only while still ``pending``; conflicts are re-solved or rejected in bulk.
+        """
         try:
-            for assignment in assignments:
-                # Update order with vehicle assignment
-                update_data = {
-                    "vehicle_id": assignment.get("vehicle_id"),
-                    "status": "assigned",
-                    "estimated_pickup_time": assignment.get("estimated_pickup_time"),
-                    "estimated_delivery_time": assignment.get("estimated_delivery_time")
-                }
-                
-                self.supabase.table("orders").update(update_data).eq("id", assignment.get("order_id")).execute()
-                
-                # Update vehicle status
-                self.supabase.table("fleet").update({"status": "assigned"}).eq("id", assignment.get("vehicle_id")).execute()
-                
+            committed, conflicts, orders_taken = [], [], 0
+            with self.supabase.transaction() as tx:
+                for assignment in assignments:
+                    vehicle_id = assignment.get("vehicle_id")
+                    claim = tx.table("fleet").update({"status": "assigned"}).eq("id", vehicle_id).eq("status", "available").execute()
+                    if not claim.data:
+                        conflicts.append(assignment)
+                        continue
+
+                    # Update order with vehicle assignment
+                    update_data = {
+                        "vehicle_id": vehicle_id,
+                        "status": "assigned",
+                        "estimated_pickup_time": assignment.get("estimated_pickup_time"),
+                        "estimated_delivery_time": assignment.get("estimated_delivery_time")
+                    }
+                    if not tx.table("orders").update(update_data).eq("id", assignment.get("order_id")).eq("status", "pending").execute().data:
+                        orders_taken += 1
+                        tx.table("fleet").update({"status": "available"}).eq("id", vehicle_id).execute()
+                        continue
+                    committed.append(assignment)
+
+            for assignment in committed:
+                fleet_index.remove(assignment.get("vehicle_id"))
                 await self.log_action("vehicle_assigned", assignment)
+
+            commit_stats.record("vehicle_assignments", len(assignments), len(committed), len(conflicts), orders_taken)
+            if conflicts or orders_taken:
+                print(
+                    f"⚠️ [COMMIT] {len(conflicts)} of {len(assignments)} vehicle assignments lost their vehicle, "
+                    f"{orders_taken} orders were already taken"
+                )
+                self.count("vehicle_conflicts", len(conflicts))
+            if conflicts:
+                await self.resolve_conflicts("vehicle_assignments", conflicts, resolve)
+            return len(committed)
         
         except Exception as e:
             print(f"Error executing vehicle assignments: {e}")
+            return 0
+
+    async def resolve_conflicts(self, kind: str, conflicts: List[Dict[str, Any]], resolve: bool):
+        """Re-solve the orders of conflicting assignments once against the vehicles still available, else reject them"""
+        if kind == "routes":
+            order_ids = {order_id for assignment in conflicts for order_id in assignment.get("assigned_orders") or []}
+        else:
+            order_ids = {assignment.get("order_id") for assignment in conflicts if assignment.get("order_id")}
+        resolved = 0
+        if resolve and order_ids and settings.ROUTING_ENGINE == "local":
+            orders_response = self.supabase.table("orders").select("*").in_("id", list(order_ids)).eq("status", "pending").execute()
+            fleet_response = self.supabase.table("fleet").select("*").eq("status", "available").execute()
+            orders = orders_response.data if orders_response.data else []
+            fleet = fleet_response.data if fleet_response.data else []
+            if orders and fleet:
+                if kind == "routes":
+                    solution, _ = await asyncio.to_thread(self.solve_routes, orders, fleet)
+                    resolved = await self.create_route_assignments([route.as_assignment() for route in solution.routes], resolve=False)
+                else:
+                    result = await asyncio.to_thread(assignment_engine.solve, orders, fleet)
+                    resolved = await self.execute_vehicle_assignments(result.assignments, resolve=False)
+        # Anything not re-solved stays pending for the next cycle.
+        rejected = len(order_ids) - resolved
+        commit_stats.orders_resolved[kind] += resolved
+        commit_stats.orders_rejected[kind] += rejected
+        self.count("conflict_orders_resolved", resolved)
+        self.count("conflict_orders_rejected", rejected)
+        await self.log_action("commit_conflicts", {
+            "kind": kind,
+            "conflicting_vehicles": [assignment.get("vehicle_id") for assignment in conflicts],
+            "orders_resolved": resolved,
+            "orders_rejected": rejected,
+        })
     
     async def execute_dynamic_updates(self, updates: List[Dict[str, Any]]):
         """Execute dynamic routing updates"""
@@ -1,9 +1,31 @@
+import asyncio
 import json
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
+import httpx
 from autogen import ConversableAgent, UserProxyAgent
 
 from ..core.config import settings
+from .cassette import is_miss, llm_cassette
+from .groq_client import (
+    completion_budget,
+    groq_client,
+    is_structured_unsupported,
+    message_text,
+    structured_output_params,
+)
+from .model_router import model_router
+from .rate_limiter import call_with_retry, estimate_tokens
+from .structured_output import complete_structured, extract_json
+from .usage import usage_ledger
+
+SYSTEM_MESSAGE = [
+    "You are an autonomous logistics decision-maker.",
+    "Always respond with valid JSON that exactly matches the schema provided in the prompt.",
+    "Do not include any additional commentary outside the JSON object.",
+    "If you cannot comply, respond with an object {\"error\": \"reason\"}.",
+]
 
 
 class AgenticDecisionEngine:
@@ -13,26 +35,36 @@ class AgenticDecisionEngine:
     (UserProxyAgent) and an assistant (ConversableAgent) configured to speak JSON.
     The assistant is backed by Groq's OpenAI-compatible endpoint so that we can
     benefit from AG2's tooling while keeping Groq as the underlying model.
+
+    With ``AGENT_DECISION_MODE=direct`` the conversation is skipped: the same LLM
+    config is used to send one chat-completions request over the shared
+    connection pool, which is what a single-turn AG2 chat boils down to anyway.
     """
 
-    def __init__(self, agent_name: str):
+    def __init__(self, agent_name: str, mode: Optional[str] = None):
         self.agent_name = agent_name
-        self._assistant: Optional[ConversableAgent] = None
-        self._controller: Optional[UserProxyAgent] = None
+        self.mode = (mode or settings.AGENT_DECISION_MODE).lower()
+        self._llm_config: Optional[Dict[str, Any]] = None
+        # (model, budget size) -> assistant, controller and the lock serializing their chats.
+        self._agents: Dict[Tuple[str, int], Tuple[ConversableAgent, UserProxyAgent, asyncio.Lock]] = {}
 
     @property
     def is_configured(self) -> bool:
-        return bool(settings.GROQ_API_KEY)
+        return bool(settings.GROQ_API_KEY) or llm_cassette.replaying
 
-    def _init_agents(self) -> None:
-        if self._assistant is not None and self._controller is not None:
-            return
+    def warm_up(self) -> None:
+        """Build the LLM config (and AG2 agents when needed) ahead of the first decision."""
+        if self.mode == "direct":
+            self._init_llm_config()
+        else:
+            for size in budget_sizes():
+                self._init_agents(max_tokens=size)
 
-        if not self.is_configured:
-            # Groq credentials missing; AG2 conversation is disabled.
-            return
+    def _init_llm_config(self) -> Optional[Dict[str, Any]]:
+        if self._llm_config is not None or not self.is_configured:
+            return self._llm_config
 
-        llm_config = {
+        self._llm_config = {
             "config_list": [
                 {
                     "model": settings.GROQ_MODEL,
@@ -41,32 +73,51 @@ class AgenticDecisionEngine:
                 }
             ],
             "temperature": settings.GROQ_TEMPERATURE,
-            "timeout": 120,
+            "timeout": settings.AGENT_DECISION_DEADLINE,
         }
+        return self._llm_config
 
-        system_message = [
-            "You are an autonomous logistics decision-maker.",
-            "Always respond with valid JSON that exactly matches the schema provided in the prompt.",
-            "Do not include any additional commentary outside the JSON object.",
-            "If you cannot comply, respond with an object {\"error\": \"reason\"}.",
-        ]
+    def _init_agents(
+        self, model: Optional[str] = None, max_tokens: Optional[int] = None
+    ) -> Optional[Tuple[ConversableAgent, UserProxyAgent, asyncio.Lock]]:
+        """Assistant/controller pair for ``model`` and ``max_tokens``, built on first use.
+
+        AG2 fixes both when the assistant is created, so ``max_tokens`` is rounded up to
+        one of a few ``budget_sizes`` and each model keeps at most one pair per size.
+        Chats on a pair share its history and usage summary, hence the lock.
+        """
+        llm_config = self._init_llm_config()
+        if llm_config is None:
+            # Groq credentials missing; AG2 conversation is disabled.
+            return None
+        model = model or llm_config["config_list"][0]["model"]
+        max_tokens = next((size for size in budget_sizes() if size >= (max_tokens or 0)), budget_sizes()[-1])
+        key = (model, max_tokens)
+        if key in self._agents:
+            return self._agents[key]
 
-        self._assistant = ConversableAgent(
+        assistant = ConversableAgent(
             name=f"{self.agent_name}_assistant",
-            system_message=system_message,
+            system_message=SYSTEM_MESSAGE,
             human_input_mode="NEVER",
             max_consecutive_auto_reply=settings.AGENT_AUTONOMOUS_TURNS,
-            llm_config=llm_config,
+            llm_config={
+                **llm_config,
+                "config_list": [{**llm_config["config_list"][0], "model": model}],
+                "max_tokens": max_tokens,
+            },
             code_execution_config={"use_docker": False},
             silent=True,
         )
-        self._controller = UserProxyAgent(
+        controller = UserProxyAgent(
             name=f"{self.agent_name}_controller",
             human_input_mode="NEVER",
             system_message="You provide contextual information to the assistant and never request human input.",
             code_execution_config={"use_docker": False},
             silent=True,
         )
+        self._agents[key] = (assistant, controller, asyncio.Lock())
+        return self._agents[key]
 
     async def a_make_decision(
         self,
@@ -74,12 +125,62 @@ class AgenticDecisionEngine:
         context: Dict[str, Any],
         prompt: str,
         response_format: Dict[str, Any],
+        expected_items: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Run an AG2 conversation and return the parsed JSON payload.
+
+        Honours the LLM cassette: replay serves the recorded decision for this
+        request, record appends the live decision.
+        """
+
+        cassette_request = {
+            "agent": self.agent_name,
+            "context": context,
+            "prompt": prompt,
+            "response_format": response_format,
+        }
+        if model:
+            cassette_request["model"] = model
+        if llm_cassette.replaying:
+            recorded = llm_cassette.lookup("decision", cassette_request)
+            return None if is_miss(recorded) else recorded
+
+        decision = await self._a_run_decision(
+            context=context,
+            prompt=prompt,
+            response_format=response_format,
+            expected_items=expected_items,
+            model=model,
+        )
+        if decision is not None and llm_cassette.recording:
+            llm_cassette.record("decision", cassette_request, decision)
+        return decision
+
+    async def _a_run_decision(
+        self,
+        *,
+        context: Dict[str, Any],
+        prompt: str,
+        response_format: Dict[str, Any],
+        expected_items: Optional[int] = None,
+        model: Optional[str] = None,
     ) -> Optional[Dict[str, Any]]:
-        """Run an AG2 conversation and return the parsed JSON payload."""
+        if self.mode == "direct":
+            return await self.a_make_direct_decision(
+                context=context,
+                prompt=prompt,
+                response_format=response_format,
+                expected_items=expected_items,
+                model=model,
+            )
 
-        self._init_agents()
-        if self._assistant is None or self._controller is None:
+        max_tokens = completion_budget(response_format, expected_items)
+        agents = self._init_agents(model, max_tokens)
+        if agents is None:
             return None
+        assistant, controller, lock = agents
+        model = model or self._llm_config["config_list"][0]["model"]
 
         # Compose a single-turn message for the assistant.
         message = json.dumps(
@@ -91,20 +192,133 @@ class AgenticDecisionEngine:
             indent=2,
         )
 
-        chat_result = await self._controller.a_initiate_chat(
-            self._assistant,
-            clear_history=True,
-            silent=True,
-            max_turns=settings.AGENT_AUTONOMOUS_TURNS,
-            message=f"Use the given context and instructions. Reply with JSON:\n{message}",
-        )
+        content = f"Use the given context and instructions. Reply with JSON:\n{message}"
+        async with lock:
+            assistant.client.clear_usage_summary()
+            started = time.monotonic()
+            try:
+                chat_result = await call_with_retry(
+                    lambda: controller.a_initiate_chat(
+                        assistant,
+                        clear_history=True,
+                        silent=True,
+                        max_turns=settings.AGENT_AUTONOMOUS_TURNS,
+                        message=content,
+                    ),
+                    estimated_tokens=estimate_tokens([{"content": content}], max_tokens),
+                    label=f"ag2_{self.agent_name}",
+                )
+            except Exception:
+                # Attempts that got a reply before the failure still spent tokens.
+                spent = _usage_summary(assistant)
+                if any(spent):
+                    usage_ledger.record(model, *spent)
+                model_router.record(model, time.monotonic() - started, ok=False)
+                raise
+            prompt_tokens, completion_tokens = _usage_summary(assistant)
+        model_router.record(model, time.monotonic() - started, prompt_tokens, completion_tokens)
+        usage_ledger.record(model, prompt_tokens, completion_tokens)
 
-        raw_reply = self._extract_last_content(chat_result.chat_history)
+        # Only accept content authored by the assistant; when the chat ends before it
+        # replies, the last message is our own request echoed back.
+        assistant_turns = [
+            msg for msg in chat_result.chat_history if msg.get("name") == assistant.name
+        ]
+        raw_reply = self._extract_last_content(assistant_turns)
         if not raw_reply:
             return None
 
-        parsed = self._try_parse_json(raw_reply)
-        return parsed
+        return extract_json(raw_reply, response_format)
+
+    async def a_make_direct_decision(
+        self,
+        *,
+        context: Dict[str, Any],
+        prompt: str,
+        response_format: Dict[str, Any],
+        expected_items: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Send one chat-completions request built from the prebuilt LLM config.
+
+        ``model`` overrides the configured model (see ``ModelRouter``). ``max_tokens``
+        is sized from ``expected_items``; a reply cut off at the limit is continued for
+        its missing items only.
+        """
+
+        llm_config = self._init_llm_config()
+        if llm_config is None:
+            return None
+        endpoint = llm_config["config_list"][0]
+        model = model or endpoint["model"]
+
+        message = json.dumps(
+            {
+                "context": context,
+                "instructions": prompt,
+                "response_schema": response_format,
+            },
+            separators=(",", ":"),
+        )
+        messages: List[Dict[str, str]] = [
+            {"role": "system", "content": " ".join(SYSTEM_MESSAGE)},
+            {"role": "user", "content": f"Use the given context and instructions. Reply with JSON:\n{message}"},
+        ]
+
+        async def send(mode: str, call_messages: List[Dict[str, Any]], max_tokens: int) -> Dict[str, Any]:
+            response = await groq_client.http_client.post(
+                f"{endpoint['base_url'].rstrip('/')}/chat/completions",
+                headers={"Authorization": f"Bearer {endpoint['api_key']}"},
+                json={
+                    "model": model,
+                    "messages": call_messages,
+                    "temperature": llm_config["temperature"],
+                    "max_tokens": max_tokens,
+                    **structured_output_params(mode, response_format),
+                },
+                timeout=llm_config["timeout"],
+            )
+            response.raise_for_status()
+            return response.json()
+
+        def completion_call(mode: str):
+            async def call(call_messages: List[Dict[str, Any]], max_tokens: int) -> Tuple[Optional[str], Optional[str]]:
+                started = time.monotonic()
+                try:
+                    payload = await call_with_retry(
+                        lambda: send(mode, call_messages, max_tokens),
+                        estimated_tokens=estimate_tokens(call_messages, max_tokens),
+                        label=f"direct_{self.agent_name}",
+                    )
+                except Exception:
+                    model_router.record(model, time.monotonic() - started, ok=False)
+                    raise
+                usage = payload.get("usage") or {}
+                prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+                model_router.record(model, time.monotonic() - started, prompt_tokens, completion_tokens)
+                usage_ledger.record(model, prompt_tokens, completion_tokens)
+                choices = payload.get("choices") or []
+                if not choices:
+                    return None, None
+                reply = choices[0].get("message") or {}
+                raw_reply = message_text(reply) if reply.get("tool_calls") else self._extract_last_content([reply])
+                return raw_reply, choices[0].get("finish_reason")
+
+            return call
+
+        mode = groq_client.structured_mode
+        budget = dict(
+            max_tokens=completion_budget(response_format, expected_items),
+            max_continuations=settings.GROQ_MAX_CONTINUATIONS,
+            token_ceiling=settings.GROQ_MAX_COMPLETION_TOKENS,
+        )
+        try:
+            return await complete_structured(completion_call(mode), messages, response_format, **budget)
+        except httpx.HTTPStatusError as error:
+            if mode == "off" or not is_structured_unsupported(error):
+                raise
+            groq_client.disable_structured_mode(mode, error)
+            return await complete_structured(completion_call("off"), messages, response_format, **budget)
 
     @staticmethod
     def _extract_last_content(chat_history: list[dict[str, Any]]) -> Optional[str]:
@@ -124,18 +338,22 @@ class AgenticDecisionEngine:
             return "".join(text_parts).strip() if text_parts else None
         return None
 
-    @staticmethod
-    def _try_parse_json(payload: str) -> Optional[Dict[str, Any]]:
-        try:
-            return json.loads(payload)
-        except json.JSONDecodeError:
-            # Attempt to recover by extracting the last JSON object.
-            start = payload.find("{")
-            end = payload.rfind("}")
-            if start != -1 and end != -1 and start < end:
-                snippet = payload[start : end + 1]
-                try:
-                    return json.loads(snippet)
-                except json.JSONDecodeError:
-                    return None
-            return None
+
+def _usage_summary(assistant: ConversableAgent) -> Tuple[int, int]:
+    """Prompt and completion tokens of the API calls made since the last clear."""
+    summary = assistant.client.actual_usage_summary or {}
+    usages = [usage for usage in summary.values() if isinstance(usage, dict)]
+    return (
+        sum(usage.get("prompt_tokens", 0) for usage in usages),
+        sum(usage.get("completion_tokens", 0) for usage in usages),
+    )
+
+
+def budget_sizes() -> List[int]:
+    """``max_tokens`` sizes AG2 assistants are built with: powers of two within the bounds."""
+    sizes = []
+    size = settings.GROQ_MIN_COMPLETION_TOKENS
+    while size < settings.GROQ_MAX_COMPLETION_TOKENS:
+        sizes.append(size)
+        size *= 2
+    return sizes + [settings.GROQ_MAX_COMPLETION_TOKENS]
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from ..core.config import settings
+
+# Timestamps change on every run (context snapshots, created_at columns) and would
+# otherwise make every fingerprint unique. Prompts embed both ISO strings and the
+# repr() of datetime objects.
+_TIMESTAMP = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:[+-]\d{2}:\d{2}|Z)?"
+    r"|datetime\.datetime\([\d, ]+\)"
+)
+_MISSING = object()
+
+
+def fingerprint(kind: str, request: Dict[str, Any]) -> str:
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    canonical = _TIMESTAMP.sub("<ts>", canonical)
+    return hashlib.sha256(f"{kind}:{canonical}".encode("utf-8")).hexdigest()
+
+
+class LLMCassette:
+    """Record/replay store for LLM request/response pairs.
+
+    ``record`` appends every pair as one gzip member containing a JSON line, so the
+    file stays valid even if the process dies mid-run. ``replay`` serves responses by
+    request fingerprint without touching the network; identical requests are answered
+    in recorded order and the last answer is repeated once they run out.
+    """
+
+    def __init__(self, path: str, mode: str = "off"):
+        self.path = path
+        self.mode = (mode or "off").lower()
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Deque[Any]]] = None
+        self._last: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> Dict[str, Deque[Any]]:
+        if self._entries is not None:
+            return self._entries
+        entries: Dict[str, Deque[Any]] = defaultdict(deque)
+        if os.path.exists(self.path):
+            with gzip.open(self.path, "rt", encoding="utf-8") as handle:
+                for line in handle:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    entries[record["fingerprint"]].append(record["response"])
+        self._entries = entries
+        print(f"📼 Loaded {sum(len(v) for v in entries.values())} cassette entries from {self.path}")
+        return entries
+
+    def lookup(self, kind: str, request: Dict[str, Any]) -> Any:
+        """Return the recorded response, or ``_MISSING`` when the request was never recorded."""
+        key = fingerprint(kind, request)
+        with self._lock:
+            queue = self._load().get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            if key in self._last:
+                self.hits += 1
+                return self._last[key]
+            self.misses += 1
+        print(f"📼 [CASSETTE MISS] {kind} {key[:12]}")
+        return _MISSING
+
+    def record(self, kind: str, request: Dict[str, Any], response: Any) -> None:
+        entry = {
+            "fingerprint": fingerprint(kind, request),
+            "kind": kind,
+            "recorded_at": datetime.utcnow().isoformat(),
+            "request": request,
+            "response": response,
+        }
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as handle:
+                handle.write(line)
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+def is_miss(value: Any) -> bool:
+    return value is _MISSING
+
+
+# Global instance
+llm_cassette = LLMCassette(settings.LLM_CASSETTE_PATH, settings.LLM_CASSETTE_MODE)
@@ -0,0 +1,130 @@
+import time
+from typing import Any, Dict, Optional
+
+from ..core.config import settings
+from .hedging import LatencyTracker
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stop sending decisions to the LLM while it is failing or too slow.
+
+    The circuit opens after ``LLM_BREAKER_FAILURE_THRESHOLD`` consecutive failed
+    decisions, or when the p90 of recent decision latencies exceeds
+    ``LLM_BREAKER_LATENCY_SLO``. While open, callers are refused and serve degraded
+    decisions instead. After ``LLM_BREAKER_OPEN_SECONDS`` a single probe call is let
+    through (half-open): success closes the circuit, failure reopens it with the wait
+    doubled up to ``LLM_BREAKER_MAX_OPEN_SECONDS``.
+    """
+
+    MIN_LATENCY_SAMPLES = 5
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = None,
+        latency_slo: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        max_open_seconds: Optional[float] = None,
+    ):
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURE_THRESHOLD
+        self.latency_slo = latency_slo or settings.LLM_BREAKER_LATENCY_SLO
+        self.open_seconds = open_seconds or settings.LLM_BREAKER_OPEN_SECONDS
+        self.max_open_seconds = max_open_seconds or settings.LLM_BREAKER_MAX_OPEN_SECONDS
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.latency = LatencyTracker(window=20)
+        self.current_wait = self.open_seconds
+        self.opened_at: Optional[float] = None
+        self.retry_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+        self.last_trip_reason: Optional[str] = None
+        self.trips = 0
+        self.short_circuits = 0
+
+    def _probe_due(self, now: float) -> bool:
+        if self.state == OPEN:
+            return now >= self.retry_at
+        # A probe that never reported back (cancelled task) must not wedge the circuit.
+        return self.probe_started is None or now - self.probe_started > settings.AGENT_DECISION_DEADLINE
+
+    @property
+    def accepting(self) -> bool:
+        """True when a call would currently be let through (without claiming a probe)."""
+        return self.state == CLOSED or self._probe_due(time.monotonic())
+
+    def allow(self) -> bool:
+        """Claim permission for one LLM decision; False means short-circuit."""
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self._probe_due(now):
+            self.state = HALF_OPEN
+            self.probe_started = now
+            print(f"🔌 [LLM CIRCUIT] half-open - probing after {self.current_wait:.0f}s")
+            return True
+        self.short_circuits += 1
+        return False
+
+    def _trip(self, reason: str) -> None:
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self.current_wait = min(self.current_wait * 2, self.max_open_seconds)
+        else:
+            self.current_wait = self.open_seconds
+            self.trips += 1
+        self.state = OPEN
+        self.opened_at = now
+        self.retry_at = now + self.current_wait
+        self.probe_started = None
+        self.last_trip_reason = reason
+        print(f"🔌 [LLM CIRCUIT] open ({reason}) - next probe in {self.current_wait:.0f}s")
+
+    def record_success(self, seconds: float) -> None:
+        if self.state == HALF_OPEN:
+            if seconds > self.latency_slo:
+                self._trip(f"probe took {seconds:.1f}s")
+                return
+            print("🔌 [LLM CIRCUIT] closed - probe succeeded")
+            self.state = CLOSED
+            self.latency = LatencyTracker(window=20)
+            self.probe_started = None
+        self.consecutive_failures = 0
+        self.latency.record(seconds)
+        p90 = self.latency.percentile(90)
+        if (
+            self.state == CLOSED
+            and len(self.latency.samples) >= self.MIN_LATENCY_SAMPLES
+            and p90 > self.latency_slo
+        ):
+            self._trip(f"p90 latency {p90:.1f}s over {self.latency_slo:g}s SLO")
+
+    def record_failure(self, reason: str = "no decision") -> None:
+        if self.state == HALF_OPEN:
+            self._trip(f"probe failed: {reason}")
+            return
+        if self.state == OPEN:
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self._trip(f"{self.consecutive_failures} consecutive failures, last: {reason}")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_p90": self.latency.percentile(90),
+            "latency_slo": self.latency_slo,
+            "next_probe_in": max(0.0, self.retry_at - now) if self.state == OPEN else None,
+            "open_for": now - self.opened_at if self.state != CLOSED and self.opened_at else None,
+            "last_trip_reason": self.last_trip_reason,
+            "trips": self.trips,
+            "short_circuits": self.short_circuits,
+        }
+
+
+# Global instance
+llm_breaker = CircuitBreaker()
@@ -0,0 +1,402 @@
+import copy
+import threading
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .id_aliases import ID_FIELDS, ID_LIST_FIELDS
+from .structured_output import matches_schema
+
+DIMENSIONS = 1 << 12
+# Text longer than this is a description or serialized blob, not an identifying attribute.
+MAX_TOKEN_LENGTH = 80
+# Nearest neighbours by token similarity that are re-ranked on numeric closeness.
+CANDIDATES = 8
+# Output fields whose value does not depend on the scale of the input record.
+RELATIVE_SUFFIXES = ("_percentage", "_percent", "_pct", "_ratio", "_score", "confidence")
+# Input features that outputs derived from them scale with (new_price from price).
+PROPORTIONAL_FEATURES = ("price", "cost")
+# Output field names that refer to a differently named input feature.
+FEATURE_ALIASES = {"level": "quantity"}
+
+
+def _is_volatile(key: str) -> bool:
+    return key == "id" or key in ID_FIELDS or key.endswith("_at") or "date" in key or "time" in key
+
+
+def situation_features(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Attributes of an input record that describe its situation (no ids, no timestamps)."""
+    features: Dict[str, Any] = {}
+    for key, value in record.items():
+        if _is_volatile(key) or value is None:
+            continue
+        if isinstance(value, bool):
+            features[key] = str(value).lower()
+        elif isinstance(value, (int, float)):
+            features[key] = float(value)
+        elif isinstance(value, str) and len(value) <= MAX_TOKEN_LENGTH:
+            features[key] = value.strip().lower()
+    return features
+
+
+def _bucket(token: str) -> int:
+    # crc32 rather than hash(): str hashing is salted per process and rows outlive it.
+    return zlib.crc32(token.encode("utf-8")) % DIMENSIONS
+
+
+def token_vector(features: Dict[str, Any]) -> np.ndarray:
+    """Unit-length hashed vector of the record's categorical ``field=value`` tokens."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for key, value in features.items():
+        if isinstance(value, str):
+            vector[_bucket(f"{key}={value}")] += 1.0
+        else:
+            # Numeric fields only contribute presence here; closeness is scored separately.
+            vector[_bucket(f"{key}#")] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def numeric_similarity(old: Dict[str, Any], new: Dict[str, Any]) -> float:
+    """1 minus the largest relative difference between shared numeric fields."""
+    worst = 0.0
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, float) and isinstance(previous, float):
+            worst = max(worst, abs(value - previous) / max(abs(value), abs(previous), 1.0))
+    return 1.0 - worst
+
+
+def record_key(record: Dict[str, Any]) -> Optional[str]:
+    value = record.get("id") or record.get("item_id")
+    return str(value) if value else None
+
+
+def _own_ids(record: Dict[str, Any]) -> Dict[str, str]:
+    """Identifier fields carried by the record itself, keyed by field name."""
+    own = {key: str(record[key]) for key in ID_FIELDS if record.get(key)}
+    key = record_key(record)
+    if key:
+        own["id"] = key
+    return own
+
+
+class TaskIndex:
+    """Remembered records of one sub-task: token matrix plus what was decided for each."""
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.record_ids: List[str] = []
+        self.features: List[Dict[str, Any]] = []
+        self.own_ids: List[Dict[str, str]] = []
+        self.entries: List[List[Tuple[str, Dict[str, Any]]]] = []
+        self.template: Dict[str, Any] = {}
+        self._vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.record_ids)
+
+    def add(
+        self,
+        record_id: str,
+        features: Dict[str, Any],
+        own_ids: Dict[str, str],
+        entries: List[Tuple[str, Dict[str, Any]]],
+        max_entries: int,
+    ) -> None:
+        if record_id in self.record_ids:
+            # The latest decision about a record supersedes earlier ones.
+            index = self.record_ids.index(record_id)
+            for column in (self.record_ids, self.features, self.own_ids, self.entries, self._vectors):
+                del column[index]
+        self.record_ids.append(record_id)
+        self.features.append(features)
+        self.own_ids.append(own_ids)
+        self.entries.append(entries)
+        self._vectors.append(token_vector(features))
+        overflow = len(self.record_ids) - max_entries
+        if overflow > 0:
+            for column in (self.record_ids, self.features, self.own_ids, self.entries, self._vectors):
+                del column[:overflow]
+        self._matrix = None
+
+    def nearest(self, features: List[Dict[str, Any]]) -> List[Tuple[int, float]]:
+        """Best remembered match and its similarity for each query record."""
+        if not self.record_ids:
+            return [(-1, 0.0)] * len(features)
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors)
+        queries = np.vstack([token_vector(query) for query in features])
+        token_sims = queries @ self._matrix.T
+        k = min(CANDIDATES, token_sims.shape[1])
+        candidates = np.argpartition(-token_sims, k - 1, axis=1)[:, :k]
+        matches = []
+        for row, query in enumerate(features):
+            scored = [
+                (int(index), float(token_sims[row, index]) * numeric_similarity(self.features[index], query))
+                for index in candidates[row]
+            ]
+            matches.append(max(scored, key=lambda match: match[1]))
+        return matches
+
+
+class DecisionMemory:
+    """Nearest-neighbour memory of past LLM decisions, per agent sub-task.
+
+    Each decision is split per input record: the record's situation (hashed
+    ``field=value`` tokens plus numeric attributes) is stored with the entries the
+    model produced for it, or none if it left the record alone. A new request is
+    answered from memory only when every input record has a neighbour within
+    ``DECISION_MEMORY_THRESHOLD``; the remembered entries are then adapted to the new
+    record (ids, quantities, names) and the result is checked against the schema.
+    Memories are persisted in ``decision_memory`` and reloaded on first use.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None) -> None:
+        self.threshold = threshold if threshold is not None else settings.DECISION_MEMORY_THRESHOLD
+        self.max_entries = max_entries or settings.DECISION_MEMORY_MAX_ENTRIES
+        self.tasks: Dict[str, TaskIndex] = {}
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _client(self):
+        from ..core.supabase import supabase_client
+
+        return supabase_client.get_client()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            rows = (
+                self._client().table("decision_memory").select("*")
+                .order("created_at", desc=True).limit(self.max_entries * 4).execute().data
+            )
+        except Exception as e:
+            print(f"Error loading decision memory: {e}")
+            return
+        for row in reversed(rows):
+            index = self.tasks.setdefault(row["task"], TaskIndex(row["record_kind"]))
+            if index.kind != row["record_kind"]:
+                continue
+            index.template = row.get("template") or index.template
+            entries = [(list_key, entry) for list_key, entry in row.get("entries") or []]
+            index.add(row["record_id"], row.get("features") or {}, row.get("own_ids") or {}, entries, self.max_entries)
+
+    @staticmethod
+    def _target_kind(decision: Dict[str, Any], id_sources: Dict[str, List[Dict[str, Any]]]) -> Optional[str]:
+        """The input table the decision's entries are about (most referenced ids)."""
+        referenced = {
+            str(value)
+            for values in decision.values() if isinstance(values, list)
+            for entry in values if isinstance(entry, dict)
+            for key, value in entry.items() if key in ID_FIELDS and value
+        }
+        hits = {
+            kind: sum(1 for record in records if record_key(record) in referenced)
+            for kind, records in id_sources.items()
+        }
+        kind = max(hits, key=hits.get, default=None)
+        return kind if kind and hits[kind] else None
+
+    def remember(
+        self,
+        agent_type: str,
+        task: str,
+        id_sources: Optional[Dict[str, List[Dict[str, Any]]]],
+        decision: Any,
+    ) -> None:
+        """Index a resolved LLM decision under the records it was made for."""
+        if not isinstance(decision, dict) or not id_sources:
+            return
+        kind = self._target_kind(decision, id_sources)
+        if kind is None:
+            return
+
+        per_record: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        records = {record_key(record): record for record in id_sources[kind] if record_key(record)}
+        for list_key, values in decision.items():
+            if not isinstance(values, list) or list_key in ID_LIST_FIELDS:
+                continue
+            for entry in values:
+                if not isinstance(entry, dict):
+                    continue
+                ids = {str(value) for key, value in entry.items() if key in ID_FIELDS and value}
+                targets = ids & records.keys()
+                if len(targets) != 1:
+                    return
+                target = targets.pop()
+                # Entries tied to other records (e.g. a vehicle or a stop sequence) cannot be
+                # replayed for a new record, and a partial memory would replay as "no action".
+                if not ids <= set(_own_ids(records[target]).values()) or any(
+                    entry.get(key) for key in ID_LIST_FIELDS
+                ):
+                    return
+                per_record.setdefault(target, []).append((list_key, entry))
+
+        template = {key: value for key, value in decision.items() if not isinstance(value, list)}
+        rows = []
+        with self._lock:
+            self._ensure_loaded()
+            index = self.tasks.setdefault(task, TaskIndex(kind))
+            if index.kind != kind:
+                return
+            index.template = template
+            for record_id, record in records.items():
+                features, own_ids = situation_features(record), _own_ids(record)
+                entries = per_record.get(record_id, [])
+                index.add(record_id, features, own_ids, entries, self.max_entries)
+                rows.append(
+                    {
+                        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{task}:{record_id}")),
+                        "agent_type": agent_type,
+                        "task": task,
+                        "record_kind": kind,
+                        "record_id": record_id,
+                        "features": features,
+                        "own_ids": own_ids,
+                        "entries": [list(pair) for pair in entries],
+                        "template": template,
+                        "created_at": datetime.utcnow(),
+                    }
+                )
+            self.counters["remembered"] += len(rows)
+        if rows:
+            try:
+                self._client().table("decision_memory").upsert(rows).execute()
+            except Exception as e:
+                print(f"Error persisting decision memory: {e}")
+
+    @staticmethod
+    def _adapt(
+        entry: Dict[str, Any],
+        old_features: Dict[str, Any],
+        old_ids: Dict[str, str],
+        record: Dict[str, Any],
+        similarity: float,
+    ) -> Optional[Dict[str, Any]]:
+        """Re-target a remembered entry at ``record``, or None if its numbers cannot be.
+
+        Numeric outputs that echo an input feature (``current_quantity``) take its new
+        value, and those proportional to one (``new_price``) are scaled by how much it
+        changed, so a markdown stays a markdown on a cheaper item. Relative values
+        (percentages, scores) are kept. Any other number, such as a reorder quantity
+        that depends on stock in ways a ratio cannot capture, makes the entry unusable.
+        """
+        adapted = copy.deepcopy(entry)
+        new_ids = _own_ids(record)
+        old_to_new = {old_ids[key]: new_ids[key] for key in old_ids if key in new_ids}
+        new_features = situation_features(record)
+        for key, value in entry.items():
+            if key in ID_FIELDS and value is not None:
+                adapted[key] = old_to_new.get(str(value), value)
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                source = _source_feature(key, old_features, new_features)
+                if source is None:
+                    if not _is_relative(key):
+                        return None
+                    continue
+                old_value, new_value = old_features[source], new_features[source]
+                if _same(value, old_value):
+                    # e.g. current_quantity mirrors the record's quantity at decision time.
+                    scaled = new_value
+                elif old_value and _is_proportional(source):
+                    scaled = value * new_value / old_value
+                else:
+                    # e.g. a reorder quantity: it does not follow the stock level up or down.
+                    return None
+                adapted[key] = round(scaled) if isinstance(value, int) else round(scaled, 4)
+                continue
+            # e.g. a status or category echoed from the record at decision time.
+            source = key[len("current_"):] if key.startswith("current_") else key
+            if source in old_features and source in new_features and _same(value, old_features[source]):
+                adapted[key] = record.get(source)
+        if isinstance(adapted.get("reasoning"), str):
+            adapted["reasoning"] += f" (Reused from a similar earlier decision, similarity {similarity:.2f}.)"
+        return adapted
+
+    def recall(
+        self,
+        task: str,
+        id_sources: Optional[Dict[str, List[Dict[str, Any]]]],
+        response_format: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Adapted decision and its lowest record similarity, or None on a miss."""
+        if not id_sources or self.threshold >= 1.0:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            index = self.tasks.get(task)
+            records = [record for record in (id_sources or {}).get(index.kind if index else "", []) if record_key(record)]
+            if not index or not records:
+                return None
+            matches = index.nearest([situation_features(record) for record in records])
+            worst = min(similarity for _, similarity in matches)
+            if worst < self.threshold:
+                self.counters["misses"] += 1
+                return None
+
+            decision: Dict[str, Any] = copy.deepcopy(index.template)
+            for list_key, _ in (pair for entries in index.entries for pair in entries):
+                decision.setdefault(list_key, [])
+            for record, (match, similarity) in zip(records, matches):
+                for list_key, entry in index.entries[match]:
+                    adapted = self._adapt(entry, index.features[match], index.own_ids[match], record, similarity)
+                    if adapted is None:
+                        self.counters["unadaptable"] += 1
+                        return None
+                    decision[list_key].append(adapted)
+
+        if response_format and not matches_schema(decision, response_format):
+            self.counters["rejected"] += 1
+            return None
+        self.counters["hits"] += 1
+        return decision, worst
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "tasks": {task: {"kind": index.kind, "records": len(index)} for task, index in self.tasks.items()},
+            **dict(self.counters),
+        }
+
+
+def _is_relative(key: str) -> bool:
+    return key.endswith(RELATIVE_SUFFIXES)
+
+
+def _is_proportional(feature: str) -> bool:
+    return feature.endswith(PROPORTIONAL_FEATURES)
+
+
+def _source_feature(key: str, old_features: Dict[str, Any], new_features: Dict[str, Any]) -> Optional[str]:
+    """Numeric input feature an output field was derived from, e.g. ``new_price`` -> ``price``."""
+    names = {feature: feature for feature in old_features}
+    names.update({alias: feature for alias, feature in FEATURE_ALIASES.items() if feature in old_features})
+    tied = [
+        name
+        for name, feature in names.items()
+        if isinstance(old_features[feature], float)
+        and isinstance(new_features.get(feature), float)
+        and (key == name or key.endswith("_" + name))
+    ]
+    return names[max(tied, key=len)] if tied else None
+
+
+def _same(value: Any, feature: Any) -> bool:
+    if isinstance(feature, float) and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) == feature
+    return isinstance(value, str) and value.strip().lower() == feature
+
+
+# Global instance
+decision_memory = DecisionMemory()
@@ -1,33 +1,190 @@
-import asyncio
+import importlib.util
 import json
 import time
-from typing import Dict, List, Any, Optional
-from groq import Groq
+from typing import Dict, List, Any, Optional, Tuple
+
+import httpx
+from groq import AsyncGroq
 from ..core.config import settings
+from .cassette import is_miss, llm_cassette
+from .model_router import model_router
+from .rate_limiter import (
+    call_with_retry,
+    error_payload,
+    estimate_tokens,
+    is_generation_failure,
+    rate_limiter,
+    status_code_of,
+)
+from .structured_output import complete_structured, estimate_max_tokens
+from .usage import usage_ledger
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive connection pool for LLM calls.
+
+    HTTP/2 is only enabled when the optional ``h2`` package is installed.
+    """
+    http2 = settings.GROQ_HTTP2 and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(settings.GROQ_REQUEST_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.GROQ_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GROQ_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.GROQ_POOL_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+STRUCTURED_TOOL_NAME = "submit_decision"
+
+
+def structured_output_params(mode: str, response_format: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat-completions parameters that make the server enforce ``response_format``."""
+    if mode == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    if mode == "tools":
+        return {
+            "tools": [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": STRUCTURED_TOOL_NAME,
+                        "description": "Submit the decision in the required structure.",
+                        "parameters": response_format,
+                    },
+                }
+            ],
+            "tool_choice": {"type": "function", "function": {"name": STRUCTURED_TOOL_NAME}},
+        }
+    return {}
+
+
+def message_text(message: Any) -> Optional[str]:
+    """Text of a chat message (SDK object or raw dict), preferring tool-call arguments."""
+    get = message.get if isinstance(message, dict) else lambda key: getattr(message, key, None)
+    for call in get("tool_calls") or []:
+        function = call.get("function") if isinstance(call, dict) else getattr(call, "function", None)
+        arguments = function.get("arguments") if isinstance(function, dict) else getattr(function, "arguments", None)
+        if arguments:
+            return arguments
+    return get("content")
+
+
+def completion_budget(response_format: Optional[Dict[str, Any]], expected_items: Optional[int]) -> int:
+    """``max_tokens`` for a structured reply, within the configured bounds."""
+    return estimate_max_tokens(
+        response_format,
+        expected_items,
+        settings.GROQ_MIN_COMPLETION_TOKENS,
+        settings.GROQ_MAX_COMPLETION_TOKENS,
+    )
+
+
+STRUCTURED_PARAMS = ("response_format", "json_object", "tool_choice", "tools")
+UNSUPPORTED_PHRASES = (
+    "not supported",
+    "unsupported",
+    "does not support",
+    "unknown parameter",
+    "unrecognized",
+    "not permitted",
+    "not allowed",
+)
+
+
+def is_structured_unsupported(error: BaseException) -> bool:
+    """True when the server rejected the request because it does not take response_format/tools.
+
+    Only the error's own message and ``param`` are read: a failed generation
+    (``tool_use_failed``, ``json_validate_failed``) echoes the model's output, which
+    may mention tools or functions without the parameters being unsupported.
+    """
+    if status_code_of(error) not in {400, 404, 422} or is_generation_failure(error):
+        return False
+    payload = error_payload(error)
+    if payload.get("param") in STRUCTURED_PARAMS:
+        return True
+    message = payload.get("message")
+    if not isinstance(message, str):
+        response = getattr(error, "response", None)
+        message = getattr(response, "text", "") if not payload else ""
+    message = message.lower()
+    return any(param in message for param in STRUCTURED_PARAMS) and any(
+        phrase in message for phrase in UNSUPPORTED_PHRASES
+    )
+
 
 class GroqClient:
-    def __init__(self):
-        client_kwargs = {"api_key": settings.GROQ_API_KEY}
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.http_client = http_client or build_http_client()
+        client_kwargs = {
+            "api_key": settings.GROQ_API_KEY,
+            "http_client": self.http_client,
+            # Retries are handled by call_with_retry so they share the rate limiter.
+            "max_retries": 0,
+        }
         if settings.GROQ_BASE_URL:
             client_kwargs["base_url"] = settings.GROQ_BASE_URL
-        self.client = Groq(**client_kwargs)
+        self.client = AsyncGroq(**client_kwargs)
         self.model = settings.GROQ_MODEL
         self.default_temperature = settings.GROQ_TEMPERATURE
+        self._configured_mode = settings.GROQ_STRUCTURED_OUTPUT.lower()
+        self._unsupported_modes: set = set()
         print(f"🔧 GroqClient initialized with model: {self.model}")
 
+    async def aclose(self) -> None:
+        """Close the pooled connections (called on application shutdown)."""
+        await self.http_client.aclose()
+
+    @property
+    def structured_mode(self) -> str:
+        """Structured-output mechanism in use: ``json_object``, ``tools`` or ``off``."""
+        return "off" if self._configured_mode in self._unsupported_modes else self._configured_mode
+
+    def disable_structured_mode(self, mode: str, error: BaseException) -> None:
+        """Fall back to prompt-and-scrape after the server rejected ``mode``."""
+        if mode not in self._unsupported_modes:
+            self._unsupported_modes.add(mode)
+            print(f"⚠️ [GROQ STRUCTURED OUTPUT] '{mode}' not supported by {settings.GROQ_BASE_URL}, scraping instead: {error}")
+
     async def get_completion(
         self, 
         messages: List[Dict[str, str]], 
         temperature: float = None,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        extra_params: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
     ) -> Optional[str]:
         """Get completion from Groq LLM"""
+        try:
+            content, _ = await self._complete(messages, temperature, max_tokens, extra_params, model)
+            return content
+        except Exception:
+            return None
+
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: int = 1000,
+        extra_params: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Send one chat completion; returns ``(text, finish_reason)``, errors are logged and re-raised.
+
+        ``extra_params`` carries structured-output options (``response_format`` or
+        ``tools``/``tool_choice``); a forced tool call's arguments are returned as text.
+        """
         start_time = time.time()
         request_id = f"groq_{int(start_time * 1000)}"
         temperature = temperature if temperature is not None else self.default_temperature
+        extra_params = extra_params or {}
+        model = model or self.model
         
         print(f"\n🚀 [GROQ REQUEST] {request_id}")
-        print(f"📤 Model: {self.model}")
+        print(f"📤 Model: {model}")
         print(f"📤 Temperature: {temperature}")
         print(f"📤 Max Tokens: {max_tokens}")
         print(f"📤 Messages: {len(messages)}")
@@ -35,15 +192,43 @@ class GroqClient:
             role = msg.get('role', 'unknown')
             content = msg.get('content', '')
             print(f"📤 Message {i+1} ({role}): {content[:200]}{'...' if len(content) > 200 else ''}")
+
+        cassette_request = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if extra_params:
+            cassette_request["params"] = extra_params
+        if llm_cassette.replaying:
+            recorded = llm_cassette.lookup("completion", cassette_request)
+            if is_miss(recorded):
+                return None, None
+            if isinstance(recorded, dict) and "finish_reason" in recorded:
+                return recorded.get("content"), recorded["finish_reason"]
+            return recorded, "stop"
         
         try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                messages=messages,
-                model=self.model,
-                temperature=temperature,
-                max_tokens=max_tokens
+            estimated = estimate_tokens(messages, max_tokens)
+            response = await call_with_retry(
+                lambda: self.client.chat.completions.create(
+                    messages=messages,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **extra_params,
+                ),
+                estimated_tokens=estimated,
+                label=request_id,
             )
+            rate_limiter.reconcile(estimated, getattr(response.usage, "total_tokens", None))
+            prompt_tokens = getattr(response.usage, "prompt_tokens", None)
+            completion_tokens = getattr(response.usage, "completion_tokens", None)
+            model_router.record(model, time.time() - start_time, prompt_tokens, completion_tokens)
+            usage_ledger.record(model, prompt_tokens, completion_tokens)
+            content = message_text(response.choices[0].message)
+            finish_reason = response.choices[0].finish_reason
             
             end_time = time.time()
             duration = end_time - start_time
@@ -51,122 +236,96 @@ class GroqClient:
             print(f"\n✅ [GROQ RESPONSE] {request_id}")
             print(f"📥 Duration: {duration:.2f}s")
             print(f"📥 Usage: {response.usage}")
-            print(f"📥 Response: {response.choices[0].message.content[:500]}{'...' if len(response.choices[0].message.content) > 500 else ''}")
+            print(f"📥 Finish Reason: {finish_reason}")
+            print(f"📥 Response: {(content or '')[:500]}{'...' if len(content or '') > 500 else ''}")
+
+            if llm_cassette.recording:
+                llm_cassette.record("completion", cassette_request, {"content": content, "finish_reason": finish_reason})
             
-            return response.choices[0].message.content
+            return content, finish_reason
             
         except Exception as e:
             end_time = time.time()
             duration = end_time - start_time
             
+            model_router.record(model, duration, ok=False)
             print(f"\n❌ [GROQ ERROR] {request_id}")
             print(f"📥 Duration: {duration:.2f}s")
             print(f"📥 Error: {e}")
             print(f"📥 Error Type: {type(e).__name__}")
-            return None
+            raise
     
     async def get_structured_response(
         self, 
         prompt: str, 
         response_format: Dict[str, Any],
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        expected_items: Optional[int] = None,
+        model: Optional[str] = None,
     ) -> Optional[Dict[str, Any]]:
-        """Get structured JSON response from Groq"""
+        """Get structured JSON response from Groq.
+
+        Uses the API's structured-output mechanism (``GROQ_STRUCTURED_OUTPUT``) and
+        only falls back to prompting for JSON and scraping it out of free text when the
+        server rejects that mechanism. ``max_tokens`` is sized from ``expected_items``
+        (records per response array); truncated replies are continued for the
+        missing items only.
+        """
         start_time = time.time()
         request_id = f"groq_structured_{int(start_time * 1000)}"
+        mode = self.structured_mode
         
         print(f"\n🎯 [GROQ STRUCTURED REQUEST] {request_id}")
-        print(f"📤 Model: {self.model}")
+        print(f"📤 Model: {model or self.model}")
         print(f"📤 Temperature: {temperature}")
+        print(f"📤 Structured Output: {mode}")
         print(f"📤 Response Format: {json.dumps(response_format, indent=2)}")
         print(f"📤 Prompt: {prompt[:300]}{'...' if len(prompt) > 300 else ''}")
         
         try:
-            # Add system message to ensure JSON output
-            system_message = f"""You are an AI agent that responds in valid JSON format. 
+            if mode == "tools":
+                # The schema travels as the function's parameters, not in the prompt.
+                system_message = f"You are an AI agent. Always answer by calling the {STRUCTURED_TOOL_NAME} function."
+            else:
+                # JSON mode requires the word JSON in the prompt; the schema still guides the shape.
+                system_message = f"""You are an AI agent that responds in valid JSON format. 
             Always respond with valid JSON that matches the expected structure.
-            Response format: {json.dumps(response_format, indent=2)}"""
+            Response format: {json.dumps(response_format, separators=(",", ":"))}"""
             
             messages = [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ]
             
-            response = await self.get_completion(messages, temperature)
-            if response:
-                try:
-                    parsed_response = json.loads(response)
-                    end_time = time.time()
-                    duration = end_time - start_time
-                    
-                    print(f"\n✅ [GROQ STRUCTURED RESPONSE] {request_id}")
-                    print(f"📥 Duration: {duration:.2f}s")
-                    print(f"📥 Parsed JSON: {json.dumps(parsed_response, indent=2)}")
-                    
-                    return parsed_response
-                except json.JSONDecodeError as json_error:
-                    # Try to extract JSON from the response if there's extra data
-                    try:
-                        # Look for the last JSON object in the response (skip schema definitions)
-                        json_objects = []
-                        start = 0
-                        while True:
-                            start_idx = response.find('{', start)
-                            if start_idx == -1:
-                                break
-                            
-                            # Find the matching closing brace
-                            brace_count = 0
-                            end_idx = start_idx
-                            for i in range(start_idx, len(response)):
-                                if response[i] == '{':
-                                    brace_count += 1
-                                elif response[i] == '}':
-                                    brace_count -= 1
-                                    if brace_count == 0:
-                                        end_idx = i + 1
-                                        break
-                            
-                            if end_idx > start_idx:
-                                json_part = response[start_idx:end_idx]
-                                try:
-                                    parsed = json.loads(json_part)
-                                    json_objects.append(parsed)
-                                except:
-                                    pass
-                            
-                            start = end_idx
-                        
-                        # Use the last valid JSON object (skip schema definitions)
-                        if json_objects:
-                            # Look for the object that matches our expected structure
-                            for obj in reversed(json_objects):
-                                if isinstance(obj, dict) and any(key in obj for key in ['expiry_recommendations', 'recommendations', 'actions']):
-                                    parsed_response = obj
-                                    break
-                            else:
-                                # If no matching structure found, use the last object
-                                parsed_response = json_objects[-1]
-                            
-                            end_time = time.time()
-                            duration = end_time - start_time
-                            
-                            print(f"\n✅ [GROQ STRUCTURED RESPONSE - EXTRACTED] {request_id}")
-                            print(f"📥 Duration: {duration:.2f}s")
-                            print(f"📥 Extracted JSON: {json.dumps(parsed_response, indent=2)}")
-                            print(f"📥 Note: Found {len(json_objects)} JSON objects, used the most relevant one")
-                            
-                            return parsed_response
-                    except Exception as extract_error:
-                        end_time = time.time()
-                        duration = end_time - start_time
-                        
-                        print(f"\n❌ [GROQ JSON PARSE ERROR] {request_id}")
-                        print(f"📥 Duration: {duration:.2f}s")
-                        print(f"📥 Raw Response: {response}")
-                        print(f"📥 JSON Error: {json_error}")
-                        print(f"📥 Extract Error: {extract_error}")
-                        return None
+            extra_params = structured_output_params(mode, response_format)
+
+            async def call(call_messages: List[Dict[str, Any]], max_tokens: int) -> Tuple[Optional[str], Optional[str]]:
+                return await self._complete(call_messages, temperature, max_tokens, extra_params, model)
+
+            try:
+                parsed_response = await complete_structured(
+                    call,
+                    messages,
+                    response_format,
+                    max_tokens=completion_budget(response_format, expected_items),
+                    max_continuations=settings.GROQ_MAX_CONTINUATIONS,
+                    token_ceiling=settings.GROQ_MAX_COMPLETION_TOKENS,
+                )
+            except Exception as e:
+                if mode == "off" or not is_structured_unsupported(e):
+                    raise
+                self.disable_structured_mode(mode, e)
+                return await self.get_structured_response(prompt, response_format, temperature, expected_items, model)
+
+            duration = time.time() - start_time
+            if parsed_response is not None:
+                print(f"\n✅ [GROQ STRUCTURED RESPONSE] {request_id}")
+                print(f"📥 Duration: {duration:.2f}s")
+                print(f"📥 Parsed JSON: {json.dumps(parsed_response, indent=2)}")
+                return parsed_response
+
+            print(f"\n❌ [GROQ JSON PARSE ERROR] {request_id}")
+            print(f"📥 Duration: {duration:.2f}s")
             return None
             
         except Exception as e:
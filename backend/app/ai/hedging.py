@@ -0,0 +1,136 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core.config import settings
+
+DecisionCall = Callable[[], Awaitable[Optional[Any]]]
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies used to pick the hedge delay."""
+
+    def __init__(self, window: int = 50):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+    def hedge_delay(self) -> float:
+        """Delay before starting the fallback: the configured percentile, clamped."""
+        observed = self.percentile(settings.AGENT_HEDGE_PERCENTILE)
+        if observed is None:
+            return settings.AGENT_HEDGE_DEFAULT_DELAY
+        return max(settings.AGENT_HEDGE_MIN_DELAY, observed)
+
+
+class HedgeStats:
+    def __init__(self) -> None:
+        self.decisions = 0
+        self.hedges_started = 0
+        self.wins: Dict[str, int] = {"primary": 0, "fallback": 0}
+        self.deadline_misses = 0
+        self.failures = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "decisions": self.decisions,
+            "hedges_started": self.hedges_started,
+            "wins": dict(self.wins),
+            "deadline_misses": self.deadline_misses,
+            "failures": self.failures,
+        }
+
+
+hedge_stats = HedgeStats()
+
+
+async def _guarded(label: str, call: DecisionCall) -> Optional[Any]:
+    try:
+        return await call()
+    except asyncio.CancelledError:
+        raise
+    except Exception as error:
+        print(f"❌ [{label.upper()} DECISION ERROR] {type(error).__name__}: {error}")
+        return None
+
+
+async def hedged_race(
+    primary: Optional[DecisionCall],
+    fallback: DecisionCall,
+    *,
+    deadline: float,
+    hedge_delay: float,
+    primary_latency: Optional[LatencyTracker] = None,
+    is_valid: Callable[[Any], bool] = bool,
+) -> Tuple[Optional[Any], Optional[str]]:
+    """Race the primary decision path against a speculatively started fallback.
+
+    The fallback starts once ``hedge_delay`` has elapsed without a valid primary
+    answer, or immediately if the primary fails. The first valid result wins and the
+    other task is cancelled; nothing is returned once ``deadline`` has passed.
+    Returns ``(result, "primary" | "fallback")`` or ``(None, None)``.
+    """
+    hedge_stats.decisions += 1
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    end = started + deadline
+    labels: Dict[asyncio.Task, str] = {}
+
+    def launch(label: str, call: DecisionCall) -> None:
+        labels[asyncio.create_task(_guarded(label, call))] = label
+
+    if primary is not None:
+        launch("primary", primary)
+    else:
+        launch("fallback", fallback)
+    fallback_started = primary is None
+    pending = set(labels)
+
+    try:
+        while True:
+            now = loop.time()
+            if now >= end:
+                hedge_stats.deadline_misses += 1
+                return None, None
+            if not pending and fallback_started:
+                hedge_stats.failures += 1
+                return None, None
+
+            if not fallback_started and (not pending or now - started >= hedge_delay):
+                hedge_stats.hedges_started += 1
+                launch("fallback", fallback)
+                pending = {task for task in labels if not task.done()}
+                fallback_started = True
+                continue
+
+            timeout = end - now
+            if not fallback_started:
+                timeout = min(timeout, started + hedge_delay - now)
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                label = labels[task]
+                result = task.result()
+                if is_valid(result):
+                    # Only valid replies count: fast 429s or unusable answers would drag the p90 down.
+                    if label == "primary" and primary_latency is not None:
+                        primary_latency.record(loop.time() - started)
+                    hedge_stats.wins[label] += 1
+                    return result, label
+    finally:
+        for task, label in labels.items():
+            if not task.done():
+                if label == "primary" and primary_latency is not None:
+                    # Censored sample: the primary took at least this long.
+                    primary_latency.record(loop.time() - started)
+                task.cancel()
+        leftovers = [task for task in labels if not task.done()]
+        if leftovers:
+            await asyncio.gather(*leftovers, return_exceptions=True)
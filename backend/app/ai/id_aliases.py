@@ -0,0 +1,209 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+UUID_PATTERN = re.compile(
+    r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"
+)
+ALIAS_PATTERN = re.compile(r"^[A-Z][0-9]+$", re.IGNORECASE)
+
+# Short prefixes per table so the model can tell an item from a vehicle.
+KIND_PREFIXES: Dict[str, str] = {
+    "inventory": "I",
+    "orders": "O",
+    "fleet": "V",
+    "merchants": "M",
+    "routes": "R",
+}
+GENERIC_PREFIX = "X"
+
+# Record columns that reference another table's primary key.
+FOREIGN_KEYS: Dict[str, str] = {
+    "item_id": "inventory",
+    "order_id": "orders",
+    "vehicle_id": "fleet",
+    "merchant_id": "merchants",
+    "route_id": "routes",
+}
+
+# Decision fields the agents read back as identifiers.
+ID_FIELDS = frozenset(FOREIGN_KEYS)
+ID_LIST_FIELDS = frozenset({"assigned_orders", "route_sequence", "target_items", "new_route"})
+
+
+class UnknownAliasError(ValueError):
+    """Raised when an LLM response references an identifier we never handed out."""
+
+
+class IdAliasTable:
+    """Per-decision mapping between UUIDs and short prompt tokens such as ``I1``/``V3``.
+
+    UUIDs are aliased on the way into the prompt and resolved on the way out, so the
+    model never has to reproduce 36 characters verbatim. Values that look like an
+    alias or a UUID but were not issued by this table are rejected.
+    """
+
+    def __init__(self) -> None:
+        self._alias_by_id: Dict[str, str] = {}
+        self._id_by_alias: Dict[str, str] = {}
+        self._counters: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._alias_by_id)
+
+    def alias_for(self, value: str, kind: Optional[str] = None) -> str:
+        key = value.lower()
+        existing = self._alias_by_id.get(key)
+        if existing:
+            return existing
+        prefix = KIND_PREFIXES.get(kind or "", GENERIC_PREFIX)
+        self._counters[prefix] = self._counters.get(prefix, 0) + 1
+        alias = f"{prefix}{self._counters[prefix]}"
+        self._alias_by_id[key] = alias
+        self._id_by_alias[alias] = value
+        return alias
+
+    def register_records(self, kind: str, records: Iterable[Dict[str, Any]]) -> None:
+        """Alias the primary and foreign keys of ``records`` coming from table ``kind``."""
+        for record in records or []:
+            if not isinstance(record, dict):
+                continue
+            record_id = record.get("id")
+            if isinstance(record_id, str) and UUID_PATTERN.fullmatch(record_id):
+                self.alias_for(record_id, kind)
+            for column, target_kind in FOREIGN_KEYS.items():
+                value = record.get(column)
+                if isinstance(value, str) and UUID_PATTERN.fullmatch(value):
+                    self.alias_for(value, target_kind)
+
+    def encode(self, text: str) -> str:
+        """Replace every UUID in ``text`` with its alias (unregistered UUIDs get an ``X`` alias)."""
+        return UUID_PATTERN.sub(lambda match: self.alias_for(match.group(0)), text)
+
+    def resolve(self, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        token = value.strip()
+        if ALIAS_PATTERN.match(token):
+            original = self._id_by_alias.get(token.upper())
+            if original is None:
+                raise UnknownAliasError(f"Unknown alias '{token}'")
+            return original
+        if UUID_PATTERN.fullmatch(token):
+            if token.lower() not in self._alias_by_id:
+                raise UnknownAliasError(f"Identifier '{token}' was not part of the prompt")
+            return token
+        # Free-text values (e.g. descriptive item names) are passed through untouched.
+        return value
+
+    def _resolve_record(self, record: Dict[str, Any], rejected: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Resolve one entry; nested entries with unknown ids are dropped into ``rejected``."""
+        resolved: Dict[str, Any] = {}
+        for key, value in record.items():
+            if key in ID_FIELDS:
+                resolved[key] = self.resolve(value)
+            elif key in ID_LIST_FIELDS and isinstance(value, list):
+                resolved[key] = [self.resolve(entry) for entry in value]
+            elif isinstance(value, dict):
+                resolved[key] = self._resolve_record(value, rejected)
+            elif isinstance(value, list):
+                resolved[key], rejected = self._resolve_list(value, rejected)
+            else:
+                resolved[key] = value
+        return resolved
+
+    def _resolve_list(
+        self, values: List[Any], rejected: List[Dict[str, Any]]
+    ) -> Tuple[List[Any], List[Dict[str, Any]]]:
+        kept: List[Any] = []
+        for entry in values:
+            if isinstance(entry, dict):
+                nested: List[Dict[str, Any]] = []
+                try:
+                    kept.append(self._resolve_record(entry, nested))
+                except UnknownAliasError as error:
+                    rejected.append({"entry": entry, "error": str(error)})
+                    continue
+                rejected.extend(nested)
+            else:
+                kept.append(entry)
+        return kept, rejected
+
+    def resolve_decision(self, decision: Any) -> Tuple[Any, List[Dict[str, Any]]]:
+        """Resolve aliases throughout a decision payload.
+
+        Returns the resolved decision and the list of entries that were dropped because
+        they referenced unknown identifiers. A top-level object that cannot be resolved
+        yields ``None``.
+        """
+        rejected: List[Dict[str, Any]] = []
+        if isinstance(decision, list):
+            resolved, rejected = self._resolve_list(decision, rejected)
+            return resolved, rejected
+        if not isinstance(decision, dict):
+            return decision, rejected
+
+        resolved_decision: Dict[str, Any] = {}
+        try:
+            for key, value in decision.items():
+                if isinstance(value, list) and key not in ID_LIST_FIELDS:
+                    resolved_decision[key], rejected = self._resolve_list(value, rejected)
+                elif isinstance(value, dict):
+                    nested, nested_rejected = self.resolve_decision(value)
+                    rejected.extend(nested_rejected)
+                    resolved_decision[key] = nested
+                elif key in ID_FIELDS:
+                    resolved_decision[key] = self.resolve(value)
+                elif key in ID_LIST_FIELDS and isinstance(value, list):
+                    resolved_decision[key] = [self.resolve(entry) for entry in value]
+                else:
+                    resolved_decision[key] = value
+        except UnknownAliasError as error:
+            rejected.append({"entry": decision, "error": str(error)})
+            return None, rejected
+        return resolved_decision, rejected
+
+
+def record_ids(id_sources: Optional[Dict[str, List[Dict[str, Any]]]]) -> set:
+    """Every identifier carried by the records behind a prompt (primary and foreign keys)."""
+    ids = set()
+    for records in (id_sources or {}).values():
+        for record in records or []:
+            for key in ("id", *ID_FIELDS):
+                if record.get(key):
+                    ids.add(str(record[key]))
+    return ids
+
+
+def _references_only(entry: Dict[str, Any], known_ids: set) -> bool:
+    for key, value in entry.items():
+        if key in ID_FIELDS and value is not None and str(value) not in known_ids:
+            return False
+        if key in ID_LIST_FIELDS and isinstance(value, list) and any(str(v) not in known_ids for v in value):
+            return False
+    return True
+
+
+def drop_stale_entries(decision: Any, known_ids: set) -> Any:
+    """Keep the parts of a resolved decision whose identifiers are all in ``known_ids``.
+
+    Used to replay an earlier decision: entries about records that are no longer
+    pending/available are removed. Returns ``None`` when nothing usable is left.
+    """
+    if isinstance(decision, list):
+        kept = [entry for entry in decision if not isinstance(entry, dict) or _references_only(entry, known_ids)]
+        return kept or None
+    if not isinstance(decision, dict) or not _references_only(decision, known_ids):
+        return None
+
+    filtered: Dict[str, Any] = {}
+    had_entries = False
+    for key, value in decision.items():
+        if isinstance(value, list) and key not in ID_LIST_FIELDS and any(isinstance(v, dict) for v in value):
+            had_entries = True
+            value = drop_stale_entries(value, known_ids) or []
+        filtered[key] = value
+    if had_entries and not any(
+        isinstance(value, list) and value for key, value in filtered.items() if key not in ID_LIST_FIELDS
+    ):
+        return None
+    return filtered
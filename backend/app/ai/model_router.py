@@ -0,0 +1,140 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.config import settings
+from .hedging import LatencyTracker
+
+# Sub-task -> (model tier, urgency). Classification-style tasks with short answers go to
+# the fast tier; multi-vehicle route planning needs the large model. Urgent tasks may
+# be moved off a tier whose recent latency breaks the SLO.
+DEFAULT_ROUTES: Dict[str, Tuple[str, str]] = {
+    "check_low_stock": ("fast", "normal"),
+    "optimize_inventory": ("fast", "low"),
+    "handle_expired_items": ("fast", "high"),
+    "handle_inventory_optimization": ("fast", "low"),
+    "optimize_routes": ("large", "normal"),
+    "explain_routes": ("fast", "low"),
+    "assign_vehicles": ("fast", "high"),
+    "handle_dynamic_routing": ("large", "high"),
+    "analyze_market_conditions": ("fast", "low"),
+    "optimize_inventory_pricing": ("fast", "normal"),
+    "handle_dynamic_pricing": ("fast", "normal"),
+}
+
+
+@dataclass
+class ModelMetrics:
+    """Per-model call counts, token totals and latency, used to tune the routing table."""
+
+    latency: LatencyTracker = field(default_factory=LatencyTracker)
+    requests: int = 0
+    failures: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    routed: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50": self.latency.percentile(50),
+            "latency_p90": self.latency.percentile(90),
+            "routed_tasks": dict(self.routed),
+        }
+
+
+class ModelRouter:
+    """Pick a Groq model per agent sub-task.
+
+    The table gives each sub-task a tier and an urgency. Prompts too large for the
+    fast model are promoted to the large tier, and urgent tasks move to the other
+    tier when the chosen model's recent p90 latency exceeds ``MODEL_URGENT_LATENCY_SLO``
+    and the alternative is faster.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, str]] = None,
+        routes: Optional[Dict[str, Tuple[str, str]]] = None,
+    ):
+        self.tiers = tiers or {"fast": settings.GROQ_FAST_MODEL, "large": settings.GROQ_LARGE_MODEL}
+        self.routes = dict(DEFAULT_ROUTES)
+        self.routes.update(routes if routes is not None else self._routes_from_settings())
+        self.metrics: Dict[str, ModelMetrics] = {}
+
+    @staticmethod
+    def _routes_from_settings() -> Dict[str, Tuple[str, str]]:
+        """``MODEL_ROUTES`` overrides, e.g. ``{"check_low_stock": ["large", "high"]}``."""
+        if not settings.MODEL_ROUTES:
+            return {}
+        try:
+            return {task: tuple(route) for task, route in json.loads(settings.MODEL_ROUTES).items()}
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ Ignoring invalid MODEL_ROUTES: {e}")
+            return {}
+
+    def _metrics(self, model: str) -> ModelMetrics:
+        if model not in self.metrics:
+            self.metrics[model] = ModelMetrics()
+        return self.metrics[model]
+
+    def route(self, task: Optional[str]) -> Tuple[str, str]:
+        """``(tier, urgency)`` for ``task``; unknown tasks use the fast tier."""
+        return self.routes.get(task or "", ("fast", "normal"))
+
+    def select(self, task: Optional[str], prompt_tokens: int, urgency: Optional[str] = None) -> str:
+        tier, default_urgency = self.route(task)
+        urgency = urgency or default_urgency
+        if prompt_tokens > settings.MODEL_FAST_MAX_PROMPT_TOKENS:
+            tier = "large"
+
+        model = self.tiers.get(tier, settings.GROQ_MODEL)
+        if urgency == "high":
+            other = self.tiers.get("fast" if tier == "large" else "large")
+            current_p90 = self._metrics(model).latency.percentile(90)
+            if (
+                other
+                and other != model
+                and current_p90 is not None
+                and current_p90 > settings.MODEL_URGENT_LATENCY_SLO
+                # Never move a prompt onto the fast model if it does not fit there.
+                and (tier == "fast" or prompt_tokens <= settings.MODEL_FAST_MAX_PROMPT_TOKENS)
+            ):
+                other_p90 = self._metrics(other).latency.percentile(90)
+                if other_p90 is None or other_p90 < current_p90:
+                    model = other
+
+        routed = self._metrics(model).routed
+        routed[task or "unknown"] = routed.get(task or "unknown", 0) + 1
+        return model
+
+    def record(
+        self,
+        model: str,
+        seconds: float,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        ok: bool = True,
+    ) -> None:
+        metrics = self._metrics(model)
+        metrics.requests += 1
+        if ok:
+            metrics.latency.record(seconds)
+        else:
+            metrics.failures += 1
+        metrics.prompt_tokens += prompt_tokens or 0
+        metrics.completion_tokens += completion_tokens or 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tiers": dict(self.tiers),
+            "routes": {task: list(route) for task, route in self.routes.items()},
+            "models": {model: metrics.as_dict() for model, metrics in self.metrics.items()},
+        }
+
+
+# Global instance
+model_router = ModelRouter()
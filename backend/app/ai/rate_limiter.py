@@ -0,0 +1,229 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import httpx
+
+from ..core.config import settings
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``capacity`` per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(per_minute, 1))
+        self.refill_rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if they already are)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class GroqRateLimiter:
+    """Shared requests-per-minute and tokens-per-minute limiter for all LLM paths.
+
+    Every caller (AG2 engine and direct Groq client) acquires from the same two
+    buckets, so concurrent agents queue locally instead of tripping 429s upstream.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = asyncio.Lock()
+        self._blocked_until = 0.0
+        self.throttled_seconds = 0.0
+        self.throttle_events = 0
+        self.rate_limited_responses = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.failures = 0
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """Wait until one request and ``estimated_tokens`` fit the quota; return seconds waited."""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                delay = max(
+                    self._blocked_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(estimated_tokens),
+                )
+                if delay <= 0:
+                    break
+                waited += delay
+                await asyncio.sleep(delay)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+        if waited:
+            self.throttled_seconds += waited
+            self.throttle_events += 1
+        return waited
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket once the real usage of a call is known."""
+        if actual_tokens is None:
+            return
+        difference = estimated_tokens - actual_tokens
+        if difference > 0:
+            self.tokens.give_back(difference)
+        elif difference < 0:
+            self.tokens.take(-difference)
+
+    def block_for(self, seconds: float) -> None:
+        """Pause every caller, e.g. after the server answered 429 with Retry-After."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": int(self.requests.capacity),
+            "tokens_per_minute": int(self.tokens.capacity),
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "throttle_events": self.throttle_events,
+            "rate_limited_responses": self.rate_limited_responses,
+            "retries": self.retries,
+            "backoff_seconds": round(self.backoff_seconds, 3),
+            "failures": self.failures,
+        }
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: int = 0) -> int:
+    """Cheap prompt-size estimate (~4 characters per token) plus the completion budget."""
+    characters = sum(len(str(message.get("content", ""))) for message in messages)
+    return characters // 4 + max_tokens
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    # SDK errors expose status_code directly; httpx.HTTPStatusError only via .response.
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+# Error codes for a generation the server could not turn into valid JSON/tool calls.
+# The request itself is fine, so another attempt may succeed.
+GENERATION_FAILURE_CODES = frozenset({"tool_use_failed", "json_validate_failed", "output_parse_failed"})
+
+
+def error_payload(error: BaseException) -> Dict[str, Any]:
+    """The OpenAI-style ``{"error": {...}}`` object of an API error, or ``{}``."""
+    body = getattr(error, "body", None)
+    if body is None:
+        response = getattr(error, "response", None)
+        try:
+            body = response.json() if response is not None else None
+        except Exception:
+            body = None
+    if isinstance(body, dict) and isinstance(body.get("error"), dict):
+        body = body["error"]
+    return body if isinstance(body, dict) else {}
+
+
+def is_generation_failure(error: BaseException) -> bool:
+    return status_code_of(error) == 400 and error_payload(error).get("code") in GENERATION_FAILURE_CODES
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Parse the Retry-After header of an SDK error, if the server sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return status_code_of(error) == 429
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = status_code_of(error)
+    if status is not None:
+        return status == 429 or status >= 500 or is_generation_failure(error)
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    return type(error).__name__ in {"APIConnectionError", "APITimeoutError"}
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    ceiling = min(settings.GROQ_RETRY_MAX_DELAY, settings.GROQ_RETRY_BASE_DELAY * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+async def call_with_retry(
+    call: Callable[[], Awaitable[T]],
+    *,
+    estimated_tokens: int,
+    label: str,
+    limiter: Optional[GroqRateLimiter] = None,
+    max_retries: Optional[int] = None,
+) -> T:
+    """Run ``call`` under the shared limiter, retrying 429s/5xx/failed generations/transport errors.
+
+    Non-retryable errors and the last failed attempt are re-raised to the caller.
+    """
+    limiter = limiter or rate_limiter
+    max_retries = settings.AGENT_MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        await limiter.acquire(estimated_tokens)
+        try:
+            return await call()
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            retry_after = retry_after_seconds(error)
+            if is_rate_limited(error):
+                limiter.rate_limited_responses += 1
+                if retry_after is not None:
+                    limiter.block_for(retry_after)
+            if attempt >= max_retries or not is_retryable(error):
+                limiter.failures += 1
+                raise
+            delay = backoff_delay(attempt, retry_after)
+            attempt += 1
+            limiter.retries += 1
+            limiter.backoff_seconds += delay
+            print(f"🔁 [LLM RETRY] {label} attempt {attempt}/{max_retries} in {delay:.2f}s ({type(error).__name__})")
+            await asyncio.sleep(delay)
+
+
+# Global instance shared by every agent and LLM path
+rate_limiter = GroqRateLimiter(settings.GROQ_REQUESTS_PER_MINUTE, settings.GROQ_TOKENS_PER_MINUTE)
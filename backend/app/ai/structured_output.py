@@ -0,0 +1,428 @@
+import json
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# A compiled validator returns a list of "path: problem" strings (empty when valid).
+Validator = Callable[[Any, str], List[str]]
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: (isinstance(value, int) and not isinstance(value, bool))
+    or (isinstance(value, float) and value.is_integer()),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+
+class SchemaValidationError(ValueError):
+    """Raised when an LLM decision does not match the caller's ``response_format``."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors[:5]))
+        self.errors = errors
+
+
+_DECODER = json.JSONDecoder()
+
+
+def _balanced_spans(text: str) -> List[Tuple[int, int]]:
+    """``(start, end)`` of every balanced ``{...}``/``[...]`` span, sorted by start.
+
+    A single pass keeps the open brackets on a stack, so nested spans are recorded
+    as well as outer ones and unclosed brackets simply never produce a span. Quotes
+    in the surrounding prose (outside any bracket) are not string delimiters, and a
+    raw newline ends a string: JSON strings cannot contain one, so this keeps a
+    stray quote from swallowing the rest of the reply.
+    """
+    spans: List[Tuple[int, int]] = []
+    stack: List[int] = []
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"' or char == "\n":
+                in_string = False
+        elif char == '"':
+            in_string = bool(stack)
+        elif char in "{[":
+            stack.append(index)
+        elif char in "}]" and stack:
+            spans.append((stack.pop(), index))
+    spans.sort()
+    return spans
+
+
+def _decode_span(text: str, start: int, end: int) -> Tuple[Any, int]:
+    """Decode the span ``text[start:end + 1]``.
+
+    Returns ``(value, index after it)``, or ``(None, error position)`` when it is not
+    valid JSON. The decoder is given a window that doubles from a small size rather
+    than the whole reply, because building a ``JSONDecodeError`` counts lines up to
+    the error: a failure then costs about the distance to its error, not to ``start``.
+    An error close to the end of a window (or an unterminated string) may only mean
+    the window was too short, so it is retried with a larger one.
+    """
+    window = 256
+    while True:
+        stop = min(end + 1, start + window)
+        chunk = text[start:stop]
+        try:
+            value, length = _DECODER.raw_decode(chunk)
+            return value, start + length
+        except json.JSONDecodeError as error:
+            truncated = stop <= end and (error.pos >= len(chunk) - 16 or error.msg.startswith("Unterminated string"))
+            if not truncated:
+                return None, start + error.pos
+        window *= 2
+
+
+def iter_json_candidates(text: str) -> List[Any]:
+    """Return every top-level JSON object/array embedded in ``text``, in order.
+
+    Spans are parsed outermost first and a parsed span hides the spans inside it.
+    When a span is not valid JSON, the spans nested inside it become candidates,
+    except those around the decoder's error position: they fail at the same place.
+    Decoding stops at the error, so each character is decoded a bounded number of
+    times and the extraction stays linear however many stray brackets the text holds.
+    """
+    candidates: List[Any] = []
+    parsed_until = 0
+    failed_at = -1  # error position of the last span that was not valid JSON
+    for start, end in _balanced_spans(text):
+        if start < parsed_until or start < failed_at <= end:
+            continue
+        try:
+            value, position = _decode_span(text, start, end)
+        except RecursionError:
+            # Nested too deeply for the decoder; nothing inside is a usable decision.
+            parsed_until = end + 1
+            continue
+        if value is None:
+            failed_at = position
+        else:
+            candidates.append(value)
+            parsed_until = position
+    return candidates
+
+
+def _is_schema_echo(value: Any) -> bool:
+    return isinstance(value, dict) and (
+        "response_schema" in value or (value.get("type") == "object" and "properties" in value)
+    )
+
+
+def extract_json(text: Optional[str], schema: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+    """Parse an LLM reply, tolerating prose and echoed schemas around the JSON.
+
+    With a ``schema`` the last candidate that validates wins; otherwise (or if none
+    validates) the last candidate that is not an echo of the schema itself.
+    """
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    candidates = [value for value in iter_json_candidates(text) if not _is_schema_echo(value)]
+    if not candidates:
+        return None
+    if schema:
+        validator = compile_validator(schema)
+        for value in reversed(candidates):
+            if not validator(value, "$"):
+                return value
+    return candidates[-1]
+
+
+def _compile(schema: Dict[str, Any]) -> Validator:
+    checks: List[Validator] = []
+
+    kind = schema.get("type")
+    if isinstance(kind, str) and kind in _TYPE_CHECKS:
+        type_check = _TYPE_CHECKS[kind]
+
+        def check_type(value: Any, path: str) -> List[str]:
+            return [] if type_check(value) else [f"{path}: expected {kind}, got {type(value).__name__}"]
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value: Any, path: str) -> List[str]:
+            return [] if value in allowed else [f"{path}: {value!r} not in {allowed}"]
+
+        checks.append(check_enum)
+
+    properties = {name: _compile(sub) for name, sub in (schema.get("properties") or {}).items()}
+    required = list(schema.get("required") or [])
+    if properties or required:
+
+        def check_object(value: Any, path: str) -> List[str]:
+            if not isinstance(value, dict):
+                return []
+            errors = [f"{path}.{name}: missing" for name in required if name not in value]
+            for name, validator in properties.items():
+                if name in value and value[name] is not None:
+                    errors.extend(validator(value[name], f"{path}.{name}"))
+            return errors
+
+        checks.append(check_object)
+
+    if isinstance(schema.get("items"), dict):
+        item_validator = _compile(schema["items"])
+
+        def check_items(value: Any, path: str) -> List[str]:
+            if not isinstance(value, list):
+                return []
+            errors: List[str] = []
+            for index, item in enumerate(value):
+                errors.extend(item_validator(item, f"{path}[{index}]"))
+            return errors
+
+        checks.append(check_items)
+
+    def validate(value: Any, path: str = "$") -> List[str]:
+        errors: List[str] = []
+        for check in checks:
+            errors.extend(check(value, path))
+            if errors:
+                # Later checks assume the type matched.
+                break
+        return errors
+
+    return validate
+
+
+@lru_cache(maxsize=128)
+def _compile_canonical(canonical: str) -> Validator:
+    return _compile(json.loads(canonical))
+
+
+def compile_validator(schema: Dict[str, Any]) -> Validator:
+    """Validator for a ``response_format`` schema, compiled once per distinct schema.
+
+    Agents rebuild their schema dicts on every call, so the cache is keyed by the
+    schema's canonical JSON rather than object identity.
+    """
+    return _compile_canonical(json.dumps(schema, sort_keys=True))
+
+
+def validate_decision(decision: Any, schema: Optional[Dict[str, Any]]) -> None:
+    """Raise ``SchemaValidationError`` if ``decision`` does not match ``schema``."""
+    if not schema:
+        return
+    errors = compile_validator(schema)(decision, "$")
+    if errors:
+        raise SchemaValidationError(errors)
+
+
+def matches_schema(decision: Any, schema: Optional[Dict[str, Any]]) -> bool:
+    if not decision:
+        return False
+    return not schema or not compile_validator(schema)(decision, "$")
+
+
+# Rough completion-token cost of one value, by schema type. Free-text fields the agents
+# fill with explanations are much longer than identifiers or labels.
+_VALUE_TOKENS = {"string": 10, "integer": 3, "number": 4, "boolean": 2, "null": 2}
+_PROSE_TOKENS = 60
+_PROSE_FIELDS = ("reason", "explanation", "impact", "description", "summary", "strategy")
+_DEFAULT_ARRAY_ITEMS = 3
+
+
+def _value_tokens(schema: Dict[str, Any], field: str = "", items: Optional[int] = None) -> int:
+    kind = schema.get("type", "string")
+    if kind == "object":
+        return 2 + sum(
+            4 + _value_tokens(sub, name, items) for name, sub in (schema.get("properties") or {}).items()
+        )
+    if kind == "array":
+        count = items if items is not None else _DEFAULT_ARRAY_ITEMS
+        # Only the outermost arrays scale with the expected item count.
+        return 2 + count * (1 + _value_tokens(schema.get("items") or {}, field))
+    if "enum" in schema:
+        return 3
+    if kind == "string" and any(marker in field.lower() for marker in _PROSE_FIELDS):
+        return _PROSE_TOKENS
+    return _VALUE_TOKENS.get(kind, 10)
+
+
+def estimate_max_tokens(
+    schema: Optional[Dict[str, Any]],
+    expected_items: Optional[int],
+    minimum: int,
+    maximum: int,
+) -> int:
+    """Size ``max_tokens`` for a reply to ``schema`` with ``expected_items`` per array.
+
+    Adds 25% headroom and clamps to ``[minimum, maximum]``.
+    """
+    if not schema:
+        return minimum
+    estimate = _value_tokens(schema, items=expected_items if expected_items else None)
+    return max(minimum, min(maximum, int(estimate * 1.25) + 32))
+
+
+def _is_top_level_array(stack: List[str]) -> bool:
+    """True inside the reply's own array or an array directly under its root object."""
+    return bool(stack) and stack[-1] == "[" and (len(stack) == 1 or stack == ["{", "["])
+
+
+def salvage_truncated_json(text: Optional[str]) -> Optional[Any]:
+    """Recover the complete part of a JSON reply cut off by the token limit.
+
+    Keeps every finished element of the top-level arrays (the reply itself, or the
+    arrays of its root object) and closes the open containers, so a reply truncated
+    inside its fifth recommendation yields the first four. The item being written is
+    dropped whole, even if its own nested arrays had complete elements: a route with
+    half its stops must not pass for a finished one. Returns the parsed value, or
+    ``None`` if nothing usable precedes the cut.
+    """
+    if not text:
+        return None
+    start = min((index for index in (text.find("{"), text.find("[")) if index != -1), default=-1)
+    if start == -1:
+        return None
+
+    stack: List[str] = []
+    cut: Optional[int] = None
+    cut_stack: tuple = ()
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+            if _is_top_level_array(stack):
+                cut, cut_stack = index + 1, tuple(stack)
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return extract_json(text[start : index + 1])
+            if _is_top_level_array(stack) or (stack == ["{"] and char == "]"):
+                cut, cut_stack = index + 1, tuple(stack)
+        elif char == "," and _is_top_level_array(stack):
+            cut, cut_stack = index, tuple(stack)
+
+    if cut is None:
+        return None
+    closers = "".join("]" if opener == "[" else "}" for opener in reversed(cut_stack))
+    try:
+        return json.loads(text[start:cut] + closers)
+    except json.JSONDecodeError:
+        return None
+
+
+def _array_fields(schema: Optional[Dict[str, Any]]) -> List[str]:
+    properties = (schema or {}).get("properties") or {}
+    return [name for name, sub in properties.items() if isinstance(sub, dict) and sub.get("type") == "array"]
+
+
+def _item_key(item: Any) -> str:
+    if isinstance(item, dict):
+        ids = {key: value for key, value in item.items() if key.endswith("_id")}
+        if ids:
+            return json.dumps(ids, sort_keys=True, default=str)
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def continuation_request(partial: Any, schema: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Prompt asking only for the array items missing from a truncated reply.
+
+    Returns ``None`` when the schema has no top-level arrays to continue.
+    """
+    fields = _array_fields(schema)
+    if not fields or not isinstance(partial, dict):
+        return None
+    returned = []
+    for name in fields:
+        keys = []
+        for item in partial.get(name) or []:
+            ids = [str(value) for key, value in item.items() if key.endswith("_id")] if isinstance(item, dict) else []
+            keys.append("/".join(ids) if ids else json.dumps(item, default=str)[:40])
+        returned.append(f"{name}: {', '.join(keys) if keys else 'none'}")
+    return (
+        "Your previous reply was cut off by the output token limit; the items above are complete. "
+        "Reply with the same JSON structure containing ONLY the items that are still missing, "
+        "and use an empty array where nothing is left. Already returned - " + "; ".join(returned)
+    )
+
+
+def merge_continuation(partial: Any, more: Any, schema: Optional[Dict[str, Any]]) -> int:
+    """Append new array items from ``more`` into ``partial``; returns how many were added."""
+    if not isinstance(partial, dict) or not isinstance(more, dict):
+        return 0
+    added = 0
+    for name in _array_fields(schema):
+        existing = partial.setdefault(name, [])
+        if not isinstance(existing, list) or not isinstance(more.get(name), list):
+            continue
+        seen = {_item_key(item) for item in existing}
+        for item in more[name]:
+            key = _item_key(item)
+            if key not in seen:
+                seen.add(key)
+                existing.append(item)
+                added += 1
+    return added
+
+
+# (text, finish_reason) for a message list and a max_tokens budget.
+CompletionCall = Callable[[List[Dict[str, Any]], int], Awaitable[Tuple[Optional[str], Optional[str]]]]
+
+
+async def complete_structured(
+    call: CompletionCall,
+    messages: List[Dict[str, Any]],
+    schema: Optional[Dict[str, Any]],
+    max_tokens: int,
+    max_continuations: int,
+    token_ceiling: int,
+) -> Optional[Any]:
+    """Run ``call`` and parse the reply, recovering from ``finish_reason == "length"``.
+
+    A truncated reply keeps its complete items and the model is asked, with a doubled
+    budget, for only the missing ones, up to ``max_continuations`` times.
+    """
+    text, finish_reason = await call(messages, max_tokens)
+    if finish_reason != "length":
+        return extract_json(text, schema)
+
+    partial = salvage_truncated_json(text)
+    for _ in range(max_continuations):
+        request = continuation_request(partial, schema)
+        if request is None:
+            break
+        print(f"✂️ [TRUNCATED REPLY] continuing after {sum(len(partial.get(f) or []) for f in _array_fields(schema))} items")
+        max_tokens = min(max_tokens * 2, token_ceiling)
+        follow_up = messages + [
+            {"role": "assistant", "content": json.dumps(partial, separators=(",", ":"))},
+            {"role": "user", "content": request},
+        ]
+        text, finish_reason = await call(follow_up, max_tokens)
+        more = salvage_truncated_json(text) if finish_reason == "length" else extract_json(text, schema)
+        added = merge_continuation(partial, more, schema)
+        if finish_reason != "length" or not added:
+            break
+    return partial
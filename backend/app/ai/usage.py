@@ -0,0 +1,169 @@
+import json
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.config import settings
+
+# (agent_id, agent_type, sub-task) of the decision an LLM call is made for. Set by
+# BaseAgent.make_decision; hedged tasks inherit it because asyncio copies the context.
+llm_call_scope: ContextVar[Tuple[str, str, str]] = ContextVar(
+    "llm_call_scope", default=("system", "system", "unknown")
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+# (bucket start, agent_id, agent_type, task, model)
+BucketKey = Tuple[datetime, str, str, str, str]
+
+
+class LLMUsageLedger:
+    """Token usage per agent, sub-task and model in fixed time buckets.
+
+    Buckets cover ``LLM_USAGE_BUCKET_SECONDS`` and are kept for the budget window
+    (``LLM_BUDGET_WINDOW_SECONDS``); summing them gives a rolling total. Rows are
+    upserted into ``llm_usage`` by ``flush()`` and reloaded on first use, so budgets
+    survive restarts.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[BucketKey, Dict[str, int]] = {}
+        self._dirty: set = set()
+        self._loaded = False
+        self.budgets = self._budgets_from_settings()
+
+    @staticmethod
+    def _budgets_from_settings() -> Dict[str, int]:
+        """``LLM_TOKEN_BUDGETS`` maps agent types to tokens per window, e.g. ``{"route_optimization": 50000}``."""
+        if not settings.LLM_TOKEN_BUDGETS:
+            return {}
+        try:
+            return {agent: int(tokens) for agent, tokens in json.loads(settings.LLM_TOKEN_BUDGETS).items()}
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"⚠️ Ignoring invalid LLM_TOKEN_BUDGETS: {e}")
+            return {}
+
+    @staticmethod
+    def _bucket_start(moment: datetime) -> datetime:
+        size = max(1, settings.LLM_USAGE_BUCKET_SECONDS)
+        seconds = int((moment - _EPOCH).total_seconds())
+        return _EPOCH + timedelta(seconds=seconds // size * size)
+
+    @staticmethod
+    def _row_id(key: BucketKey) -> str:
+        bucket, agent_id, _, task, model = key
+        return f"{bucket:%Y%m%d%H%M%S}:{agent_id}:{task}:{model}"
+
+    def _client(self):
+        from ..core.supabase import supabase_client
+
+        return supabase_client.get_client()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.LLM_BUDGET_WINDOW_SECONDS)
+        try:
+            rows = self._client().table("llm_usage").select("*").gte("bucket_start", cutoff.isoformat()).execute().data
+        except Exception as e:
+            print(f"Error loading LLM usage: {e}")
+            return
+        for row in rows:
+            bucket_start = row["bucket_start"]
+            if isinstance(bucket_start, str):
+                bucket_start = datetime.fromisoformat(bucket_start.replace("Z", "+00:00")).replace(tzinfo=None)
+            key = (bucket_start, row["agent_id"], row["agent_type"], row["task"], row["model"])
+            self._buckets[key] = {
+                "requests": row.get("requests") or 0,
+                "prompt_tokens": row.get("prompt_tokens") or 0,
+                "completion_tokens": row.get("completion_tokens") or 0,
+            }
+
+    def _prune(self, now: datetime) -> None:
+        cutoff = now - timedelta(seconds=settings.LLM_BUDGET_WINDOW_SECONDS)
+        for key in [key for key in self._buckets if key[0] < self._bucket_start(cutoff)]:
+            del self._buckets[key]
+            self._dirty.discard(key)
+
+    def record(self, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+        """Attribute one completed LLM call to the current ``llm_call_scope``."""
+        agent_id, agent_type, task = llm_call_scope.get()
+        now = datetime.utcnow()
+        key = (self._bucket_start(now), agent_id, agent_type, task, model)
+        with self._lock:
+            self._ensure_loaded()
+            bucket = self._buckets.setdefault(key, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            bucket["requests"] += 1
+            bucket["prompt_tokens"] += prompt_tokens or 0
+            bucket["completion_tokens"] += completion_tokens or 0
+            self._dirty.add(key)
+
+    def flush(self) -> None:
+        """Persist the buckets changed since the last flush."""
+        with self._lock:
+            self._prune(datetime.utcnow())
+            rows = [
+                {
+                    "id": self._row_id(key),
+                    "bucket_start": key[0],
+                    "agent_id": key[1],
+                    "agent_type": key[2],
+                    "task": key[3],
+                    "model": key[4],
+                    **self._buckets[key],
+                    "updated_at": datetime.utcnow(),
+                }
+                for key in self._dirty
+            ]
+            self._dirty.clear()
+        if not rows:
+            return
+        try:
+            self._client().table("llm_usage").upsert(rows).execute()
+        except Exception as e:
+            print(f"Error persisting LLM usage: {e}")
+
+    def window_tokens(self, agent_type: Optional[str] = None) -> int:
+        """Prompt plus completion tokens in the rolling window (optionally for one agent type)."""
+        with self._lock:
+            self._ensure_loaded()
+            self._prune(datetime.utcnow())
+            return sum(
+                bucket["prompt_tokens"] + bucket["completion_tokens"]
+                for key, bucket in self._buckets.items()
+                if agent_type is None or key[2] == agent_type
+            )
+
+    def budget_for(self, agent_type: str) -> int:
+        """Token budget per window for ``agent_type``; 0 means unlimited."""
+        return self.budgets.get(agent_type, settings.LLM_TOKEN_BUDGET)
+
+    def over_budget(self, agent_type: str) -> bool:
+        budget = self.budget_for(agent_type)
+        return budget > 0 and self.window_tokens(agent_type) >= budget
+
+    def agent_usage(self, agent_type: str) -> Dict[str, Any]:
+        return {
+            "window_tokens": self.window_tokens(agent_type),
+            "budget": self.budget_for(agent_type),
+            "over_budget": self.over_budget(agent_type),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            self._prune(datetime.utcnow())
+            totals: Dict[str, Dict[str, Dict[str, int]]] = {"agents": {}, "tasks": {}, "models": {}}
+            for (_, _, agent_type, task, model), bucket in self._buckets.items():
+                for group, name in (("agents", agent_type), ("tasks", task), ("models", model)):
+                    entry = totals[group].setdefault(name, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0})
+                    for field, value in bucket.items():
+                        entry[field] += value
+        return {"window_seconds": settings.LLM_BUDGET_WINDOW_SECONDS, **totals}
+
+
+# Global instance
+usage_ledger = LLMUsageLedger()
@@ -18,7 +18,27 @@ class Settings(BaseSettings):
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     GROQ_MODEL: str = os.getenv("GROQ_MODEL", "llama3-8b-8192")
     GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+    GROQ_FAST_MODEL: str = os.getenv("GROQ_FAST_MODEL", os.getenv("GROQ_MODEL", "llama3-8b-8192"))  # short classification-style tasks
+    GROQ_LARGE_MODEL: str = os.getenv("GROQ_LARGE_MODEL", "llama-3.3-70b-versatile")  # multi-vehicle route planning
+    MODEL_ROUTES: str = os.getenv("MODEL_ROUTES", "")  # JSON overrides: {"sub_task": ["fast"|"large", "high"|"normal"|"low"]}
+    MODEL_FAST_MAX_PROMPT_TOKENS: int = int(os.getenv("MODEL_FAST_MAX_PROMPT_TOKENS", "6000"))  # larger prompts go to the large model
+    MODEL_URGENT_LATENCY_SLO: float = float(os.getenv("MODEL_URGENT_LATENCY_SLO", "5"))  # p90 seconds before urgent tasks switch model
     GROQ_TEMPERATURE: float = float(os.getenv("GROQ_TEMPERATURE", "0.3"))
+    GROQ_REQUEST_TIMEOUT: float = float(os.getenv("GROQ_REQUEST_TIMEOUT", "60"))
+    GROQ_POOL_MAX_CONNECTIONS: int = int(os.getenv("GROQ_POOL_MAX_CONNECTIONS", "20"))
+    GROQ_POOL_MAX_KEEPALIVE: int = int(os.getenv("GROQ_POOL_MAX_KEEPALIVE", "10"))
+    GROQ_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("GROQ_POOL_KEEPALIVE_EXPIRY", "30"))
+    GROQ_REQUESTS_PER_MINUTE: int = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+    GROQ_TOKENS_PER_MINUTE: int = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "30000"))
+    GROQ_RETRY_BASE_DELAY: float = float(os.getenv("GROQ_RETRY_BASE_DELAY", "1.0"))
+    GROQ_RETRY_MAX_DELAY: float = float(os.getenv("GROQ_RETRY_MAX_DELAY", "30"))
+    LLM_CASSETTE_MODE: str = os.getenv("LLM_CASSETTE_MODE", "off")  # off | record | replay
+    LLM_CASSETTE_PATH: str = os.getenv("LLM_CASSETTE_PATH", "cassettes/llm.jsonl.gz")
+    GROQ_STRUCTURED_OUTPUT: str = os.getenv("GROQ_STRUCTURED_OUTPUT", "json_object")  # json_object | tools | off
+    GROQ_MIN_COMPLETION_TOKENS: int = int(os.getenv("GROQ_MIN_COMPLETION_TOKENS", "512"))  # floor for schema-sized max_tokens
+    GROQ_MAX_COMPLETION_TOKENS: int = int(os.getenv("GROQ_MAX_COMPLETION_TOKENS", "8192"))
+    GROQ_MAX_CONTINUATIONS: int = int(os.getenv("GROQ_MAX_CONTINUATIONS", "2"))  # follow-ups after finish_reason == "length"
+    GROQ_HTTP2: bool = os.getenv("GROQ_HTTP2", "true").lower() in {"1", "true", "yes"}
     
     # Redis for caching and task queue
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
@@ -28,6 +48,55 @@ class Settings(BaseSettings):
     MAX_CONCURRENT_AGENTS: int = int(os.getenv("MAX_CONCURRENT_AGENTS", "10"))
     AGENT_MAX_RETRIES: int = int(os.getenv("AGENT_MAX_RETRIES", "3"))
     AGENT_AUTONOMOUS_TURNS: int = int(os.getenv("AGENT_AUTONOMOUS_TURNS", "1"))
+    AGENT_DECISION_MODE: str = os.getenv("AGENT_DECISION_MODE", "direct")  # "direct" single request or "ag2" conversation
+    AGENT_DECISION_DEADLINE: float = float(os.getenv("AGENT_DECISION_DEADLINE", "60"))  # seconds per decision, both paths included
+    AGENT_HEDGE_PERCENTILE: float = float(os.getenv("AGENT_HEDGE_PERCENTILE", "90"))  # primary latency percentile before hedging
+    AGENT_HEDGE_DEFAULT_DELAY: float = float(os.getenv("AGENT_HEDGE_DEFAULT_DELAY", "8"))  # used until latency history exists
+    AGENT_HEDGE_MIN_DELAY: float = float(os.getenv("AGENT_HEDGE_MIN_DELAY", "1"))
+    POLICY_LEAD_TIME_DAYS: float = float(os.getenv("POLICY_LEAD_TIME_DAYS", "3"))  # supplier lead time for reorder points
+    POLICY_SERVICE_Z: float = float(os.getenv("POLICY_SERVICE_Z", "1.65"))  # safety-stock z-score (~95% service level)
+    POLICY_ORDERING_COST: float = float(os.getenv("POLICY_ORDERING_COST", "50"))  # fixed cost per purchase order (EOQ)
+    POLICY_HOLDING_COST: float = float(os.getenv("POLICY_HOLDING_COST", "2"))  # cost to hold one unit for a year (EOQ)
+    POLICY_DEMAND_WINDOW_DAYS: int = int(os.getenv("POLICY_DEMAND_WINDOW_DAYS", "7"))
+    POLICY_CONFIDENCE_MARGIN: float = float(os.getenv("POLICY_CONFIDENCE_MARGIN", "0.15"))  # below this, escalate to the LLM
+    LLM_USAGE_BUCKET_SECONDS: int = int(os.getenv("LLM_USAGE_BUCKET_SECONDS", "300"))  # granularity of persisted llm_usage rows
+    LLM_BUDGET_WINDOW_SECONDS: int = int(os.getenv("LLM_BUDGET_WINDOW_SECONDS", "86400"))  # rolling window budgets apply to
+    LLM_TOKEN_BUDGET: int = int(os.getenv("LLM_TOKEN_BUDGET", "0"))  # default tokens per window per agent; 0 = unlimited
+    LLM_TOKEN_BUDGETS: str = os.getenv("LLM_TOKEN_BUDGETS", "")  # JSON per agent type: {"route_optimization": 200000}
+    LLM_BUDGET_ACTION: str = os.getenv("LLM_BUDGET_ACTION", "throttle")  # throttle | heuristic | both
+    LLM_BUDGET_THROTTLE_FACTOR: float = float(os.getenv("LLM_BUDGET_THROTTLE_FACTOR", "4"))  # interval multiplier when over budget
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "3"))  # consecutive failed decisions before opening
+    LLM_BREAKER_LATENCY_SLO: float = float(os.getenv("LLM_BREAKER_LATENCY_SLO", "30"))  # seconds; p90 decision latency that opens the circuit
+    LLM_BREAKER_OPEN_SECONDS: float = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "60"))  # wait before the first half-open probe
+    LLM_BREAKER_MAX_OPEN_SECONDS: float = float(os.getenv("LLM_BREAKER_MAX_OPEN_SECONDS", "900"))  # cap for the doubling probe interval
+    LLM_LKG_MAX_AGE: float = float(os.getenv("LLM_LKG_MAX_AGE", "3600"))  # seconds a last-known-good decision may be reused
+    DECISION_MEMORY_THRESHOLD: float = float(os.getenv("DECISION_MEMORY_THRESHOLD", "0.85"))  # similarity needed to reuse a past decision; >= 1 disables
+    DECISION_MEMORY_MAX_ENTRIES: int = int(os.getenv("DECISION_MEMORY_MAX_ENTRIES", "5000"))  # remembered records per agent sub-task
+    ROUTING_ENGINE: str = os.getenv("ROUTING_ENGINE", "local")  # "local" VRP solver and assignment engine, or "llm"
+    ROUTING_LLM_EXPLANATIONS: bool = os.getenv("ROUTING_LLM_EXPLANATIONS", "false").lower() in {"1", "true", "yes"}  # ask the LLM to explain solved routes
+    ROUTING_ROAD_FACTOR: float = float(os.getenv("ROUTING_ROAD_FACTOR", "1.3"))  # road km per great-circle km
+    ROUTING_AVG_SPEED_KMH: float = float(os.getenv("ROUTING_AVG_SPEED_KMH", "35"))
+    ROUTING_SERVICE_MINUTES: float = float(os.getenv("ROUTING_SERVICE_MINUTES", "5"))  # dwell time per stop
+    ROUTING_SAVINGS_NEIGHBOURS: int = int(os.getenv("ROUTING_SAVINGS_NEIGHBOURS", "30"))  # savings pairs considered per stop
+    ROUTING_MATRIX_CACHE_SIZE: int = int(os.getenv("ROUTING_MATRIX_CACHE_SIZE", "512"))  # location sets kept by the distance-matrix cache (one per planned route)
+    ROUTING_INDEX_CELL_KM: float = float(os.getenv("ROUTING_INDEX_CELL_KM", "1"))  # grid cell size of the fleet spatial index
+    ROUTING_CANDIDATE_VEHICLES: int = int(os.getenv("ROUTING_CANDIDATE_VEHICLES", "5"))  # nearest feasible vehicles offered per order
+    ROUTING_ASSIGN_CANDIDATES: int = int(os.getenv("ROUTING_ASSIGN_CANDIDATES", "20"))  # nearest capable vehicles per order in the matching
+    ROUTING_ASSIGN_SLACK_KM: float = float(os.getenv("ROUTING_ASSIGN_SLACK_KM", "5"))  # km-equivalent cost of a fully unused vehicle
+    ROUTING_ASSIGN_UNASSIGNED_KM: float = float(os.getenv("ROUTING_ASSIGN_UNASSIGNED_KM", "200"))  # km-equivalent cost of leaving a low-priority order pending
+    ROUTING_DEPOT_RADIUS_KM: float = float(os.getenv("ROUTING_DEPOT_RADIUS_KM", "5"))  # vehicles this close share a depot
+    ROUTING_REPLAN_MAX_DETOUR_KM: float = float(os.getenv("ROUTING_REPLAN_MAX_DETOUR_KM", "15"))  # extra km an active route may take on for an urgent order
+    ROUTING_REPLAN_CANDIDATE_ROUTES: int = int(os.getenv("ROUTING_REPLAN_CANDIDATE_ROUTES", "8"))  # nearest active routes tried per re-inserted stop
+    ROUTING_CLUSTER_CELL_KM: float = float(os.getenv("ROUTING_CLUSTER_CELL_KM", "2"))  # grid cell size for clustering pending orders
+    ROUTING_WAVE_MINUTES: int = int(os.getenv("ROUTING_WAVE_MINUTES", "60"))  # delivery-time window of one wave
+    ROUTING_CLUSTER_MIN_BACKLOG: int = int(os.getenv("ROUTING_CLUSTER_MIN_BACKLOG", "20000"))  # pending orders above which routing is batched; smaller backlogs are solved whole (shorter routes)
+    ROUTING_CLUSTER_MAX_ORDERS: int = int(os.getenv("ROUTING_CLUSTER_MAX_ORDERS", "5000"))  # orders per solve batch
+    ROUTING_CLUSTER_FLEET_SLACK: float = float(os.getenv("ROUTING_CLUSTER_FLEET_SLACK", "1.3"))  # vehicle capacity handed to a batch per unit of its demand
+    ROUTING_REBALANCE_INTERVAL: int = int(os.getenv("ROUTING_REBALANCE_INTERVAL", "900"))  # seconds between idle-fleet rebalancing runs; 0 disables
+    ROUTING_REBALANCE_CELL_KM: float = float(os.getenv("ROUTING_REBALANCE_CELL_KM", "5"))  # grid cell size of a demand area
+    ROUTING_REBALANCE_LOOKBACK_HOURS: float = float(os.getenv("ROUTING_REBALANCE_LOOKBACK_HOURS", "24"))  # order history used by the demand forecast
+    ROUTING_REBALANCE_HALF_LIFE_HOURS: float = float(os.getenv("ROUTING_REBALANCE_HALF_LIFE_HOURS", "3"))  # recency decay of that history
+    ROUTING_REBALANCE_MAX_KM: float = float(os.getenv("ROUTING_REBALANCE_MAX_KM", "30"))  # longest repositioning trip
     AUTO_START_AGENTS: bool = os.getenv("AUTO_START_AGENTS", "false").lower() in {"1", "true", "yes"}
     SIMULATION_ENABLED: bool = os.getenv("SIMULATION_ENABLED", "false").lower() in {"1", "true", "yes"}
     SIMULATION_TICK_SECONDS: int = int(os.getenv("SIMULATION_TICK_SECONDS", "5"))
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, Iterator, List, Optional, Type
 
 from sqlalchemy import asc, desc as desc_func
 from sqlalchemy.orm import Session
@@ -23,6 +24,8 @@ TABLE_MODEL_MAP: Dict[str, Type[models.DictionaryMixin]] = {
     "simulation_status": models.SimulationStatus,
     "purchase_orders": models.PurchaseOrder,
     "disposal_orders": models.DisposalOrder,
+    "llm_usage": models.LLMUsage,
+    "decision_memory": models.DecisionMemoryEntry,
 }
 
 
@@ -33,9 +36,11 @@ class QueryResult:
 
 
 class LocalSupabaseQuery:
-    def __init__(self, model: Type[models.DictionaryMixin]):
+    def __init__(self, model: Type[models.DictionaryMixin], session: Optional[Session] = None):
         self.model = model
-        self.session: Session = SessionLocal()
+        # Queries of a transaction share its session; only standalone queries commit and close.
+        self._owns_session = session is None
+        self.session: Session = session or SessionLocal()
         self._filters: List[tuple[str, str, Any]] = []
         self._order_by: Optional[tuple[str, bool]] = None
         self._limit: Optional[int] = None
@@ -52,6 +57,10 @@ class LocalSupabaseQuery:
         self._filters.append((column, "gte", value))
         return self
 
+    def in_(self, column: str, values: Any):
+        self._filters.append((column, "in", list(values)))
+        return self
+
     def is_(self, column: str, value: Any):
         target = None if value in ("null", None) else value
         self._filters.append((column, "is", target))
@@ -99,7 +108,14 @@ class LocalSupabaseQuery:
                 return self._execute_upsert()
             raise ValueError("Unsupported operation")
         finally:
-            self.session.close()
+            if self._owns_session:
+                self.session.close()
+
+    def _finish(self) -> None:
+        if self._owns_session:
+            self.session.commit()
+        else:
+            self.session.flush()
 
     def _convert_value(self, column: str, value: Any):
         attr = getattr(self.model, column)
@@ -122,6 +138,8 @@ class LocalSupabaseQuery:
                 query = query.filter(attr == value)
             elif op == "gte":
                 query = query.filter(attr >= value)
+            elif op == "in":
+                query = query.filter(attr.in_([self._convert_value(column, item) for item in value]))
             elif op == "is":
                 query = query.filter(attr.is_(value))
         return query
@@ -146,18 +164,26 @@ class LocalSupabaseQuery:
             obj = self.model(**self._coerce_payload(payload))
             self.session.add(obj)
             rows.append(obj)
-        self.session.commit()
+        self._finish()
         return QueryResult(data=[row.to_dict() for row in rows])
 
     def _execute_update(self) -> QueryResult:
-        query = self.session.query(self.model)
-        query = self._apply_filters(query)
-        rows = query.all()
-        for row in rows:
-            for key, value in self._coerce_payload(self._payload).items():
-                setattr(row, key, value)
-        self.session.commit()
-        return QueryResult(data=[row.to_dict() for row in rows])
+        """Update the matching rows; ``data`` holds only the rows this statement changed.
+
+        Each row is written by an ``UPDATE ... WHERE <id> AND <filters>``, so the filters
+        act as a condition checked at write time: ``.eq("status", "available")`` skips a
+        row that another writer changed since it was read.
+        """
+        values = self._coerce_payload(self._payload)
+        query = self._apply_filters(self.session.query(self.model))
+        key = self.model.__mapper__.primary_key[0]
+        updated = [
+            row_id for (row_id,) in query.with_entities(key).all()
+            if query.filter(key == row_id).update(values, synchronize_session=False)
+        ]
+        self._finish()
+        rows = self.session.query(self.model).filter(key.in_(updated)).populate_existing().all() if updated else []
+        return QueryResult(data=[row.to_dict() for row in rows], count=len(updated))
 
     def _execute_upsert(self) -> QueryResult:
         saved = []
@@ -173,7 +199,7 @@ class LocalSupabaseQuery:
                 instance = self.model(**self._coerce_payload(payload))
                 self.session.add(instance)
             saved.append(instance)
-        self.session.commit()
+        self._finish()
         return QueryResult(data=[row.to_dict() for row in saved])
 
     def _coerce_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -195,6 +221,17 @@ class LocalSupabaseQuery:
         return coerced
 
 
+class LocalTransaction:
+    def __init__(self, models_map: Dict[str, Type[models.DictionaryMixin]], session: Session):
+        self.models = models_map
+        self.session = session
+
+    def table(self, name: str) -> LocalSupabaseQuery:
+        if name not in self.models:
+            raise ValueError(f"Unknown table '{name}'")
+        return LocalSupabaseQuery(self.models[name], self.session)
+
+
 class LocalSupabaseClient:
     def __init__(self):
         self.models = TABLE_MODEL_MAP
@@ -203,3 +240,16 @@ class LocalSupabaseClient:
         if name not in self.models:
             raise ValueError(f"Unknown table '{name}'")
         return LocalSupabaseQuery(self.models[name])
+
+    @contextmanager
+    def transaction(self) -> Iterator[LocalTransaction]:
+        """``with client.transaction() as tx:`` - every ``tx.table(...)`` query commits together or not at all."""
+        session = SessionLocal()
+        try:
+            yield LocalTransaction(self.models, session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
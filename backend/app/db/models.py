@@ -212,3 +212,33 @@ class DisposalOrder(Base, DictionaryMixin):
     disposal_method = Column(String, nullable=True)
     cost_savings = Column(Float, nullable=True)
     notes = Column(Text, nullable=True)
+
+
+class LLMUsage(Base, DictionaryMixin):
+    __tablename__ = "llm_usage"
+
+    id = Column(String, primary_key=True, default=default_uuid)
+    bucket_start = Column(DateTime, nullable=False, index=True)
+    agent_id = Column(String, nullable=False)
+    agent_type = Column(String, nullable=False)
+    task = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    requests = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DecisionMemoryEntry(Base, DictionaryMixin):
+    __tablename__ = "decision_memory"
+
+    id = Column(String, primary_key=True, default=default_uuid)
+    agent_type = Column(String, nullable=False)
+    task = Column(String, nullable=False, index=True)
+    record_kind = Column(String, nullable=False)
+    record_id = Column(String, nullable=False)
+    features = Column(JSON, nullable=True)
+    own_ids = Column(JSON, nullable=True)
+    entries = Column(JSON, nullable=True)
+    template = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -10,7 +10,23 @@ from datetime import datetime, timedelta
 
 from .core.config import settings
 from .agents.manager import agent_manager
+from .ai.cassette import llm_cassette
+from .ai.groq_client import groq_client
+from .ai.hedging import hedge_stats
+from .ai.circuit_breaker import llm_breaker
+from .ai.decision_memory import decision_memory
+from .ai.model_router import model_router
+from .ai.usage import usage_ledger
+from .ai.rate_limiter import rate_limiter
+from .services.distance_matrix import distance_matrix
+from .services.eta import eta_engine
+from .services.load_planner import load_planner
+from .services.order_clusters import order_clusters
+from .services.rebalancer import fleet_rebalancer
+from .services.replanner import OPEN_ORDER_STATUSES
+from .services.route_commit import commit_stats
 from .services.simulation_engine import simulation_engine
+from .services.spatial_index import fleet_index
 from .db.init_db import init_db
 
 init_db()
@@ -78,6 +94,8 @@ async def lifespan(app: FastAPI):
         await agent_manager.stop_agents()
     if settings.SIMULATION_ENABLED and simulation_engine.is_running:
         await simulation_engine.stop()
+    usage_ledger.flush()
+    await groq_client.aclose()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -120,15 +138,18 @@ async def health_check():
     try:
         # Check if agents are running
         agent_status = await agent_manager.get_agent_status()
+        llm_circuit = llm_breaker.stats()
         
         return {
-            "status": "healthy",
+            "status": "healthy" if llm_circuit["state"] == "closed" else "degraded",
             "agents_running": agent_manager.is_running,
             "agent_status": agent_status,
+            "llm_circuit": llm_circuit,
             "services": {
                 "api": "healthy",
                 "agents": "running" if agent_manager.is_running else "idle",
-                "database": "healthy"  # Add actual DB check if needed
+                "database": "healthy",  # Add actual DB check if needed
+                "llm": "healthy" if llm_circuit["state"] == "closed" else llm_circuit["state"],
             }
         }
     except Exception as e:
@@ -672,6 +693,100 @@ async def manual_simulation_tick():
     snapshot = await simulation_engine.step()
     return {"message": "Tick processed", "simulation": snapshot.as_dict()}
 
+@app.get("/api/v1/llm/metrics")
+async def get_llm_metrics():
+    """LLM transport metrics (quota throttling, 429s, retries, per-model routing, token usage)."""
+    return {
+        "rate_limiter": rate_limiter.stats(),
+        "hedging": hedge_stats.as_dict(),
+        "cassette": llm_cassette.stats(),
+        "models": model_router.stats(),
+        "usage": usage_ledger.stats(),
+        "circuit": llm_breaker.stats(),
+        "memory": decision_memory.stats(),
+    }
+
+@app.post("/api/v1/routing/matrix")
+async def get_distance_matrix(request: Dict[str, Any]):
+    """Road distance (km) and travel time (minutes) between every pair of ``points``.
+
+    Each point is ``{"id": ..., "lat": ..., "lng": ...}``; repeated location sets are
+    served from the matrix cache.
+    """
+    points = request.get("points") or []
+    if not isinstance(points, list):
+        raise HTTPException(status_code=400, detail="points must be a list")
+    matrix = await asyncio.to_thread(distance_matrix.for_points, points)
+    skipped = len(points) - len(matrix.ids)
+    return {**matrix.as_dict(), "skipped_points": skipped}
+
+@app.get("/api/v1/routing/load-plan")
+async def get_load_plan():
+    """Capacity-feasible packing of pending orders into available vehicles."""
+    try:
+        orders = [order for order in _list_table("orders") if order.get("status") == "pending"]
+        fleet = [vehicle for vehicle in _list_table("fleet") if vehicle.get("status") == "available"]
+        plan = await asyncio.to_thread(load_planner.pack, orders, fleet)
+        return {"loads": plan.as_prompt(), "unpacked": plan.unpacked, "stats": plan.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error planning loads: {str(e)}")
+
+@app.get("/api/v1/routing/rebalance-plan")
+async def get_rebalance_plan():
+    """Dry run of idle-fleet rebalancing: forecast demand areas and the moves that would be made."""
+    try:
+        fleet = _list_table("fleet")
+        idle = [vehicle for vehicle in fleet if vehicle.get("status") == "available"]
+        # The forecast itself skips orders older than the lookback window.
+        plan = await asyncio.to_thread(fleet_rebalancer.plan, _list_table("orders"), idle, fleet)
+        return {
+            "areas": [area.as_dict() for area in plan.areas],
+            "moves": [move.as_dict() for move in plan.moves],
+            "stats": plan.stats(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error planning rebalancing: {str(e)}")
+
+@app.get("/api/v1/routing/clusters")
+async def get_order_clusters():
+    """Delivery-wave clusters of the pending backlog, as of the routing agent's last cycle."""
+    return {
+        "clusters": [cluster.as_dict(order_clusters.wave_minutes) for cluster in order_clusters.clusters()],
+        "stats": order_clusters.stats(),
+    }
+
+@app.post("/api/v1/routing/etas")
+async def get_order_etas(request: Dict[str, Any]):
+    """Predicted arrival times for ``order_ids`` on active routes (all tracked stops if omitted).
+
+    Predictions are cached per route and refreshed each routing cycle; pass
+    ``"refresh": true`` to re-read routes, fleet and open orders first.
+    """
+    order_ids = request.get("order_ids")
+    if order_ids is not None and not isinstance(order_ids, list):
+        raise HTTPException(status_code=400, detail="order_ids must be a list")
+    try:
+        if request.get("refresh"):
+            routes = [route for route in _list_table("routes") if route.get("status") == "active"]
+            open_ids = {order["id"] for order in _list_table("orders") if order.get("status") in OPEN_ORDER_STATUSES}
+            await asyncio.to_thread(eta_engine.sync, routes, _list_table("fleet"), open_ids)
+        etas, missing = await asyncio.to_thread(eta_engine.etas, order_ids)
+        return {"etas": etas, "missing": missing, "stats": eta_engine.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing ETAs: {str(e)}")
+
+@app.get("/api/v1/routing/metrics")
+async def get_routing_metrics():
+    """Routing engine metrics (matrix cache, fleet index, clusters, ETAs, rebalancing, commit conflicts)."""
+    return {
+        "matrix": distance_matrix.stats(),
+        "fleet_index": fleet_index.stats(),
+        "clusters": order_clusters.stats(),
+        "eta": eta_engine.stats(),
+        "rebalance": fleet_rebalancer.stats(),
+        "commits": commit_stats.as_dict(),
+    }
+
 @app.get("/api/v1/agents/duplicate-detection-config")
 async def get_duplicate_detection_config():
     """Get duplicate detection configuration"""
@@ -0,0 +1,342 @@
+"""Min-cost order-to-vehicle assignment (one order per available vehicle).
+
+Each order is offered its ``ROUTING_ASSIGN_CANDIDATES`` nearest vehicles that can
+carry it; every other pair is infeasible. A pair costs the road distance from the
+vehicle to the delivery point, weighted by order priority, plus a penalty for unused
+capacity so large vehicles stay free for large orders. Every order also has a private
+"stay pending" option whose cost grows with priority, so when vehicles are scarce the
+low-priority orders wait first.
+
+The matching itself is the shortest-augmenting-path form of the Hungarian method
+(Jonker-Volgenant / Crouse) over the sparse candidate graph, which is exact for that
+graph and touches only a handful of edges per order when vehicles are plentiful.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .distance_matrix import DistanceMatrixService, distance_matrix
+from .geo import merchant_depots, order_demand, order_location, order_priority, vehicle_position
+
+# Distance multiplier per priority rank (geo.PRIORITY_RANKS): urgent orders pull the closest vehicles.
+PRIORITY_DISTANCE_WEIGHTS = (1.5, 1.0, 0.75)
+PRIORITY_NAMES = ("high", "medium", "low")
+# Rows of the order-to-vehicle matrix computed at once when picking candidates.
+_CHUNK_ROWS = 1024
+# Augmenting-row-reduction steps per row before switching to shortest augmenting paths.
+_REDUCTION_STEPS = 2
+# Matching passes over the orders and vehicles left over by the previous pass.
+_MAX_PASSES = 3
+
+
+@dataclass
+class AssignmentResult:
+    assignments: List[Dict[str, Any]] = field(default_factory=list)
+    unassigned: List[str] = field(default_factory=list)
+    cost: float = 0.0
+    seconds: float = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "assigned": len(self.assignments),
+            "unassigned": len(self.unassigned),
+            "distance_km": round(sum(assignment["distance_km"] for assignment in self.assignments), 2),
+            "cost": round(self.cost, 2),
+            "seconds": round(self.seconds, 4),
+        }
+
+
+def min_cost_matching(
+    edges: Sequence[Sequence[Tuple[int, float]]], columns: int, fallback: Sequence[float]
+) -> Tuple[List[int], float]:
+    """Assign each row to one of its ``(column, cost)`` edges, or to its private fallback.
+
+    Columns are used at most once. Returns the column per row (``-1`` = fallback) and
+    the total cost, which is minimal over all such assignments.
+    """
+    rows = len(edges)
+    # Column ``columns + i`` is row i's fallback. Column duals only drop on matched
+    # columns, so unused columns keep v = 0 as the rectangular optimum requires.
+    edges = [list(options) + [(columns + row, fallback[row])] for row, options in enumerate(edges)]
+    u = [0.0] * rows
+    v = [0.0] * (columns + rows)
+    row_of = [-1] * (columns + rows)
+    col_of = [-1] * rows
+
+    # Augmenting row reduction (Jonker-Volgenant): each row takes its best column at
+    # a price that leaves it indifferent to its second best, evicting the previous
+    # holder. This settles most rows cheaply; the rest get shortest augmenting paths.
+    queue = deque(sorted(range(rows), key=lambda row: -fallback[row]))
+    for _ in range(_REDUCTION_STEPS * rows):
+        if not queue:
+            break
+        row = queue.popleft()
+        first = second = math.inf
+        best_column = second_column = -1
+        for column, cost in edges[row]:
+            value = cost - v[column]
+            if value < second:
+                if value < first:
+                    second, second_column = first, best_column
+                    first, best_column = value, column
+                else:
+                    second, second_column = value, column
+        if first < second < math.inf:
+            v[best_column] -= second - first
+        elif first == second and row_of[best_column] != -1:
+            best_column = second_column
+        previous = row_of[best_column]
+        row_of[best_column] = row
+        col_of[row] = best_column
+        u[row] = second if first < second < math.inf else first
+        if previous != -1:
+            col_of[previous] = -1
+            queue.append(previous)
+
+    # Per-search scratch space, reset through ``touched`` so each search costs only what it visits.
+    best = [math.inf] * (columns + rows)
+    via = [-1] * (columns + rows)
+    done = bytearray(columns + rows)
+    # Urgent rows (largest fallback) augment first; later rows then mostly displace cheap ones.
+    for start in sorted(range(rows), key=lambda row: -fallback[row]):
+        if col_of[start] != -1:
+            continue
+        u[start] = min(cost - v[column] for column, cost in edges[start])
+        touched: List[int] = []
+        visited_rows = []
+        heap: List[Tuple[float, int]] = []
+        reach = 0.0
+        row = start
+        while True:
+            visited_rows.append(row)
+            base = reach - u[row]
+            for column, cost in edges[row]:
+                if done[column]:
+                    continue
+                value = base + cost - v[column]
+                if value < best[column]:
+                    if best[column] == math.inf:
+                        touched.append(column)
+                    best[column] = value
+                    via[column] = row
+                    heapq.heappush(heap, (value, column))
+            while True:
+                reach, column = heapq.heappop(heap)
+                if not done[column] and reach == best[column]:
+                    break
+            done[column] = 1
+            if row_of[column] == -1:
+                break
+            row = row_of[column]
+        u[start] += reach
+        for row in visited_rows[1:]:
+            u[row] += reach - best[col_of[row]]
+        for visited in touched:
+            if done[visited]:
+                v[visited] -= reach - best[visited]
+        while True:
+            row = via[column]
+            row_of[column] = row
+            col_of[row], column = column, col_of[row]
+            if row == start:
+                break
+        for visited in touched:
+            best[visited] = math.inf
+            done[visited] = 0
+
+    total = 0.0
+    assigned = []
+    for row, column in enumerate(col_of):
+        if column >= columns:
+            total += fallback[row]
+            assigned.append(-1)
+        else:
+            total += dict(edges[row])[column]
+            assigned.append(column)
+    return assigned, total
+
+
+class AssignmentEngine:
+    def __init__(
+        self,
+        candidates: Optional[int] = None,
+        slack_km: Optional[float] = None,
+        unassigned_km: Optional[float] = None,
+        matrix: Optional[DistanceMatrixService] = None,
+    ):
+        self.candidates = candidates or settings.ROUTING_ASSIGN_CANDIDATES
+        self.slack_km = slack_km if slack_km is not None else settings.ROUTING_ASSIGN_SLACK_KM
+        self.unassigned_km = unassigned_km or settings.ROUTING_ASSIGN_UNASSIGNED_KM
+        self.matrix = matrix or distance_matrix
+
+    def solve(self, orders: Sequence[Dict[str, Any]], fleet: Sequence[Dict[str, Any]]) -> AssignmentResult:
+        started = time.perf_counter()
+        result = AssignmentResult()
+        depots = merchant_depots(fleet)
+        placed = []
+        for order in orders:
+            location = order_location(order, depots)
+            if location is None or not order.get("id"):
+                result.unassigned.append(order.get("id"))
+            else:
+                placed.append((order, location))
+        vehicles = [(row, vehicle_position(row)) for row in fleet if row.get("id")]
+        vehicles = [(row, position) for row, position in vehicles if position is not None and int(row.get("capacity") or 0) > 0]
+        if not placed or not vehicles:
+            result.unassigned.extend(order.get("id") for order, _ in placed)
+            result.seconds = time.perf_counter() - started
+            return result
+
+        order_lat = np.array([location[0] for _, location in placed])
+        order_lng = np.array([location[1] for _, location in placed])
+        demand = np.array([order_demand(order) for order, _ in placed])
+        rank = np.array([order_priority(order) for order, _ in placed])
+        vehicle_lat = np.array([position[0] for _, position in vehicles])
+        vehicle_lng = np.array([position[1] for _, position in vehicles])
+        capacity = np.array([int(row.get("capacity") or 0) for row, _ in vehicles])
+
+        weight = np.asarray(PRIORITY_DISTANCE_WEIGHTS)[np.minimum(rank, len(PRIORITY_DISTANCE_WEIGHTS) - 1)]
+        fallback = self.unassigned_km * (3 - np.minimum(rank, 2))
+        chosen = np.full(len(placed), -1)
+        pending = np.arange(len(placed))
+        free = np.arange(len(vehicles))
+        # Orders competing for the same few nearby vehicles can be left without candidates;
+        # later passes match them against the vehicles nobody took.
+        for _ in range(_MAX_PASSES):
+            if not len(pending) or not len(free):
+                break
+            rows, columns = self._candidate_pairs(
+                order_lat[pending], order_lng[pending], demand[pending],
+                vehicle_lat[free], vehicle_lng[free], capacity[free],
+            )
+            cost = self._pair_costs(pending[rows], free[columns], order_lat, order_lng, vehicle_lat, vehicle_lng, demand, capacity, weight)
+            bounds = np.searchsorted(rows, np.arange(len(pending) + 1))
+            targets, weights = columns.tolist(), cost.tolist()
+            edges = [
+                list(zip(targets[bounds[row]:bounds[row + 1]], weights[bounds[row]:bounds[row + 1]]))
+                for row in range(len(pending))
+            ]
+            picked = np.asarray(min_cost_matching(edges, len(free), fallback[pending].tolist())[0], dtype=int)
+            matched = picked >= 0
+            if not matched.any():
+                break
+            chosen[pending[matched]] = free[picked[matched]]
+            pending = pending[~matched]
+            free = np.setdiff1d(free, chosen[chosen >= 0])
+
+        assigned_rows = np.flatnonzero(chosen >= 0)
+        assigned_columns = chosen[assigned_rows]
+        km = self.matrix.pair_distances(
+            order_lat[assigned_rows], order_lng[assigned_rows], vehicle_lat[assigned_columns], vehicle_lng[assigned_columns]
+        )
+        result.cost = float(
+            self._pair_costs(assigned_rows, assigned_columns, order_lat, order_lng, vehicle_lat, vehicle_lng, demand, capacity, weight).sum()
+            + fallback[pending].sum()
+        )
+        # Vehicles drive to the merchant's depot for pickup, then on to the delivery point.
+        depot = np.array([depots.get(order.get("merchant_id"), (np.nan, np.nan)) for order, _ in placed])
+        depot_lat = np.where(np.isnan(depot[:, 0]), vehicle_lat[np.maximum(chosen, 0)], depot[:, 0])
+        depot_lng = np.where(np.isnan(depot[:, 1]), vehicle_lng[np.maximum(chosen, 0)], depot[:, 1])
+        pickup_minutes = self.matrix.travel_minutes(
+            self.matrix.pair_distances(vehicle_lat[np.maximum(chosen, 0)], vehicle_lng[np.maximum(chosen, 0)], depot_lat, depot_lng)
+        )
+        delivery_minutes = pickup_minutes + settings.ROUTING_SERVICE_MINUTES + self.matrix.travel_minutes(
+            self.matrix.pair_distances(depot_lat, depot_lng, order_lat, order_lng)
+        )
+        distance_of = dict(zip(assigned_rows.tolist(), km.tolist()))
+        now = datetime.utcnow()
+        for row, column in enumerate(chosen.tolist()):
+            order, _ = placed[row]
+            if column < 0:
+                result.unassigned.append(order["id"])
+                continue
+            distance = distance_of[row]
+            result.assignments.append({
+                "order_id": order["id"],
+                "vehicle_id": vehicles[column][0]["id"],
+                "assignment_reason": (
+                    f"Min-cost matching: {distance:.1f} km away, load {int(demand[row])}/{int(capacity[column])}."
+                ),
+                "priority": PRIORITY_NAMES[min(int(rank[row]), 2)],
+                "estimated_pickup_time": (now + timedelta(minutes=float(pickup_minutes[row]))).isoformat(),
+                "estimated_delivery_time": (now + timedelta(minutes=float(delivery_minutes[row]))).isoformat(),
+                "distance_km": round(distance, 2),
+            })
+        result.seconds = time.perf_counter() - started
+        return result
+
+    def _pair_costs(
+        self,
+        rows: np.ndarray,
+        columns: np.ndarray,
+        order_lat: np.ndarray,
+        order_lng: np.ndarray,
+        vehicle_lat: np.ndarray,
+        vehicle_lng: np.ndarray,
+        demand: np.ndarray,
+        capacity: np.ndarray,
+        weight: np.ndarray,
+    ) -> np.ndarray:
+        km = self.matrix.pair_distances(order_lat[rows], order_lng[rows], vehicle_lat[columns], vehicle_lng[columns])
+        return km * weight[rows] + self.slack_km * (capacity[columns] - demand[rows]) / capacity[columns]
+
+    def _candidate_pairs(
+        self,
+        order_lat: np.ndarray,
+        order_lng: np.ndarray,
+        demand: np.ndarray,
+        vehicle_lat: np.ndarray,
+        vehicle_lng: np.ndarray,
+        capacity: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Feasible ``(order, vehicle)`` index pairs, sorted by order.
+
+        Each order keeps its nearest ``candidates`` vehicles that can carry it and each
+        vehicle its nearest ``candidates`` orders it can carry, so vehicles outside
+        every order's shortlist (dense areas) still get edges.
+        """
+        order_rows, order_columns = self._nearest(
+            order_lat, order_lng, vehicle_lat, vehicle_lng, lambda rows: capacity[None, :] < demand[rows, None]
+        )
+        vehicle_rows, vehicle_columns = self._nearest(
+            vehicle_lat, vehicle_lng, order_lat, order_lng, lambda rows: demand[None, :] > capacity[rows, None]
+        )
+        pairs = np.unique(np.concatenate([
+            order_rows * len(vehicle_lat) + order_columns,
+            vehicle_columns * len(vehicle_lat) + vehicle_rows,
+        ]))
+        return pairs // len(vehicle_lat), pairs % len(vehicle_lat)
+
+    def _nearest(
+        self, lat: np.ndarray, lng: np.ndarray, other_lat: np.ndarray, other_lng: np.ndarray, blocked
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """For each point, its nearest ``candidates`` other points not ``blocked(rows)``."""
+        k = min(self.candidates, len(other_lat))
+        found_rows, found_columns = [], []
+        for start in range(0, len(lat), _CHUNK_ROWS):
+            rows = np.arange(start, min(start + _CHUNK_ROWS, len(lat)))
+            # Equirectangular distance is enough to rank candidates; pairs get the road distance later.
+            scale = np.cos(np.radians(lat[rows]))[:, None]
+            approx = (other_lat[None, :] - lat[rows, None]) ** 2 + ((other_lng[None, :] - lng[rows, None]) * scale) ** 2
+            approx[blocked(rows)] = np.inf
+            nearest = np.argpartition(approx, k - 1, axis=1)[:, :k] if k < len(other_lat) else np.broadcast_to(
+                np.arange(k), approx.shape
+            )
+            keep = np.isfinite(np.take_along_axis(approx, nearest, axis=1))
+            found_rows.append(np.broadcast_to(rows[:, None], nearest.shape)[keep])
+            found_columns.append(nearest[keep])
+        return np.concatenate(found_rows), np.concatenate(found_columns)
+
+
+# Global instance
+assignment_engine = AssignmentEngine()
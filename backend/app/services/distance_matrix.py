@@ -0,0 +1,181 @@
+"""Pairwise road-distance and travel-time matrices for routing and ETAs.
+
+Distances are great-circle km times ``ROUTING_ROAD_FACTOR`` and travel times divide
+them by ``ROUTING_AVG_SPEED_KMH``; both are computed for a whole location set in one
+vectorized pass. Square matrices are cached by a hash of the (rounded) location set,
+and when a single point moves, e.g. a vehicle reporting a new position, only its row
+and column are recomputed in every cached matrix that contains it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .geo import haversine, haversine_matrix, point_of
+
+# Coordinates are compared at ~0.1 m; smaller jitter neither re-keys nor refreshes a matrix.
+_DECIMALS = 6
+
+
+@dataclass
+class TravelMatrix:
+    ids: List[str]
+    lat: np.ndarray
+    lng: np.ndarray
+    distance_km: np.ndarray
+    minutes: np.ndarray
+    key: str
+    index: Dict[str, int] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.index = {point_id: position for position, point_id in enumerate(self.ids)}
+
+    def distance(self, origin: str, destination: str) -> float:
+        return float(self.distance_km[self.index[origin], self.index[destination]])
+
+    def travel_minutes(self, origin: str, destination: str) -> float:
+        return float(self.minutes[self.index[origin], self.index[destination]])
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "ids": list(self.ids),
+            "distance_km": np.round(self.distance_km, 3).tolist(),
+            "minutes": np.round(self.minutes, 2).tolist(),
+        }
+
+
+class DistanceMatrixService:
+    def __init__(
+        self,
+        road_factor: Optional[float] = None,
+        speed_kmh: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.road_factor = road_factor or settings.ROUTING_ROAD_FACTOR
+        self.speed_kmh = speed_kmh or settings.ROUTING_AVG_SPEED_KMH
+        self.max_entries = max_entries or settings.ROUTING_MATRIX_CACHE_SIZE
+        self._cache: "OrderedDict[str, TravelMatrix]" = OrderedDict()
+        self._positions: Dict[str, Tuple[float, float]] = {}
+        # The VRP solver runs in a worker thread while endpoints read the cache.
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.incremental_updates = 0
+
+    def distances(self, lat_a: Any, lng_a: Any, lat_b: Any, lng_b: Any) -> np.ndarray:
+        """Road distance estimate in km between every point of A (rows) and B (columns)."""
+        return haversine_matrix(lat_a, lng_a, lat_b, lng_b) * self.road_factor
+
+    def pair_distances(self, lat_a: Any, lng_a: Any, lat_b: Any, lng_b: Any) -> np.ndarray:
+        """Road distance estimate in km between broadcast-aligned points (no cross product)."""
+        return haversine(lat_a, lng_a, lat_b, lng_b) * self.road_factor
+
+    def travel_minutes(self, distance_km: Any) -> Any:
+        return np.asarray(distance_km, dtype=float) / self.speed_kmh * 60.0
+
+    @staticmethod
+    def location_key(ids: Sequence[str], lat: np.ndarray, lng: np.ndarray) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\x1f".join(ids).encode())
+        digest.update(np.round(np.stack([lat, lng]), _DECIMALS).tobytes())
+        return digest.hexdigest()
+
+    def matrix(self, ids: Sequence[str], lat: Any, lng: Any) -> TravelMatrix:
+        """Square distance/time matrix for a named location set, served from cache when possible."""
+        ids = [str(point_id) for point_id in ids]
+        lat = np.asarray(lat, dtype=float)
+        lng = np.asarray(lng, dtype=float)
+        key = self.location_key(ids, lat, lng)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        distance = self.distances(lat, lng, lat, lng)
+        built = TravelMatrix(ids, lat.copy(), lng.copy(), distance, self.travel_minutes(distance), key)
+        with self._lock:
+            self._cache[key] = built
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            for point_id, point_lat, point_lng in zip(ids, lat, lng):
+                self._positions[point_id] = (float(point_lat), float(point_lng))
+        return built
+
+    def for_points(self, points: Iterable[Dict[str, Any]]) -> TravelMatrix:
+        """Matrix for ``[{"id": ..., "lat": ..., "lng": ...}]``-style rows; unlocated rows are skipped."""
+        ids, lat, lng = [], [], []
+        for point in points:
+            position = point_of(point)
+            if position is None or point.get("id") is None:
+                continue
+            ids.append(point["id"])
+            lat.append(position[0])
+            lng.append(position[1])
+        return self.matrix(ids, lat, lng)
+
+    def update_point(self, point_id: str, lat: float, lng: float) -> int:
+        """Move one point; refresh its row and column in every cached matrix. Returns matrices touched."""
+        point_id = str(point_id)
+        lat, lng = round(float(lat), _DECIMALS), round(float(lng), _DECIMALS)
+        touched = 0
+        with self._lock:
+            previous = self._positions.get(point_id)
+            if previous is not None and (round(previous[0], _DECIMALS), round(previous[1], _DECIMALS)) == (lat, lng):
+                return 0
+            self._positions[point_id] = (lat, lng)
+            for key in list(self._cache):
+                entry = self._cache[key]
+                position = entry.index.get(point_id)
+                if position is None:
+                    continue
+                entry.lat[position], entry.lng[position] = lat, lng
+                row = self.distances([lat], [lng], entry.lat, entry.lng)[0]
+                row[position] = 0.0
+                entry.distance_km[position, :] = row
+                entry.distance_km[:, position] = row
+                minutes = self.travel_minutes(row)
+                entry.minutes[position, :] = minutes
+                entry.minutes[:, position] = minutes
+                del self._cache[key]
+                entry.key = self.location_key(entry.ids, entry.lat, entry.lng)
+                self._cache[entry.key] = entry
+                touched += 1
+            self.incremental_updates += touched
+        return touched
+
+    def track_positions(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Apply the current position of every located row (e.g. fleet) to the cached matrices."""
+        touched = 0
+        for row in rows:
+            position = point_of(row)
+            if position is not None and row.get("id") is not None:
+                touched += self.update_point(row["id"], *position)
+        return touched
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "cached_matrices": len(self._cache),
+                "tracked_points": len(self._positions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 3) if requests else 0.0,
+                "incremental_updates": self.incremental_updates,
+                "road_factor": self.road_factor,
+                "speed_kmh": self.speed_kmh,
+            }
+
+
+# Global instance
+distance_matrix = DistanceMatrixService()
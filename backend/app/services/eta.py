@@ -0,0 +1,237 @@
+"""Arrival-time predictions for the stops of every active route.
+
+Each ``Route`` is parsed once into its stop coordinates and a per-stop time offset:
+the road travel minutes along the route (``DistanceMatrixService``: road factor and
+average speed) plus ``ROUTING_SERVICE_MINUTES`` of dwell at every earlier stop. An
+ETA is then the drive from the vehicle's last known position to its next open stop
+plus the offset difference to the stop in question, so refreshing a route costs one
+distance, not a re-walk of the route.
+
+ETAs are anchored at the time of the vehicle's last position change. A route is only
+re-anchored when its stored points change, its vehicle moves or its next open stop
+is delivered; the other routes keep their cached predictions.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .distance_matrix import DistanceMatrixService, distance_matrix
+from .geo import point_of, vehicle_position
+
+# Vehicle moves smaller than this (in degrees, ~10 m) do not re-anchor a route.
+_MOVE_EPSILON = 1e-4
+
+
+@dataclass
+class RouteEta:
+    route_id: str
+    vehicle_id: str
+    stored: Any  # ``route_points`` as last read, to spot changes
+    depot: Optional[Tuple[float, float]]
+    order_ids: List[str]
+    lat: np.ndarray
+    lng: np.ndarray
+    offsets: np.ndarray  # minutes from the first stop to each stop, dwell included
+    next_stop: int = 0
+    origin: Optional[Tuple[float, float]] = None
+    anchored_at: Optional[datetime] = None
+    arrivals: Optional[List[Optional[float]]] = None  # minutes after ``anchored_at``; served stops are None
+
+
+class EtaEngine:
+    def __init__(self, matrix: Optional[DistanceMatrixService] = None, service_minutes: Optional[float] = None):
+        self.matrix = matrix or distance_matrix
+        self.service_minutes = service_minutes if service_minutes is not None else settings.ROUTING_SERVICE_MINUTES
+        self._routes: Dict[str, RouteEta] = {}
+        self._route_of_order: Dict[str, Tuple[str, int]] = {}  # order id -> (route id, stop index)
+        # The agent refreshes in a worker thread while the API reads.
+        self._lock = threading.Lock()
+        self.syncs = 0
+        self.routes_rebuilt = 0
+        self.routes_reanchored = 0
+        self.last_sync_seconds = 0.0
+
+    # --- model -----------------------------------------------------------------
+
+    def _offsets(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        legs = self.matrix.travel_minutes(self.matrix.pair_distances(lat[:-1], lng[:-1], lat[1:], lng[1:]))
+        offsets = np.zeros(len(lat))
+        offsets[1:] = np.cumsum(legs + self.service_minutes)
+        return offsets
+
+    def route_arrivals(
+        self, route_points: Sequence[Dict[str, Any]], start: Optional[datetime] = None
+    ) -> Dict[str, datetime]:
+        """Arrival time of every order on a new route that leaves its first point at ``start``."""
+        start = start or datetime.utcnow()
+        located = [(point, point_of(point)) for point in route_points]
+        located = [(point, position) for point, position in located if position is not None]
+        if len(located) < 2:
+            return {}
+        lat = np.array([position[0] for _, position in located])
+        lng = np.array([position[1] for _, position in located])
+        offsets = self._offsets(lat, lng)
+        return {
+            point["order_id"]: start + timedelta(minutes=float(offset))
+            for (point, _), offset in zip(located, offsets) if point.get("order_id")
+        }
+
+    # --- state -----------------------------------------------------------------
+
+    def sync(
+        self,
+        routes: Iterable[Dict[str, Any]],
+        fleet: Iterable[Dict[str, Any]],
+        open_order_ids: Optional[Collection[str]] = None,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, int]:
+        """Track the active routes and re-anchor those whose points, vehicle position or next stop changed.
+
+        ``open_order_ids`` are the orders still to be delivered; stops before the first
+        open one count as served. Without it every stop is treated as open.
+        """
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        positions = {vehicle.get("id"): vehicle_position(vehicle) for vehicle in fleet}
+        with self._lock:
+            seen = set()
+            stale: List[RouteEta] = []
+            rebuilt = 0
+            for route in routes:
+                route_id = route.get("id")
+                if not route_id or (route.get("status") or "active") != "active":
+                    continue
+                seen.add(route_id)
+                state = self._routes.get(route_id)
+                if state is None or state.vehicle_id != route.get("vehicle_id") or state.stored != route.get("route_points"):
+                    state = self._build(route)
+                    if state is None:
+                        self._untrack(route_id)
+                        continue
+                    self._track(state)
+                    rebuilt += 1
+                next_stop = state.next_stop
+                if open_order_ids is not None:
+                    while next_stop < len(state.order_ids) and state.order_ids[next_stop] not in open_order_ids:
+                        next_stop += 1
+                # Unlocated vehicles are assumed to be at their last served stop (or the depot).
+                origin = positions.get(state.vehicle_id) or (
+                    (float(state.lat[next_stop - 1]), float(state.lng[next_stop - 1])) if next_stop else state.depot
+                )
+                if origin is not None and (
+                    state.arrivals is None
+                    or next_stop != state.next_stop
+                    or state.origin is None
+                    or abs(origin[0] - state.origin[0]) > _MOVE_EPSILON
+                    or abs(origin[1] - state.origin[1]) > _MOVE_EPSILON
+                ):
+                    state.next_stop, state.origin = next_stop, origin
+                    stale.append(state)
+            for route_id in [route_id for route_id in self._routes if route_id not in seen]:
+                self._untrack(route_id)
+            self._anchor(stale, now)
+            self.syncs += 1
+            self.routes_rebuilt += rebuilt
+            self.routes_reanchored += len(stale)
+            self.last_sync_seconds = time.perf_counter() - started
+        return {"routes": len(self._routes), "rebuilt": rebuilt, "reanchored": len(stale)}
+
+    def _build(self, route: Dict[str, Any]) -> Optional[RouteEta]:
+        points = (route.get("route_points") or {}).get("points") or []
+        depot = next((point_of(point) for point in points if not point.get("order_id")), None)
+        stops = [(point["order_id"], point_of(point)) for point in points if point.get("order_id")]
+        stops = [(order_id, position) for order_id, position in stops if position is not None]
+        if not stops:
+            return None
+        lat = np.array([position[0] for _, position in stops])
+        lng = np.array([position[1] for _, position in stops])
+        return RouteEta(
+            route.get("id"), route.get("vehicle_id"), route.get("route_points"), depot,
+            [order_id for order_id, _ in stops], lat, lng, self._offsets(lat, lng),
+        )
+
+    def _anchor(self, states: List[RouteEta], now: datetime) -> None:
+        """Recompute the first leg of every stale route in one vectorized distance call."""
+        for state in states:
+            if state.next_stop >= len(state.order_ids):
+                state.arrivals, state.anchored_at = [None] * len(state.order_ids), now
+        states = [state for state in states if state.next_stop < len(state.order_ids)]
+        if not states:
+            return
+        origin = np.array([state.origin for state in states])
+        target = np.array([(state.lat[state.next_stop], state.lng[state.next_stop]) for state in states])
+        first_leg = self.matrix.travel_minutes(self.matrix.pair_distances(origin[:, 0], origin[:, 1], target[:, 0], target[:, 1]))
+        for state, minutes in zip(states, first_leg.tolist()):
+            arrivals: List[Optional[float]] = (minutes + state.offsets - state.offsets[state.next_stop]).tolist()
+            arrivals[: state.next_stop] = [None] * state.next_stop
+            state.arrivals, state.anchored_at = arrivals, now
+
+    def _track(self, state: RouteEta) -> None:
+        self._untrack(state.route_id)
+        self._routes[state.route_id] = state
+        for stop, order_id in enumerate(state.order_ids):
+            self._route_of_order[order_id] = (state.route_id, stop)
+
+    def _untrack(self, route_id: str) -> None:
+        state = self._routes.pop(route_id, None)
+        if state is None:
+            return
+        for order_id in state.order_ids:
+            if self._route_of_order.get(order_id, ("",))[0] == route_id:
+                del self._route_of_order[order_id]
+
+    # --- queries ---------------------------------------------------------------
+
+    def etas(self, order_ids: Optional[Iterable[str]] = None, now: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """ETAs for ``order_ids`` (every tracked open stop if omitted) and the ids with no prediction."""
+        now = now or datetime.utcnow()
+        found: List[Dict[str, Any]] = []
+        missing: List[str] = []
+        with self._lock:
+            if order_ids is None:
+                order_ids = list(self._route_of_order)
+            as_of: Dict[str, str] = {}
+            for order_id in order_ids:
+                route_id, stop = self._route_of_order.get(order_id, (None, 0))
+                state = self._routes.get(route_id)
+                minutes = state.arrivals[stop] if state is not None and state.arrivals is not None else None
+                if minutes is None:
+                    missing.append(order_id)
+                    continue
+                if route_id not in as_of:
+                    as_of[route_id] = state.anchored_at.isoformat()
+                eta = state.anchored_at + timedelta(minutes=minutes)
+                found.append({
+                    "order_id": order_id,
+                    "route_id": state.route_id,
+                    "vehicle_id": state.vehicle_id,
+                    "stops_before": stop - state.next_stop,
+                    "eta": eta.isoformat(),
+                    "minutes_away": round((eta - now).total_seconds() / 60.0, 1),
+                    "as_of": as_of[route_id],
+                })
+        return found, missing
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "routes": len(self._routes),
+                "stops": len(self._route_of_order),
+                "syncs": self.syncs,
+                "routes_rebuilt": self.routes_rebuilt,
+                "routes_reanchored": self.routes_reanchored,
+                "last_sync_seconds": round(self.last_sync_seconds, 4),
+                "service_minutes": self.service_minutes,
+            }
+
+
+# Global instance
+eta_engine = EtaEngine()
@@ -0,0 +1,116 @@
+"""Coordinates, distances and load sizes for the routing engines.
+
+Orders have no geometry columns: a delivery point is read from explicit coordinate
+keys or the ``route`` JSON when present, and otherwise falls back to the merchant's
+depot (the centroid of that merchant's vehicles).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .inventory_policy import parse_order_items
+
+EARTH_RADIUS_KM = 6371.0088
+
+Point = Tuple[float, float]
+
+# Lower rank is served first.
+PRIORITY_RANKS = {"urgent": 0, "high": 0, "medium": 1, "normal": 1, "low": 2}
+DEFAULT_PRIORITY_RANK = 1
+
+_COORDINATE_KEYS = (("lat", "lng"), ("geo_lat", "geo_lng"), ("latitude", "longitude"), ("delivery_lat", "delivery_lng"))
+
+
+def haversine(lat_a: Any, lng_a: Any, lat_b: Any, lng_b: Any) -> np.ndarray:
+    """Great-circle distances in km between broadcast-aligned points of A and B."""
+    lat_a, lng_a = np.radians(np.asarray(lat_a, dtype=float)), np.radians(np.asarray(lng_a, dtype=float))
+    lat_b, lng_b = np.radians(np.asarray(lat_b, dtype=float)), np.radians(np.asarray(lng_b, dtype=float))
+    a = np.sin((lat_b - lat_a) / 2.0) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lng_b - lng_a) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lat_a: Any, lng_a: Any, lat_b: Any, lng_b: Any) -> np.ndarray:
+    """Great-circle distances in km between every point of A (rows) and B (columns)."""
+    return haversine(
+        np.asarray(lat_a, dtype=float)[:, None], np.asarray(lng_a, dtype=float)[:, None],
+        np.asarray(lat_b, dtype=float)[None, :], np.asarray(lng_b, dtype=float)[None, :],
+    )
+
+
+def point_of(value: Any) -> Optional[Point]:
+    """``(lat, lng)`` from a dict carrying any of the usual coordinate key pairs."""
+    if not isinstance(value, dict):
+        return None
+    for lat_key, lng_key in _COORDINATE_KEYS:
+        lat, lng = value.get(lat_key), value.get(lng_key)
+        if lat is not None and lng is not None:
+            try:
+                return float(lat), float(lng)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def vehicle_position(vehicle: Dict[str, Any]) -> Optional[Point]:
+    return point_of(vehicle)
+
+
+def merchant_depots(fleet: Iterable[Dict[str, Any]]) -> Dict[str, Point]:
+    """Centroid of each merchant's located vehicles."""
+    sums: Dict[str, list] = {}
+    for vehicle in fleet:
+        position = vehicle_position(vehicle)
+        merchant = vehicle.get("merchant_id")
+        if position is None or not merchant:
+            continue
+        entry = sums.setdefault(merchant, [0.0, 0.0, 0])
+        entry[0] += position[0]
+        entry[1] += position[1]
+        entry[2] += 1
+    return {merchant: (lat / count, lng / count) for merchant, (lat, lng, count) in sums.items()}
+
+
+def order_location(order: Dict[str, Any], depots: Optional[Dict[str, Point]] = None) -> Optional[Point]:
+    """Delivery point of an order, or None if it cannot be placed."""
+    explicit = point_of(order)
+    if explicit:
+        return explicit
+    route = order.get("route")
+    if isinstance(route, dict):
+        destination = point_of(route.get("destination")) or point_of(route)
+        if destination:
+            return destination
+        route = route.get("points")
+    if isinstance(route, list):
+        for point in reversed(route):
+            located = point_of(point)
+            if located:
+                return located
+    return (depots or {}).get(order.get("merchant_id"))
+
+
+def order_demand(order: Dict[str, Any]) -> int:
+    """Units carried for an order (sum of ``Order.items`` quantities, at least 1)."""
+    return max(1, sum(parse_order_items(order.get("items")).values()))
+
+
+def order_priority(order: Dict[str, Any]) -> int:
+    return PRIORITY_RANKS.get(str(order.get("priority") or "").lower(), DEFAULT_PRIORITY_RANK)
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Naive UTC datetime from a datetime or an ISO string; free-text LLM estimates give None."""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    return parsed if parsed.tzinfo is None else (parsed - parsed.utcoffset()).replace(tzinfo=None)
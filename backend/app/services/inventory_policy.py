@@ -0,0 +1,208 @@
+"""Deterministic reorder and expiry policies used before escalating to the LLM."""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+
+_ORDER_LINE = re.compile(r"\s*([^:,]+?)\s*:\s*(\d+)\s*")
+
+
+def parse_order_items(items: Any) -> Dict[str, int]:
+    """Parse ``Order.items`` text such as ``"Spinach Crates: 20, Coffee Beans: 5"``."""
+    if not isinstance(items, str):
+        return {}
+    parsed: Dict[str, int] = {}
+    for chunk in items.split(","):
+        match = _ORDER_LINE.fullmatch(chunk)
+        if match:
+            name = match.group(1).strip().lower()
+            parsed[name] = parsed.get(name, 0) + int(match.group(2))
+    return parsed
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return None
+
+
+def daily_demand(orders: Iterable[Dict[str, Any]], window_days: int, now: Optional[datetime] = None) -> Dict[str, float]:
+    """Average units per day for each item name over the trailing window."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=window_days)
+    totals: Dict[str, int] = {}
+    for order in orders or []:
+        created = _as_datetime(order.get("created_at"))
+        if created is not None and created < cutoff:
+            continue
+        for name, quantity in parse_order_items(order.get("items")).items():
+            totals[name] = totals.get(name, 0) + quantity
+    return {name: total / float(window_days) for name, total in totals.items()}
+
+
+def reorder_threshold(item: Dict[str, Any]) -> int:
+    return int(item.get("min_threshold") or item.get("min_quantity") or 10)
+
+
+@dataclass
+class PolicyResult:
+    """Split of items into policy-decided recommendations and ones left for the LLM."""
+
+    decided: List[Dict[str, Any]] = field(default_factory=list)
+    escalated: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class InventoryPolicyEngine:
+    """Reorder-point / EOQ sizing and expiry classification over whole item batches.
+
+    Each rule also reports a confidence margin; items whose margin is below
+    ``POLICY_CONFIDENCE_MARGIN`` sit too close to a decision boundary and are
+    escalated to the LLM instead.
+    """
+
+    def __init__(
+        self,
+        lead_time_days: Optional[float] = None,
+        service_z: Optional[float] = None,
+        ordering_cost: Optional[float] = None,
+        holding_cost: Optional[float] = None,
+        confidence_margin: Optional[float] = None,
+        demand_window_days: Optional[int] = None,
+    ):
+        self.lead_time_days = lead_time_days if lead_time_days is not None else settings.POLICY_LEAD_TIME_DAYS
+        self.service_z = service_z if service_z is not None else settings.POLICY_SERVICE_Z
+        self.ordering_cost = ordering_cost if ordering_cost is not None else settings.POLICY_ORDERING_COST
+        self.holding_cost = holding_cost if holding_cost is not None else settings.POLICY_HOLDING_COST
+        self.confidence_margin = (
+            confidence_margin if confidence_margin is not None else settings.POLICY_CONFIDENCE_MARGIN
+        )
+        self.demand_window_days = demand_window_days or settings.POLICY_DEMAND_WINDOW_DAYS
+
+    def _demand_vector(self, items: List[Dict[str, Any]], demand: Dict[str, float]) -> np.ndarray:
+        names = [str(item.get("item_name") or item.get("name") or "").lower() for item in items]
+        return np.array([demand.get(name, 0.0) for name in names], dtype=float)
+
+    def reorder(
+        self, items: List[Dict[str, Any]], orders: List[Dict[str, Any]], escalate: bool = True
+    ) -> PolicyResult:
+        """Size reorders for low-stock items.
+
+        ``recommended_quantity`` is an order-up-to level (reorder point plus EOQ), which
+        is how ``execute_reorder_action`` interprets it. With ``escalate=False`` (agent
+        over its token budget) low-margin items are decided by the policy as well.
+        """
+        result = PolicyResult()
+        if not items:
+            return result
+
+        demand = self._demand_vector(items, daily_demand(orders, self.demand_window_days))
+        quantity = np.array([float(item.get("quantity") or 0) for item in items])
+        threshold = np.array([float(reorder_threshold(item)) for item in items])
+
+        lead_demand = demand * self.lead_time_days
+        safety_stock = self.service_z * np.sqrt(lead_demand)
+        reorder_point = np.maximum(threshold, lead_demand + safety_stock)
+        annual_demand = demand * 365.0
+        eoq = np.sqrt(2.0 * annual_demand * self.ordering_cost / max(self.holding_cost, 1e-9))
+        # Without demand history fall back to refilling one threshold's worth.
+        eoq = np.where(annual_demand > 0, eoq, threshold)
+        target = np.ceil(reorder_point + eoq).astype(int)
+
+        margin = (reorder_point - quantity) / np.maximum(reorder_point, 1.0)
+        cover_days = np.where(demand > 0, quantity / np.maximum(demand, 1e-9), np.inf)
+        priority = np.where(
+            (quantity < 0.5 * reorder_point) | (cover_days < self.lead_time_days),
+            "high",
+            np.where(margin >= 0.25, "medium", "low"),
+        )
+
+        for index, item in enumerate(items):
+            if escalate and margin[index] < self.confidence_margin:
+                result.escalated.append(item)
+                continue
+            result.decided.append(
+                {
+                    "item_id": item.get("id"),
+                    "item_name": item.get("item_name") or item.get("name"),
+                    "current_quantity": int(quantity[index]),
+                    "recommended_quantity": int(target[index]),
+                    "priority": str(priority[index]),
+                    "reasoning": (
+                        f"Policy: stock {int(quantity[index])} below reorder point "
+                        f"{reorder_point[index]:.0f} (demand {demand[index]:.1f}/day, "
+                        f"lead time {self.lead_time_days:g}d); order up to {int(target[index])} (EOQ {eoq[index]:.0f})."
+                    ),
+                }
+            )
+        return result
+
+    def expiry(
+        self, items: List[Dict[str, Any]], orders: List[Dict[str, Any]], escalate: bool = True
+    ) -> PolicyResult:
+        """Classify expiring items into disposal / donation / clearance / maintain.
+
+        ``items`` use the shape built by ``InventoryAgent.handle_expired_items``;
+        ``escalate`` works as in ``reorder``.
+        """
+        result = PolicyResult()
+        if not items:
+            return result
+
+        demand = self._demand_vector(items, daily_demand(orders, self.demand_window_days))
+        quantity = np.array([float(item.get("quantity") or 0) for item in items])
+        days_left = np.array([float(item.get("days_until_expiry", 0)) for item in items])
+
+        sellable = demand * np.maximum(days_left, 0.0)
+        excess = np.maximum(quantity - sellable, 0.0)
+        # Relative distance from the "demand absorbs the stock" boundary.
+        margin = np.abs(quantity - sellable) / np.maximum(quantity, 1.0)
+
+        expired = days_left < 0
+        action = np.select(
+            [expired, excess <= 0, days_left <= 1],
+            ["disposal", "maintain", "donation"],
+            default="clearance",
+        )
+        urgency = np.select(
+            [expired | (days_left <= 1), action == "clearance"],
+            ["high", "medium"],
+            default="low",
+        )
+        action_quantity = np.where(expired, quantity, excess).astype(int)
+
+        for index, item in enumerate(items):
+            if escalate and not expired[index] and margin[index] < self.confidence_margin:
+                result.escalated.append(item)
+                continue
+            result.decided.append(
+                {
+                    "item_id": item.get("item_id"),
+                    "action": str(action[index]),
+                    "quantity": int(action_quantity[index]),
+                    "urgency": str(urgency[index]),
+                    "reasoning": (
+                        f"Policy: {int(quantity[index])} units, {int(days_left[index])} days to expiry, "
+                        f"expected sales {sellable[index]:.0f} at {demand[index]:.1f}/day."
+                    ),
+                    "expected_impact": f"Avoids waste of {int(action_quantity[index])} units"
+                    if action[index] != "maintain"
+                    else "Stock expected to sell through before expiry",
+                }
+            )
+        return result
+
+
+# Global instance
+inventory_policy = InventoryPolicyEngine()
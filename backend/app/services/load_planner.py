@@ -0,0 +1,217 @@
+"""Capacity-feasible load plans: which orders each available vehicle carries.
+
+Order sizes are the unit totals of ``Order.items``. Orders are packed first-fit
+decreasing (most urgent priority first, then largest first) into the vehicles of
+their own merchant, largest vehicles first; orders of merchants without vehicles may
+use any vehicle. A local pass then
+
+* swaps a packed order out for a larger or more urgent unpacked one when the packed
+  order still fits in another vehicle (or is less urgent), and
+* empties the least-loaded vehicles into the spare room of the others, so fewer
+  vehicles go out.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .geo import order_demand, order_priority
+
+# Local-search rounds; each either improves the plan or ends the pass.
+_IMPROVE_ROUNDS = 200
+
+
+@dataclass
+class LoadPlan:
+    loads: Dict[str, List[str]] = field(default_factory=dict)  # vehicle id -> order ids
+    load: Dict[str, int] = field(default_factory=dict)
+    capacity: Dict[str, int] = field(default_factory=dict)
+    unpacked: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def vehicle_of(self) -> Dict[str, str]:
+        return {order_id: vehicle_id for vehicle_id, order_ids in self.loads.items() for order_id in order_ids}
+
+    def as_prompt(self) -> List[Dict[str, Any]]:
+        return [
+            {"vehicle_id": vehicle_id, "capacity": self.capacity[vehicle_id], "load": self.load[vehicle_id], "order_ids": order_ids}
+            for vehicle_id, order_ids in self.loads.items()
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        used_capacity = sum(self.capacity[vehicle_id] for vehicle_id in self.loads)
+        packed = sum(self.load.values())
+        return {
+            "vehicles_used": len(self.loads),
+            "orders_packed": sum(len(order_ids) for order_ids in self.loads.values()),
+            "orders_unpacked": len(self.unpacked),
+            "units_packed": packed,
+            "utilization": round(packed / used_capacity, 3) if used_capacity else 0.0,
+            "seconds": round(self.seconds, 4),
+        }
+
+
+class LoadPlanner:
+    def __init__(self, improve_rounds: int = _IMPROVE_ROUNDS):
+        self.improve_rounds = improve_rounds
+
+    def pack(self, orders: Sequence[Dict[str, Any]], fleet: Sequence[Dict[str, Any]]) -> LoadPlan:
+        started = time.perf_counter()
+        plan = LoadPlan()
+        orders = [order for order in orders if order.get("id")]
+        vehicles = [row for row in fleet if row.get("id") and int(row.get("capacity") or 0) > 0]
+        if not orders or not vehicles:
+            plan.unpacked = [order["id"] for order in orders]
+            plan.seconds = time.perf_counter() - started
+            return plan
+
+        size = np.array([order_demand(order) for order in orders])
+        rank = np.array([order_priority(order) for order in orders])
+        capacity = np.array([int(row["capacity"]) for row in vehicles])
+        allowed = self._compatibility(orders, vehicles)
+        # Largest vehicles are opened first so fewer of them are needed.
+        by_capacity = np.argsort(-capacity, kind="stable")
+        capacity, allowed = capacity[by_capacity], allowed[:, by_capacity]
+        vehicles = [vehicles[index] for index in by_capacity]
+
+        residual = capacity.copy()
+        vehicle_of = np.full(len(orders), -1)
+        for item in np.lexsort((-size, rank)):
+            fits = np.flatnonzero(allowed[item] & (residual >= size[item]))
+            if len(fits):
+                vehicle_of[item] = fits[0]
+                residual[fits[0]] -= size[item]
+
+        self._improve(size, rank, allowed, residual, vehicle_of)
+
+        for item in np.argsort(vehicle_of, kind="stable"):
+            if vehicle_of[item] < 0:
+                plan.unpacked.append(orders[item]["id"])
+                continue
+            vehicle = vehicles[vehicle_of[item]]
+            plan.loads.setdefault(vehicle["id"], []).append(orders[item]["id"])
+            plan.load[vehicle["id"]] = plan.load.get(vehicle["id"], 0) + int(size[item])
+            plan.capacity[vehicle["id"]] = int(vehicle["capacity"])
+        plan.seconds = time.perf_counter() - started
+        return plan
+
+    @staticmethod
+    def _compatibility(orders: Sequence[Dict[str, Any]], vehicles: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """``allowed[order, vehicle]``: vehicles of the order's merchant, or any vehicle if it has none."""
+        merchants = np.array([vehicle.get("merchant_id") or "" for vehicle in vehicles])
+        fleet_merchants = set(merchants.tolist()) - {""}
+        allowed = np.ones((len(orders), len(vehicles)), dtype=bool)
+        for row, order in enumerate(orders):
+            merchant = order.get("merchant_id")
+            if merchant in fleet_merchants:
+                allowed[row] = merchants == merchant
+        return allowed
+
+    def _improve(
+        self, size: np.ndarray, rank: np.ndarray, allowed: np.ndarray, residual: np.ndarray, vehicle_of: np.ndarray
+    ) -> None:
+        for _ in range(self.improve_rounds):
+            if not (self._swap_in(size, rank, allowed, residual, vehicle_of) or self._empty_vehicle(size, allowed, residual, vehicle_of)):
+                return
+
+    @staticmethod
+    def _swap_in(size, rank, allowed, residual, vehicle_of) -> bool:
+        """Pack one waiting order in place of a smaller or less urgent packed one."""
+        waiting = np.lexsort((-size, rank))
+        waiting = waiting[vehicle_of[waiting] < 0]
+        packed = np.flatnonzero(vehicle_of >= 0)
+        if not len(waiting) or not len(packed):
+            return False
+        host = vehicle_of[packed]
+        # Largest spare room each packed order could move into, outside its own vehicle.
+        spare = np.where(allowed[packed], residual, -1)
+        spare[np.arange(len(packed)), host] = -1
+        movable = spare.max(axis=1) >= size[packed]
+        for item in waiting:
+            eligible = (
+                allowed[item, host]
+                & (residual[host] + size[packed] >= size[item])
+                & (movable | (rank[packed] > rank[item]))
+            )
+            if not eligible.any():
+                continue
+            choice = np.flatnonzero(eligible)
+            slot = choice[np.argmin(size[packed[choice]])]
+            out, vehicle = packed[slot], host[slot]
+            if movable[slot]:
+                elsewhere = allowed[out] & (residual >= size[out])
+                elsewhere[vehicle] = False
+                target = np.flatnonzero(elsewhere)[0]
+                residual[target] -= size[out]
+                vehicle_of[out] = target
+            else:
+                vehicle_of[out] = -1
+            residual[vehicle] += size[out] - size[item]
+            vehicle_of[item] = vehicle
+            return True
+        return False
+
+    @staticmethod
+    def _empty_vehicle(size, allowed, residual, vehicle_of) -> bool:
+        """Move every order of the least-loaded vehicle into spare room elsewhere."""
+        used = np.unique(vehicle_of[vehicle_of >= 0])
+        if len(used) < 2:
+            return False
+        loads = np.bincount(vehicle_of[vehicle_of >= 0], minlength=len(residual))
+        for vehicle in used[np.argsort(loads[used], kind="stable")]:
+            items = np.flatnonzero(vehicle_of == vehicle)
+            trial = residual.copy()
+            trial[vehicle] = -1
+            # Only vehicles already going out take the load; idle ones stay idle.
+            trial[np.setdiff1d(np.arange(len(trial)), used)] = -1
+            moves: List[Tuple[int, int]] = []
+            for item in items[np.argsort(-size[items], kind="stable")]:
+                fits = np.flatnonzero(allowed[item] & (trial >= size[item]))
+                if not len(fits):
+                    break
+                trial[fits[0]] -= size[item]
+                moves.append((item, fits[0]))
+            else:
+                for item, target in moves:
+                    vehicle_of[item] = target
+                    residual[target] -= size[item]
+                residual[vehicle] += size[items].sum()
+                return True
+        return False
+
+    def enforce(
+        self, assignments: List[Dict[str, Any]], orders: Sequence[Dict[str, Any]], fleet: Sequence[Dict[str, Any]]
+    ) -> List[str]:
+        """Trim each ``assigned_orders`` list to its vehicle's capacity (least urgent, then largest, go first).
+
+        Returns the ids of the orders that were dropped.
+        """
+        size = {order.get("id"): order_demand(order) for order in orders}
+        rank = {order.get("id"): order_priority(order) for order in orders}
+        capacity = {row.get("id"): int(row.get("capacity") or 0) for row in fleet}
+        dropped: List[str] = []
+        for assignment in assignments:
+            limit = capacity.get(assignment.get("vehicle_id"))
+            order_ids = assignment.get("assigned_orders") or []
+            if limit is None or sum(size.get(order_id, 1) for order_id in order_ids) <= limit:
+                continue
+            kept, load = [], 0
+            for order_id in sorted(order_ids, key=lambda order_id: (rank.get(order_id, 1), -size.get(order_id, 1))):
+                if load + size.get(order_id, 1) <= limit:
+                    kept.append(order_id)
+                    load += size.get(order_id, 1)
+                else:
+                    dropped.append(order_id)
+            keep = set(kept)
+            assignment["assigned_orders"] = [order_id for order_id in order_ids if order_id in keep]
+            if assignment.get("route_sequence"):
+                assignment["route_sequence"] = [order_id for order_id in assignment["route_sequence"] if order_id in keep]
+        return dropped
+
+
+# Global instance
+load_planner = LoadPlanner()
@@ -0,0 +1,377 @@
+"""Incremental geographic clustering of pending orders into delivery waves.
+
+Orders are keyed by depot (their merchant) and wave (the ``ROUTING_WAVE_MINUTES``
+window their ``estimated_delivery_time`` falls in; orders without one form the
+"asap" wave). Within a depot and wave, each order drops into a grid cell of about
+``ROUTING_CLUSTER_CELL_KM``, and a cluster is a set of edge- or corner-adjacent
+occupied cells: grid-based DBSCAN with a one-order density threshold.
+
+Clusters are maintained incrementally. A new order either joins the cluster of its
+cell's neighbours or merges the clusters it touches; only when a cell empties is that
+one cluster re-walked to see whether it split.
+
+``partition`` turns the clusters of the waves due now into solve batches of at most
+``ROUTING_CLUSTER_MAX_ORDERS`` orders, each with nearby vehicles that cover its
+demand, so routing and assignment can run per batch, in parallel. Orders of later
+waves stay pending, and keep their vehicles free, until their wave comes up.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .geo import haversine_matrix, merchant_depots, order_demand, order_location, order_priority, parse_timestamp, vehicle_position
+
+KM_PER_DEGREE = 111.195
+ASAP_WAVE = -1
+EPOCH = datetime(1970, 1, 1)
+# Batches whose centres are this much further from a spare vehicle than its nearest batch do not get it.
+METRO_KM = 25.0
+
+Cell = Tuple[str, int, int, int]  # depot, wave, row, column
+
+
+@dataclass
+class OrderCluster:
+    id: str
+    depot: str
+    wave: int
+    order_ids: List[str]
+    lat: float
+    lng: float
+
+    def wave_start(self, wave_minutes: int) -> Optional[str]:
+        if self.wave == ASAP_WAVE:
+            return None
+        return (EPOCH + timedelta(minutes=self.wave * wave_minutes)).isoformat()
+
+    def as_dict(self, wave_minutes: int) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "depot": self.depot or None,
+            "wave_start": self.wave_start(wave_minutes),
+            "orders": len(self.order_ids),
+            "lat": round(self.lat, 6),
+            "lng": round(self.lng, 6),
+        }
+
+
+@dataclass
+class SolveBatch:
+    depot: str
+    cluster_ids: List[str]
+    orders: List[Dict[str, Any]]
+    fleet: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class _Tracked:
+    cell: Cell
+    lat: float
+    lng: float
+    signature: Tuple[Any, ...]
+
+
+class OrderClusterer:
+    def __init__(
+        self,
+        cell_km: Optional[float] = None,
+        wave_minutes: Optional[int] = None,
+        max_orders: Optional[int] = None,
+        fleet_slack: Optional[float] = None,
+    ):
+        self.cell_deg = (cell_km or settings.ROUTING_CLUSTER_CELL_KM) / KM_PER_DEGREE
+        self.wave_minutes = wave_minutes or settings.ROUTING_WAVE_MINUTES
+        self.max_orders = max_orders or settings.ROUTING_CLUSTER_MAX_ORDERS
+        self.fleet_slack = fleet_slack or settings.ROUTING_CLUSTER_FLEET_SLACK
+        self._orders: Dict[str, _Tracked] = {}
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._cluster_of: Dict[Cell, int] = {}
+        self._clusters: Dict[int, Set[Cell]] = {}
+        self._dirty: Set[int] = set()
+        self._next_id = 0
+        self.merges = 0
+        self.splits = 0
+        self.sync_seconds = 0.0
+
+    # --- keys ------------------------------------------------------------------
+
+    def _wave(self, order: Dict[str, Any]) -> int:
+        due = parse_timestamp(order.get("estimated_delivery_time"))
+        if due is None:
+            return ASAP_WAVE
+        return int((due - EPOCH).total_seconds() // 60 // self.wave_minutes)
+
+    def _cell(self, depot: str, wave: int, lat: float, lng: float) -> Cell:
+        # Columns shrink with latitude so cells stay roughly square on the ground.
+        lng_deg = self.cell_deg / max(math.cos(math.radians(lat)), 0.01)
+        return depot, wave, int(math.floor(lat / self.cell_deg)), int(math.floor(lng / lng_deg))
+
+    # --- incremental maintenance ----------------------------------------------
+
+    def sync(self, orders: Iterable[Dict[str, Any]], fleet: Sequence[Dict[str, Any]] = ()) -> Tuple[int, int]:
+        """Track exactly ``orders``; returns ``(added, removed)``. Unchanged orders cost a dict lookup."""
+        started = time.perf_counter()
+        depots = None
+        seen: Set[str] = set()
+        added = 0
+        for order in orders:
+            order_id = order.get("id")
+            if not order_id:
+                continue
+            explicit = order_location(order)
+            if explicit is None:
+                if depots is None:
+                    depots = merchant_depots(fleet)
+                explicit = depots.get(order.get("merchant_id"))
+            if explicit is None:
+                continue
+            seen.add(order_id)
+            signature = (explicit, order.get("merchant_id"), order.get("estimated_delivery_time"))
+            current = self._orders.get(order_id)
+            if current is not None and current.signature == signature:
+                continue
+            if current is not None:
+                self.remove(order_id)
+            self._add(order_id, order, explicit, signature)
+            added += 1
+        removed = [order_id for order_id in self._orders if order_id not in seen]
+        for order_id in removed:
+            self.remove(order_id)
+        self._settle()
+        self.sync_seconds += time.perf_counter() - started
+        return added, len(removed)
+
+    def _add(self, order_id: str, order: Dict[str, Any], location: Tuple[float, float], signature) -> None:
+        depot = order.get("merchant_id") or ""
+        cell = self._cell(depot, self._wave(order), *location)
+        self._orders[order_id] = _Tracked(cell, location[0], location[1], signature)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.add(order_id)
+            return
+        self._cells[cell] = {order_id}
+        touching = {self._cluster_of[neighbour] for neighbour in self._neighbours(cell) if neighbour in self._cluster_of}
+        if not touching:
+            cluster = self._new_cluster({cell})
+            self._cluster_of[cell] = cluster
+            return
+        # Merge into the largest touching cluster; relabel the smaller ones.
+        target = max(touching, key=lambda cluster: len(self._clusters[cluster]))
+        self._clusters[target].add(cell)
+        self._cluster_of[cell] = target
+        for cluster in touching - {target}:
+            for moved in self._clusters.pop(cluster):
+                self._cluster_of[moved] = target
+                self._clusters[target].add(moved)
+            if cluster in self._dirty:
+                self._dirty.discard(cluster)
+                self._dirty.add(target)
+            self.merges += 1
+
+    def remove(self, order_id: str) -> None:
+        tracked = self._orders.pop(order_id, None)
+        if tracked is None:
+            return
+        members = self._cells[tracked.cell]
+        members.discard(order_id)
+        if members:
+            return
+        del self._cells[tracked.cell]
+        cluster = self._cluster_of.pop(tracked.cell)
+        self._clusters[cluster].discard(tracked.cell)
+        if self._clusters[cluster]:
+            self._dirty.add(cluster)
+        else:
+            del self._clusters[cluster]
+            self._dirty.discard(cluster)
+
+    def _settle(self) -> None:
+        """Re-walk only the clusters that lost a cell; split those that came apart."""
+        for cluster in self._dirty:
+            cells = self._clusters.get(cluster)
+            if not cells:
+                continue
+            parts = self._components(cells)
+            if len(parts) < 2:
+                continue
+            parts.sort(key=len, reverse=True)
+            self._clusters[cluster] = parts[0]
+            for part in parts[1:]:
+                new = self._new_cluster(part)
+                for cell in part:
+                    self._cluster_of[cell] = new
+            self.splits += len(parts) - 1
+        self._dirty.clear()
+
+    def _components(self, cells: Set[Cell]) -> List[Set[Cell]]:
+        remaining = set(cells)
+        parts = []
+        while remaining:
+            frontier = [remaining.pop()]
+            part = set(frontier)
+            while frontier:
+                for neighbour in self._neighbours(frontier.pop()):
+                    if neighbour in remaining:
+                        remaining.discard(neighbour)
+                        part.add(neighbour)
+                        frontier.append(neighbour)
+            parts.append(part)
+        return parts
+
+    def _new_cluster(self, cells: Set[Cell]) -> int:
+        cluster = self._next_id
+        self._next_id += 1
+        self._clusters[cluster] = set(cells)
+        return cluster
+
+    @staticmethod
+    def _neighbours(cell: Cell) -> List[Cell]:
+        depot, wave, row, column = cell
+        return [(depot, wave, row + dy, column + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+    # --- output ----------------------------------------------------------------
+
+    def clusters(self) -> List[OrderCluster]:
+        result = []
+        for cluster, cells in self._clusters.items():
+            depot, wave = next(iter(cells))[:2]
+            order_ids = [order_id for cell in cells for order_id in self._cells[cell]]
+            lat = sum(self._orders[order_id].lat for order_id in order_ids) / len(order_ids)
+            lng = sum(self._orders[order_id].lng for order_id in order_ids) / len(order_ids)
+            result.append(OrderCluster(f"{depot or 'none'}:{wave}:{cluster}", depot, wave, order_ids, lat, lng))
+        result.sort(key=lambda cluster: (cluster.wave != ASAP_WAVE, cluster.wave, cluster.depot, cluster.id))
+        return result
+
+    def due_now(self, cluster: OrderCluster, now: Optional[datetime] = None) -> bool:
+        """ASAP and overdue waves, and the next wave, are dispatched now; later waves wait their turn."""
+        now = now or datetime.utcnow()
+        return cluster.wave == ASAP_WAVE or EPOCH + timedelta(minutes=cluster.wave * self.wave_minutes) <= now + timedelta(minutes=self.wave_minutes)
+
+    def partition(
+        self, orders: Sequence[Dict[str, Any]], fleet: Sequence[Dict[str, Any]], now: Optional[datetime] = None
+    ) -> List[SolveBatch]:
+        """Solve batches of at most ``max_orders`` orders, each with nearby vehicles covering its demand.
+
+        Only waves that are due now are batched. Within a depot, clusters are swept by
+        angle into batches; clusters too large for one batch are cut into angular
+        sectors. Batches holding urgent orders pick their vehicles first.
+        Orders that are not tracked (no location) are left out.
+        """
+        by_id = {order.get("id"): order for order in orders}
+        batches = self._batches([
+            cluster for cluster in self.clusters()
+            if self.due_now(cluster, now) and any(order_id in by_id for order_id in cluster.order_ids)
+        ], by_id)
+
+        located = [(row, vehicle_position(row)) for row in fleet if row.get("id") and int(row.get("capacity") or 0) > 0]
+        located = [(row, position) for row, position in located if position is not None]
+        if not batches or not located:
+            return batches
+        vehicle_lat = np.array([position[0] for _, position in located])
+        vehicle_lng = np.array([position[1] for _, position in located])
+        capacity = np.array([int(row["capacity"]) for row, _ in located])
+        centroids = np.array([
+            [np.mean([self._orders[order["id"]].lat for order in batch.orders]),
+             np.mean([self._orders[order["id"]].lng for order in batch.orders])]
+            for batch in batches
+        ])
+        distances = haversine_matrix(centroids[:, 0], centroids[:, 1], vehicle_lat, vehicle_lng)
+        # A batch draws on its own depot's vehicles; vehicles of depots with nothing due are shared.
+        merchants = np.array([row.get("merchant_id") or "" for row, _ in located])
+        busy = {batch.depot for batch in batches}
+        usable = np.array([[merchant == batch.depot or merchant not in busy for merchant in merchants] for batch in batches])
+        distances = np.where(usable, distances, np.inf)
+        taken = np.zeros(len(located), dtype=bool)
+        demand = np.array([sum(order_demand(order) for order in batch.orders) for batch in batches], dtype=float)
+        covered = np.zeros(len(batches))
+        # First each batch gets the nearest vehicles that carry its demand, urgent batches first ...
+        for index, batch in enumerate(batches):
+            # Vehicles already handed out (or not usable) sort last; reaching one means none are left.
+            for vehicle in np.argsort(np.where(taken, np.inf, distances[index]), kind="stable"):
+                if covered[index] >= demand[index] or taken[vehicle] or not np.isfinite(distances[index, vehicle]):
+                    break
+                taken[vehicle] = True
+                covered[index] += capacity[vehicle]
+                batch.fleet.append(located[vehicle][0])
+        # ... then spare vehicles, largest first, top up the least-covered nearby batch to
+        # ``fleet_slack`` times its demand, so savings routes have room to fit the vehicles.
+        for vehicle in sorted(np.flatnonzero(~taken), key=lambda vehicle: -capacity[vehicle]):
+            reach = distances[:, vehicle]
+            if not np.isfinite(reach.min()):
+                continue
+            nearby = np.flatnonzero((reach <= reach.min() + METRO_KM) & (covered < self.fleet_slack * demand))
+            if not len(nearby):
+                continue
+            index = nearby[np.argmin(covered[nearby] / demand[nearby])]
+            covered[index] += capacity[vehicle]
+            batches[index].fleet.append(located[vehicle][0])
+        return batches
+
+    def _batches(self, clusters: List[OrderCluster], by_id: Dict[str, Dict[str, Any]]) -> List[SolveBatch]:
+        # Sweep each depot by angle around its centre, so a batch is one contiguous sector.
+        groups: Dict[str, List[OrderCluster]] = {}
+        for cluster in clusters:
+            groups.setdefault(cluster.depot, []).append(cluster)
+        swept = []
+        for members in groups.values():
+            lat = sum(cluster.lat * len(cluster.order_ids) for cluster in members) / sum(len(cluster.order_ids) for cluster in members)
+            lng = sum(cluster.lng * len(cluster.order_ids) for cluster in members) / sum(len(cluster.order_ids) for cluster in members)
+            swept.extend(sorted(members, key=lambda cluster: math.atan2(cluster.lat - lat, cluster.lng - lng)))
+
+        batches: List[SolveBatch] = []
+        open_batch: Optional[SolveBatch] = None
+        open_key = None
+        for cluster in swept:
+            orders = [self._located(order_id, by_id[order_id]) for order_id in cluster.order_ids if order_id in by_id]
+            key = cluster.depot
+            if len(orders) > self.max_orders:
+                batches.extend(SolveBatch(cluster.depot, [cluster.id], sector) for sector in self._sectors(orders))
+                continue
+            if open_batch is None or open_key != key or len(open_batch.orders) + len(orders) > self.max_orders:
+                open_batch = SolveBatch(cluster.depot, [], [])
+                open_key = key
+                batches.append(open_batch)
+            open_batch.cluster_ids.append(cluster.id)
+            open_batch.orders.extend(orders)
+        # Urgent work first: batches holding high-priority orders pick vehicles before the rest.
+        return sorted(batches, key=lambda batch: min(order_priority(order) for order in batch.orders))
+
+    def _located(self, order_id: str, order: Dict[str, Any]) -> Dict[str, Any]:
+        """Pin depot-fallback orders to the point they were clustered at; a batch's fleet may not include their merchant."""
+        if order_location(order) is not None:
+            return order
+        tracked = self._orders[order_id]
+        return {**order, "lat": tracked.lat, "lng": tracked.lng}
+
+    def _sectors(self, orders: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Cut an oversized cluster into equal angular sectors around its centre."""
+        lat = np.array([self._orders[order["id"]].lat for order in orders])
+        lng = np.array([self._orders[order["id"]].lng for order in orders])
+        angle = np.arctan2(lat - lat.mean(), (lng - lng.mean()) * math.cos(math.radians(float(lat.mean()))))
+        ordered = np.argsort(angle, kind="stable")
+        count = math.ceil(len(orders) / self.max_orders)
+        return [[orders[index] for index in chunk] for chunk in np.array_split(ordered, count)]
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [len(cells) for cells in self._clusters.values()]
+        return {
+            "orders": len(self._orders),
+            "cells": len(self._cells),
+            "clusters": len(self._clusters),
+            "largest_cluster_cells": max(sizes) if sizes else 0,
+            "merges": self.merges,
+            "splits": self.splits,
+            "sync_seconds": round(self.sync_seconds, 4),
+        }
+
+
+# Global instance
+order_clusters = OrderClusterer()
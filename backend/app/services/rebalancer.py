@@ -0,0 +1,306 @@
+"""Repositioning idle vehicles toward forecast demand.
+
+Demand per area (a ``ROUTING_REBALANCE_CELL_KM`` grid cell) is forecast from the orders
+of the last ``ROUTING_REBALANCE_LOOKBACK_HOURS``: each order counts its size in units,
+decayed with a half-life of ``ROUTING_REBALANCE_HALF_LIFE_HOURS``. Only orders with a
+delivery location count: placing the others at their merchant's depot would pull the
+fleet toward its own centroid. Each merchant's idle vehicles are shared among its
+areas in proportion to that forecast (vehicles of no merchant serve the orders of
+merchants without a fleet).
+
+Reaching those targets is a transportation problem: areas with more idle vehicles
+than their target supply vehicles, short areas demand them, and a move costs its road
+km. It is solved between areas as a min-cost flow (successive shortest paths), so its
+size depends on the number of areas, not vehicles; each flow then takes the vehicles
+of its area nearest to the destination. No vehicle is sent further than
+``ROUTING_REBALANCE_MAX_KM``.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .distance_matrix import DistanceMatrixService, distance_matrix
+from .geo import order_demand, order_location, parse_timestamp, vehicle_position
+
+KM_PER_DEGREE = 111.195
+
+Area = Tuple[str, int, int]  # (merchant, row, col)
+
+
+@dataclass
+class AreaForecast:
+    merchant_id: str
+    area: Area
+    lat: float  # demand-weighted centre; where vehicles are sent
+    lng: float
+    units: float = 0.0
+    orders: int = 0
+    idle: int = 0
+    target: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "merchant_id": self.merchant_id or None,
+            "lat": round(self.lat, 6),
+            "lng": round(self.lng, 6),
+            "forecast_units": round(self.units, 1),
+            "recent_orders": self.orders,
+            "idle_vehicles": self.idle,
+            "target_vehicles": self.target,
+        }
+
+
+@dataclass
+class RebalanceMove:
+    vehicle_id: str
+    merchant_id: str
+    origin: Tuple[float, float]
+    destination: Tuple[float, float]
+    distance_km: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "vehicle_id": self.vehicle_id,
+            "merchant_id": self.merchant_id or None,
+            "from": {"lat": self.origin[0], "lng": self.origin[1]},
+            "to": {"lat": round(self.destination[0], 6), "lng": round(self.destination[1], 6)},
+            "distance_km": round(self.distance_km, 2),
+        }
+
+
+@dataclass
+class RebalancePlan:
+    moves: List[RebalanceMove] = field(default_factory=list)
+    areas: List[AreaForecast] = field(default_factory=list)
+    idle: int = 0
+    unmet: int = 0  # target slots no idle vehicle could reach
+    seconds: float = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "idle_vehicles": self.idle,
+            "areas": len(self.areas),
+            "moves": len(self.moves),
+            "distance_km": round(sum(move.distance_km for move in self.moves), 2),
+            "unmet_slots": self.unmet,
+            "seconds": round(self.seconds, 4),
+        }
+
+
+def transport(supply: np.ndarray, demand: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """Min-cost flow from ``supply`` rows to ``demand`` columns; ``inf`` cost marks a missing edge.
+
+    Successive shortest paths: each round finds the cheapest path from any row with
+    supply left to any column with demand left in the residual graph (Bellman-Ford,
+    since undoing flow has negative cost) and pushes as much as that path allows.
+    Returns the integer flow per (row, column); unreachable demand stays unmet.
+    """
+    supply, demand = supply.astype(int).copy(), demand.astype(int).copy()
+    rows, columns = cost.shape
+    flow = np.zeros((rows, columns), dtype=int)
+    undo = np.where(np.isfinite(cost), cost, 0.0)  # flow only ever sits on finite edges
+    while supply.any() and demand.any():
+        # dist_row[r]: cheapest way to have a spare unit at row r; dist_col[c]: to deliver one at c.
+        dist_row = np.where(supply > 0, 0.0, np.inf)
+        via_row = np.full(rows, -1)  # column whose flow is undone to reach the row
+        dist_col = np.full(columns, np.inf)
+        via_col = np.full(columns, -1)
+        # Labels only change on strict improvement, so the predecessors never form a cycle.
+        for _ in range(rows + columns + 1):
+            reach = dist_row[:, None] + cost
+            best_row = np.argmin(reach, axis=0)
+            value = reach[best_row, np.arange(columns)]
+            to_column = value < dist_col - 1e-9
+            dist_col = np.where(to_column, value, dist_col)
+            via_col = np.where(to_column, best_row, via_col)
+            back = np.where(flow > 0, dist_col[None, :] - undo, np.inf)
+            best_column = np.argmin(back, axis=1)
+            value = back[np.arange(rows), best_column]
+            to_row = value < dist_row - 1e-9
+            dist_row = np.where(to_row, value, dist_row)
+            via_row = np.where(to_row, best_column, via_row)
+            if not to_column.any() and not to_row.any():
+                break
+        open_columns = np.flatnonzero((demand > 0) & np.isfinite(dist_col))
+        if not len(open_columns):
+            break
+        column = int(open_columns[np.argmin(dist_col[open_columns])])
+        # Walk back to the starting row, noting the bottleneck.
+        path: List[Tuple[int, int, int]] = []  # (row, column, +1 push / -1 undo)
+        row = int(via_col[column])
+        path.append((row, column, 1))
+        while via_row[row] >= 0:
+            previous = int(via_row[row])
+            path.append((row, previous, -1))
+            row = int(via_col[previous])
+            path.append((row, previous, 1))
+        amount = min(supply[row], demand[column], *(flow[r, c] for r, c, sign in path if sign < 0))
+        for r, c, sign in path:
+            flow[r, c] += sign * amount
+        supply[row] -= amount
+        demand[column] -= amount
+    return flow
+
+
+class FleetRebalancer:
+    def __init__(
+        self,
+        cell_km: Optional[float] = None,
+        lookback_hours: Optional[float] = None,
+        half_life_hours: Optional[float] = None,
+        max_km: Optional[float] = None,
+        matrix: Optional[DistanceMatrixService] = None,
+    ):
+        self.cell_deg = (cell_km or settings.ROUTING_REBALANCE_CELL_KM) / KM_PER_DEGREE
+        self.lookback_hours = lookback_hours or settings.ROUTING_REBALANCE_LOOKBACK_HOURS
+        self.half_life_hours = half_life_hours or settings.ROUTING_REBALANCE_HALF_LIFE_HOURS
+        self.max_km = max_km or settings.ROUTING_REBALANCE_MAX_KM
+        self.matrix = matrix or distance_matrix
+        self.runs = 0
+        self.total_moves = 0
+        self.total_km = 0.0
+        self.last_plan: Optional[RebalancePlan] = None
+
+    def _area(self, merchant: str, lat: float, lng: float) -> Area:
+        # Columns shrink with latitude so cells stay roughly square on the ground.
+        lng_deg = self.cell_deg / max(math.cos(math.radians(lat)), 0.01)
+        return merchant, int(math.floor(lat / self.cell_deg)), int(math.floor(lng / lng_deg))
+
+    def since(self, now: Optional[datetime] = None) -> datetime:
+        """Oldest ``created_at`` that still counts toward the forecast."""
+        return (now or datetime.utcnow()) - timedelta(hours=self.lookback_hours)
+
+    def forecast(
+        self, orders: Iterable[Dict[str, Any]], fleet: Sequence[Dict[str, Any]], now: Optional[datetime] = None
+    ) -> Dict[Area, AreaForecast]:
+        """Recency-weighted units per merchant area from ``orders`` created within the lookback."""
+        now = now or datetime.utcnow()
+        since = self.since(now)
+        fleet_merchants = {vehicle.get("merchant_id") for vehicle in fleet if vehicle.get("merchant_id")}
+        sums: Dict[Area, List[float]] = {}
+        for order in orders:
+            created = parse_timestamp(order.get("created_at")) or now
+            if created < since:
+                continue
+            location = order_location(order)  # no depot fallback
+            if location is None:
+                continue
+            merchant = order.get("merchant_id") if order.get("merchant_id") in fleet_merchants else ""
+            weight = order_demand(order) * 0.5 ** (max((now - created).total_seconds(), 0.0) / 3600.0 / self.half_life_hours)
+            entry = sums.setdefault(self._area(merchant, *location), [0.0, 0.0, 0.0, 0])
+            entry[0] += weight
+            entry[1] += weight * location[0]
+            entry[2] += weight * location[1]
+            entry[3] += 1
+        return {
+            area: AreaForecast(area[0], area, lat / units, lng / units, units, int(count))
+            for area, (units, lat, lng, count) in sums.items() if units > 0
+        }
+
+    def plan(
+        self,
+        orders: Iterable[Dict[str, Any]],
+        idle_fleet: Sequence[Dict[str, Any]],
+        fleet: Optional[Sequence[Dict[str, Any]]] = None,
+        now: Optional[datetime] = None,
+    ) -> RebalancePlan:
+        """Moves for ``idle_fleet``; ``fleet`` (default: the idle vehicles) decides which merchants have vehicles."""
+        started = time.perf_counter()
+        vehicles = [(vehicle, vehicle_position(vehicle)) for vehicle in idle_fleet if vehicle.get("id")]
+        vehicles = [(vehicle, position) for vehicle, position in vehicles if position is not None]
+        areas = self.forecast(orders, fleet if fleet is not None else idle_fleet, now)
+        plan = RebalancePlan(areas=sorted(areas.values(), key=lambda area: -area.units), idle=len(vehicles))
+
+        groups: Dict[str, List[Tuple[Dict[str, Any], Tuple[float, float]]]] = {}
+        for vehicle, position in vehicles:
+            groups.setdefault(vehicle.get("merchant_id") or "", []).append((vehicle, position))
+        for merchant, members in groups.items():
+            merchant_areas = [area for area in plan.areas if area.merchant_id == merchant]
+            if merchant_areas:
+                self._plan_group(merchant, members, merchant_areas, plan)
+
+        plan.seconds = time.perf_counter() - started
+        return plan
+
+    def record(self, plan: RebalancePlan) -> None:
+        """Count a plan that was carried out."""
+        self.runs += 1
+        self.total_moves += len(plan.moves)
+        self.total_km += sum(move.distance_km for move in plan.moves)
+        self.last_plan = plan
+
+    def _plan_group(
+        self,
+        merchant: str,
+        members: List[Tuple[Dict[str, Any], Tuple[float, float]]],
+        areas: List[AreaForecast],
+        plan: RebalancePlan,
+    ) -> None:
+        # Targets: idle vehicles shared in proportion to forecast units (largest remainder).
+        units = np.array([area.units for area in areas])
+        share = units / units.sum() * len(members)
+        target = np.floor(share).astype(int)
+        target[np.argsort(-(share - target), kind="stable")[: len(members) - int(target.sum())]] += 1
+        for area, wanted in zip(areas, target.tolist()):
+            area.target = wanted
+
+        # Supply: the vehicles of each cell beyond its target (cells without demand keep none).
+        index_of = {area.area: index for index, area in enumerate(areas)}
+        cells: Dict[Area, List[int]] = {}
+        for row, (_, position) in enumerate(members):
+            cells.setdefault(self._area(merchant, *position), []).append(row)
+        supply_rows: List[List[int]] = []
+        surplus: List[int] = []
+        deficit = target.copy()
+        for cell, rows in cells.items():
+            keep = int(target[index_of[cell]]) if cell in index_of else 0
+            if cell in index_of:
+                areas[index_of[cell]].idle = len(rows)
+                deficit[index_of[cell]] -= min(len(rows), keep)
+            if len(rows) > keep:
+                supply_rows.append(rows)
+                surplus.append(len(rows) - keep)
+        short = np.flatnonzero(deficit > 0)
+        if not supply_rows or not len(short):
+            return
+
+        # Each supply cell's surplus sits at the mean position of its vehicles.
+        lat = np.array([np.mean([members[row][1][0] for row in rows]) for rows in supply_rows])
+        lng = np.array([np.mean([members[row][1][1] for row in rows]) for rows in supply_rows])
+        centre_lat = np.array([areas[index].lat for index in short])
+        centre_lng = np.array([areas[index].lng for index in short])
+        cost = self.matrix.distances(lat, lng, centre_lat, centre_lng)
+        flow = transport(np.array(surplus), deficit[short], np.where(cost <= self.max_km, cost, np.inf))
+
+        # Concrete vehicles: the longest flows pick first, each taking the cell's vehicles nearest its target area.
+        for supply, column in sorted(zip(*np.nonzero(flow)), key=lambda pair: -cost[pair]):
+            rows = supply_rows[supply]
+            area = areas[short[column]]
+            here_lat = np.array([members[row][1][0] for row in rows])
+            here_lng = np.array([members[row][1][1] for row in rows])
+            km = self.matrix.distances([area.lat], [area.lng], here_lat, here_lng)[0]
+            for position in sorted(np.argsort(km)[: int(flow[supply, column])].tolist(), reverse=True):
+                vehicle, origin = members[rows.pop(position)]
+                plan.moves.append(RebalanceMove(vehicle["id"], merchant, origin, (area.lat, area.lng), float(km[position])))
+        plan.unmet += int(deficit[short].sum() - flow.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        last = self.last_plan.stats() if self.last_plan else {}
+        return {
+            "runs": self.runs,
+            "total_moves": self.total_moves,
+            "total_km": round(self.total_km, 2),
+            "last_run": last,
+        }
+
+
+# Global instance
+fleet_rebalancer = FleetRebalancer()
@@ -0,0 +1,414 @@
+"""Incremental re-planning of active routes.
+
+The re-planner keeps the parsed state of every active ``Route`` (its stops and
+centroid), rebuilt only when the stored ``route_points`` change. Each cycle it looks
+for three kinds of events and re-plans just the routes they touch:
+
+* **vehicle issue**: the route's vehicle is in maintenance or otherwise out of service.
+  Its open stops are removed and cheapest-inserted into nearby routes with room; stops
+  no route can take go back to ``pending``.
+* **delay**: an open stop is past its ``estimated_delivery_time``. Late stops move to
+  the front of their own route, in the cheapest order among themselves.
+* **high-priority order**: a new urgent ``pending`` order is cheapest-inserted into the
+  nearest route with room, if the detour stays within ``ROUTING_REPLAN_MAX_DETOUR_KM``.
+
+Insertion costs are only computed for the ``ROUTING_REPLAN_CANDIDATE_ROUTES`` routes
+nearest to the stop, so the work grows with the size of the change, not the fleet.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .distance_matrix import DistanceMatrixService, distance_matrix
+from .geo import merchant_depots, order_demand, order_location, order_priority, parse_timestamp, point_of, vehicle_position
+
+# Fleet statuses that take a vehicle off the road mid-route.
+VEHICLE_ISSUE_STATUSES = {"maintenance", "breakdown", "broken_down", "offline", "out_of_service"}
+# Order statuses whose stops are still to be driven.
+OPEN_ORDER_STATUSES = {"assigned", "in_transit", "rerouted"}
+
+
+@dataclass
+class RouteState:
+    route_id: str
+    vehicle_id: str
+    stored: Any  # ``route_points`` as last read or written, to spot outside edits
+    depot: Optional[Dict[str, Any]]
+    stops: List[Dict[str, Any]]  # route points that carry an order_id
+    centroid: Tuple[float, float] = (0.0, 0.0)
+
+    def __post_init__(self) -> None:
+        self.refresh()
+
+    def refresh(self) -> None:
+        located = [point_of(stop) for stop in self.stops] + [point_of(self.depot)]
+        located = [point for point in located if point is not None]
+        if located:
+            self.centroid = (sum(lat for lat, _ in located) / len(located), sum(lng for _, lng in located) / len(located))
+
+    def open_stops(self, open_orders: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [stop for stop in self.stops if stop.get("order_id") in open_orders]
+
+    def route_points(self, open_orders: Dict[str, Dict[str, Any]], sequence: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Depot, then stops already served (in their old order), then the new open sequence."""
+        served = [stop for stop in self.stops if stop.get("order_id") not in open_orders]
+        return ([self.depot] if self.depot else []) + served + sequence
+
+
+@dataclass
+class RouteEvent:
+    kind: str  # "vehicle_issue" | "delay" | "high_priority_order"
+    route_id: Optional[str] = None
+    order_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RouteChange:
+    route_id: str
+    vehicle_id: str
+    reason: str
+    route_points: List[Dict[str, Any]]
+    status: str = "active"
+
+    def as_update(self) -> Dict[str, Any]:
+        return {
+            "route_id": self.route_id,
+            "vehicle_id": self.vehicle_id,
+            "recommended_action": "reroute",
+            "reason": self.reason,
+            "route_status": self.status,
+            "route_sequence": [point["order_id"] for point in self.route_points if point.get("order_id")],
+        }
+
+
+@dataclass
+class ReplanResult:
+    events: List[RouteEvent] = field(default_factory=list)
+    changes: Dict[str, RouteChange] = field(default_factory=dict)  # route id -> final change
+    order_updates: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # order id -> column updates
+    released: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": len(self.events),
+            "routes_replanned": len(self.changes),
+            "orders_moved": sum(1 for update in self.order_updates.values() if update.get("vehicle_id")),
+            "orders_released": len(self.released),
+            "seconds": round(self.seconds, 4),
+        }
+
+
+class IncrementalReplanner:
+    def __init__(
+        self,
+        matrix: Optional[DistanceMatrixService] = None,
+        max_detour_km: Optional[float] = None,
+        candidate_routes: Optional[int] = None,
+    ):
+        self.matrix = matrix or distance_matrix
+        self.max_detour_km = max_detour_km or settings.ROUTING_REPLAN_MAX_DETOUR_KM
+        self.candidate_routes = candidate_routes or settings.ROUTING_REPLAN_CANDIDATE_ROUTES
+        self._routes: Dict[str, RouteState] = {}
+        self._route_of_vehicle: Dict[str, str] = {}
+        self._route_of_order: Dict[str, str] = {}
+        # Route centroids in fixed slots, updated in place; free slots hold NaN.
+        self._slots: Dict[str, int] = {}
+        self._slot_ids: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+        self._centroids = np.full((0, 2), np.nan)
+        # Events already acted on, so a late stop or a stranded order is not re-planned every cycle.
+        self._expedited: Set[str] = set()
+        self._offered: Set[str] = set()
+        self._due: Dict[str, Tuple[Any, Optional[datetime]]] = {}
+        self.routes_rebuilt = 0
+        self.replans = 0
+        self.replan_seconds = 0.0
+
+    # --- state -----------------------------------------------------------------
+
+    def sync(self, routes: Iterable[Dict[str, Any]]) -> int:
+        """Track the active routes; only routes whose stored points changed are re-parsed."""
+        seen = set()
+        rebuilt = 0
+        for route in routes:
+            route_id = route.get("id")
+            if not route_id or (route.get("status") or "active") != "active":
+                continue
+            seen.add(route_id)
+            current = self._routes.get(route_id)
+            # Structural comparison of the stored JSON; far cheaper than hashing its text.
+            if current is not None and current.vehicle_id == route.get("vehicle_id") and current.stored == route.get("route_points"):
+                continue
+            points = (route.get("route_points") or {}).get("points") or []
+            depot = next((point for point in points if not point.get("order_id")), None)
+            self._track(RouteState(
+                route_id, route.get("vehicle_id"), route.get("route_points"), depot,
+                [dict(point) for point in points if point.get("order_id")],
+            ))
+            rebuilt += 1
+        for route_id in [route_id for route_id in self._routes if route_id not in seen]:
+            self._untrack(route_id)
+        self.routes_rebuilt += rebuilt
+        return rebuilt
+
+    def _track(self, state: RouteState) -> None:
+        self._untrack(state.route_id)
+        self._routes[state.route_id] = state
+        self._route_of_vehicle[state.vehicle_id] = state.route_id
+        for stop in state.stops:
+            self._route_of_order[stop["order_id"]] = state.route_id
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_ids[slot] = state.route_id
+        else:
+            slot = len(self._slot_ids)
+            self._slot_ids.append(state.route_id)
+            if slot >= len(self._centroids):
+                grown = np.full((max(16, 2 * len(self._centroids)), 2), np.nan)
+                grown[: len(self._centroids)] = self._centroids
+                self._centroids = grown
+        self._slots[state.route_id] = slot
+        self._centroids[slot] = state.centroid
+
+    def _untrack(self, route_id: str) -> None:
+        state = self._routes.pop(route_id, None)
+        if state is None:
+            return
+        if self._route_of_vehicle.get(state.vehicle_id) == route_id:
+            del self._route_of_vehicle[state.vehicle_id]
+        for stop in state.stops:
+            if self._route_of_order.get(stop["order_id"]) == route_id:
+                del self._route_of_order[stop["order_id"]]
+        slot = self._slots.pop(route_id)
+        self._centroids[slot] = np.nan
+        self._slot_ids[slot] = None
+        self._free_slots.append(slot)
+
+    # --- events ----------------------------------------------------------------
+
+    def detect(
+        self,
+        fleet: Iterable[Dict[str, Any]],
+        open_orders: Dict[str, Dict[str, Any]],
+        pending_orders: Iterable[Dict[str, Any]],
+        now: Optional[datetime] = None,
+    ) -> List[RouteEvent]:
+        now = now or datetime.utcnow()
+        pending_orders = list(pending_orders)
+        self._expedited &= open_orders.keys()
+        if len(self._due) > 2 * len(open_orders):
+            self._due = {order_id: due for order_id, due in self._due.items() if order_id in open_orders}
+        self._offered &= {order.get("id") for order in pending_orders}
+        events: List[RouteEvent] = []
+        for vehicle in fleet:
+            route_id = self._route_of_vehicle.get(vehicle.get("id"))
+            if route_id and (vehicle.get("status") or "") in VEHICLE_ISSUE_STATUSES:
+                stops = self._routes[route_id].open_stops(open_orders)
+                if stops:
+                    events.append(RouteEvent("vehicle_issue", route_id, [stop["order_id"] for stop in stops]))
+        late: Dict[str, List[str]] = {}
+        for order_id, order in open_orders.items():
+            route_id = self._route_of_order.get(order_id)
+            due = self._due_time(order_id, order.get("estimated_delivery_time")) if route_id else None
+            if route_id and order_id not in self._expedited and due is not None and due < now:
+                late.setdefault(route_id, []).append(order_id)
+        events.extend(RouteEvent("delay", route_id, order_ids) for route_id, order_ids in late.items())
+        urgent = [
+            order["id"] for order in pending_orders
+            if order.get("id") and order["id"] not in self._offered and order_priority(order) == 0
+        ]
+        if urgent:
+            events.append(RouteEvent("high_priority_order", None, urgent))
+        return events
+
+    def _due_time(self, order_id: str, raw: Any) -> Optional[datetime]:
+        cached = self._due.get(order_id)
+        if cached is None or cached[0] != raw:
+            cached = self._due[order_id] = (raw, parse_timestamp(raw))
+        return cached[1]
+
+    def acknowledge(self, events: Iterable[RouteEvent]) -> None:
+        """Mark delays and urgent orders as handled elsewhere (e.g. by the LLM) so they are not raised again."""
+        for event in events:
+            if event.kind == "delay":
+                self._expedited.update(event.order_ids)
+            elif event.kind == "high_priority_order":
+                self._offered.update(event.order_ids)
+
+    # --- re-planning -----------------------------------------------------------
+
+    def replan(
+        self,
+        events: List[RouteEvent],
+        fleet: Iterable[Dict[str, Any]],
+        open_orders: Dict[str, Dict[str, Any]],
+        pending_orders: Iterable[Dict[str, Any]],
+    ) -> ReplanResult:
+        started = time.perf_counter()
+        result = ReplanResult(events=events)
+        if not events:
+            return result
+        vehicles = {vehicle.get("id"): vehicle for vehicle in fleet}
+        orders = dict(open_orders)
+        orders.update({order["id"]: order for order in pending_orders if order.get("id")})
+        # Open sequences of the routes touched so far this round.
+        sequences: Dict[str, List[Dict[str, Any]]] = {}
+        broken = {event.route_id for event in events if event.kind == "vehicle_issue"}
+        depots: Optional[Dict[str, Tuple[float, float]]] = None
+
+        def sequence_of(route_id: str) -> List[Dict[str, Any]]:
+            if route_id not in sequences:
+                sequences[route_id] = self._routes[route_id].open_stops(open_orders)
+            return sequences[route_id]
+
+        def touch(route_id: str, reason: str) -> None:
+            state = self._routes[route_id]
+            result.changes[route_id] = RouteChange(route_id, state.vehicle_id, reason, [])
+
+        for event in sorted(events, key=lambda event: ("vehicle_issue", "delay", "high_priority_order").index(event.kind)):
+            if event.kind == "vehicle_issue":
+                stops = sequence_of(event.route_id)
+                sequences[event.route_id] = []
+                touch(event.route_id, "vehicle_issue")
+                result.changes[event.route_id].status = "cancelled"
+                for stop in sorted(stops, key=lambda stop: self._stop_rank(orders.get(stop["order_id"], {}))):
+                    target = self._insert(stop, orders.get(stop["order_id"], {}), vehicles, orders, open_orders,
+                                          sequence_of, exclude=broken, max_detour=None)
+                    if target is None:
+                        result.released.append(stop["order_id"])
+                        result.order_updates[stop["order_id"]] = {"status": "pending", "vehicle_id": None}
+                    else:
+                        touch(target, "vehicle_issue")
+                        result.order_updates[stop["order_id"]] = {"vehicle_id": self._routes[target].vehicle_id}
+            elif event.kind == "delay":
+                if event.route_id in broken:
+                    continue
+                late = set(event.order_ids)
+                sequence = sequence_of(event.route_id)
+                start = self._start(event.route_id, vehicles)
+                front: List[Dict[str, Any]] = []
+                for stop in sorted((stop for stop in sequence if stop["order_id"] in late),
+                                   key=lambda stop: self._stop_rank(orders.get(stop["order_id"], {}))):
+                    position, _ = self._cheapest_position(start, front, stop)
+                    front.insert(position, stop)
+                sequences[event.route_id] = front + [stop for stop in sequence if stop["order_id"] not in late]
+                self._expedited.update(late)
+                touch(event.route_id, "delay")
+            else:
+                for order_id in event.order_ids:
+                    self._offered.add(order_id)
+                    location = order_location(orders[order_id])
+                    if location is None and orders[order_id].get("merchant_id"):
+                        # Only orders without their own coordinates fall back to the merchant depot.
+                        if depots is None:
+                            depots = merchant_depots(vehicles.values())
+                        location = depots.get(orders[order_id]["merchant_id"])
+                    if location is None:
+                        continue
+                    stop = {"lat": location[0], "lng": location[1], "address": order_id, "order_id": order_id}
+                    target = self._insert(stop, orders[order_id], vehicles, orders, open_orders, sequence_of,
+                                          exclude=broken, max_detour=self.max_detour_km)
+                    if target is not None:
+                        touch(target, "high_priority_order")
+                        result.order_updates[order_id] = {"status": "assigned", "vehicle_id": self._routes[target].vehicle_id}
+
+        for route_id, change in result.changes.items():
+            state = self._routes[route_id]
+            change.route_points = state.route_points(open_orders, sequences.get(route_id, []))
+            # Keep the tracked state in step with what is about to be written.
+            if change.status == "active":
+                self._track(RouteState(
+                    route_id, state.vehicle_id, {"points": change.route_points}, state.depot,
+                    [dict(point) for point in change.route_points if point.get("order_id")],
+                ))
+            else:
+                self._untrack(route_id)
+        result.seconds = time.perf_counter() - started
+        self.replans += 1
+        self.replan_seconds += result.seconds
+        return result
+
+    @staticmethod
+    def _stop_rank(order: Dict[str, Any]) -> Tuple[int, int]:
+        return order_priority(order), -order_demand(order)
+
+    def _start(self, route_id: str, vehicles: Dict[str, Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+        state = self._routes[route_id]
+        return vehicle_position(vehicles.get(state.vehicle_id) or {}) or point_of(state.depot)
+
+    def _cheapest_position(
+        self, start: Optional[Tuple[float, float]], sequence: List[Dict[str, Any]], stop: Dict[str, Any]
+    ) -> Tuple[int, float]:
+        """Index in ``sequence`` to insert ``stop`` at and the added km (routes are open-ended)."""
+        points = ([start] if start else []) + [point_of(point) for point in sequence]
+        if not points:
+            return 0, 0.0
+        lat = np.array([point[0] for point in points])
+        lng = np.array([point[1] for point in points])
+        to_stop = self.matrix.pair_distances(lat, lng, stop["lat"], stop["lng"])
+        costs = np.append(to_stop[:-1] + to_stop[1:] - self.matrix.pair_distances(lat[:-1], lng[:-1], lat[1:], lng[1:]), to_stop[-1])
+        if not start:
+            # Without a known start the stop may also open the route.
+            costs = np.insert(costs, 0, to_stop[0])
+        best = int(np.argmin(costs))
+        return best, float(costs[best])
+
+    def _nearest_routes(self, lat: float, lng: float, exclude: Set[str]) -> List[str]:
+        used = len(self._slot_ids)
+        if not used:
+            return []
+        distances = self.matrix.pair_distances(self._centroids[:used, 0], self._centroids[:used, 1], lat, lng)
+        distances = np.where(np.isnan(distances), np.inf, distances)
+        take = min(used, self.candidate_routes + len(exclude))
+        nearest = np.argpartition(distances, take - 1)[:take]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [
+            self._slot_ids[slot] for slot in nearest
+            if np.isfinite(distances[slot]) and self._slot_ids[slot] not in exclude
+        ][: self.candidate_routes]
+
+    def _insert(self, stop, order, vehicles, orders, open_orders, sequence_of, exclude, max_detour) -> Optional[str]:
+        """Cheapest-insert ``stop`` into a nearby route with room; returns the route id or None."""
+        if point_of(stop) is None:
+            return None
+        demand = order_demand(order)
+        merchant = order.get("merchant_id")
+        best: Optional[Tuple[float, str, int]] = None
+        for route_id in self._nearest_routes(stop["lat"], stop["lng"], exclude):
+            vehicle = vehicles.get(self._routes[route_id].vehicle_id) or {}
+            if (vehicle.get("status") or "") in VEHICLE_ISSUE_STATUSES:
+                continue
+            if merchant and vehicle.get("merchant_id") and vehicle["merchant_id"] != merchant:
+                continue
+            sequence = sequence_of(route_id)
+            load = sum(order_demand(orders.get(point["order_id"], {})) for point in sequence)
+            if load + demand > int(vehicle.get("capacity") or 0):
+                continue
+            position, cost = self._cheapest_position(self._start(route_id, vehicles), sequence, stop)
+            if (max_detour is None or cost <= max_detour) and (best is None or cost < best[0]):
+                best = (cost, route_id, position)
+        if best is None:
+            return None
+        _, route_id, position = best
+        sequence_of(route_id).insert(position, stop)
+        return route_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routes_tracked": len(self._routes),
+            "routes_rebuilt": self.routes_rebuilt,
+            "replans": self.replans,
+            "avg_replan_ms": round(self.replan_seconds / self.replans * 1000, 3) if self.replans else 0.0,
+        }
+
+
+# Global instance
+incremental_replanner = IncrementalReplanner()
@@ -0,0 +1,50 @@
+"""Conflict accounting for transactional route and vehicle-assignment commits.
+
+The routing agent writes each batch of decisions in one transaction
+(``LocalSupabaseClient.transaction``). Vehicles are claimed with a conditional update
+(``status = 'available'``) and orders with ``status = 'pending'``; a claim that matches
+no row is a conflict: another cycle booked the vehicle or took the order first, or the
+LLM named a vehicle that is not available at all. Conflicting assignments are re-solved
+once in bulk by the local engines, or rejected so the orders wait for the next cycle.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict
+
+COMMIT_KINDS = ("routes", "vehicle_assignments")
+
+
+class CommitStats:
+    def __init__(self) -> None:
+        self.attempted = dict.fromkeys(COMMIT_KINDS, 0)
+        self.committed = dict.fromkeys(COMMIT_KINDS, 0)
+        self.vehicle_conflicts = dict.fromkeys(COMMIT_KINDS, 0)
+        self.order_conflicts = dict.fromkeys(COMMIT_KINDS, 0)
+        # Orders of conflicting assignments that a re-solve committed, or that were left pending.
+        self.orders_resolved = dict.fromkeys(COMMIT_KINDS, 0)
+        self.orders_rejected = dict.fromkeys(COMMIT_KINDS, 0)
+
+    def record(self, kind: str, attempted: int, committed: int, vehicle_conflicts: int, order_conflicts: int) -> None:
+        self.attempted[kind] += attempted
+        self.committed[kind] += committed
+        self.vehicle_conflicts[kind] += vehicle_conflicts
+        self.order_conflicts[kind] += order_conflicts
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            kind: {
+                "attempted": self.attempted[kind],
+                "committed": self.committed[kind],
+                "vehicle_conflicts": self.vehicle_conflicts[kind],
+                "order_conflicts": self.order_conflicts[kind],
+                "conflict_rate": round(self.vehicle_conflicts[kind] / self.attempted[kind], 4) if self.attempted[kind] else 0.0,
+                "orders_resolved": self.orders_resolved[kind],
+                "orders_rejected": self.orders_rejected[kind],
+            }
+            for kind in COMMIT_KINDS
+        }
+
+
+# Global instance
+commit_stats = CommitStats()
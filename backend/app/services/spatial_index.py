@@ -0,0 +1,212 @@
+"""In-memory grid index over the positions of available vehicles.
+
+Vehicles are bucketed into square lat/lng cells of about ``ROUTING_INDEX_CELL_KM``.
+A k-nearest query scans rings of cells around the query point and stops as soon as
+the k-th best feasible vehicle is closer than anything the next ring could hold; when
+the rings would cover more cells than are occupied (sparse, spread-out fleets) it
+falls back to one vectorized pass over every indexed vehicle.
+
+The index only holds vehicles whose status is ``available``: ``sync`` refreshes it
+from fleet rows, ``upsert`` and ``remove`` apply single status or location changes.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .distance_matrix import DistanceMatrixService, distance_matrix
+from .geo import haversine_matrix, vehicle_position
+
+KM_PER_DEGREE = 111.195
+Cell = Tuple[int, int]
+
+
+@dataclass
+class IndexedVehicle:
+    id: str
+    lat: float
+    lng: float
+    capacity: int
+    vehicle_type: str
+    cell: Cell
+
+
+class FleetIndex:
+    def __init__(self, cell_km: Optional[float] = None, matrix: Optional[DistanceMatrixService] = None):
+        self.cell_deg = (cell_km or settings.ROUTING_INDEX_CELL_KM) / KM_PER_DEGREE
+        self.matrix = matrix or distance_matrix
+        self._vehicles: Dict[str, IndexedVehicle] = {}
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._arrays: Optional[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.queries = 0
+        self.full_scans = 0
+        self.query_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._vehicles)
+
+    def __contains__(self, vehicle_id: str) -> bool:
+        return vehicle_id in self._vehicles
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def upsert(self, row: Dict[str, Any]) -> bool:
+        """Index (or re-index) one fleet row; rows that are not available or not located are dropped."""
+        vehicle_id = row.get("id")
+        if not vehicle_id:
+            return False
+        position = vehicle_position(row)
+        if position is None or (row.get("status") or "available") != "available":
+            self.remove(vehicle_id)
+            return False
+        capacity = int(row.get("capacity") or 0)
+        vehicle_type = row.get("vehicle_type") or ""
+        cell = self._cell(*position)
+        with self._lock:
+            current = self._vehicles.get(vehicle_id)
+            if current is not None and (current.lat, current.lng, current.capacity, current.vehicle_type) == (
+                position[0], position[1], capacity, vehicle_type
+            ):
+                return True
+            if current is not None and current.cell != cell:
+                self._discard(current)
+            self._vehicles[vehicle_id] = IndexedVehicle(vehicle_id, position[0], position[1], capacity, vehicle_type, cell)
+            self._cells.setdefault(cell, set()).add(vehicle_id)
+            self._arrays = None
+            self.updates += 1
+        return True
+
+    def remove(self, vehicle_id: str) -> None:
+        with self._lock:
+            current = self._vehicles.pop(vehicle_id, None)
+            if current is not None:
+                self._discard(current)
+                self._arrays = None
+                self.updates += 1
+
+    def _discard(self, vehicle: IndexedVehicle) -> None:
+        members = self._cells.get(vehicle.cell)
+        if members is not None:
+            members.discard(vehicle.id)
+            if not members:
+                del self._cells[vehicle.cell]
+
+    def sync(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Make the index match ``rows``; vehicles missing from them are removed."""
+        seen = set()
+        for row in rows:
+            if self.upsert(row):
+                seen.add(row["id"])
+        for vehicle_id in [vehicle_id for vehicle_id in self._vehicles if vehicle_id not in seen]:
+            self.remove(vehicle_id)
+
+    def _feasible(
+        self,
+        vehicle: IndexedVehicle,
+        min_capacity: int,
+        vehicle_types: Optional[Collection[str]],
+        exclude: Optional[Collection[str]],
+    ) -> bool:
+        return (
+            vehicle.capacity >= min_capacity
+            and (not vehicle_types or vehicle.vehicle_type in vehicle_types)
+            and (not exclude or vehicle.id not in exclude)
+        )
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: Optional[int] = None,
+        min_capacity: int = 0,
+        vehicle_types: Optional[Collection[str]] = None,
+        exclude: Optional[Collection[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Up to ``k`` feasible vehicles as ``(vehicle_id, road_km)``, closest first."""
+        started = time.perf_counter()
+        k = k or settings.ROUTING_CANDIDATE_VEHICLES
+        with self._lock:
+            if len(self._cells) <= 9:
+                found = self._scan_all(lat, lng, min_capacity, vehicle_types, exclude)
+            else:
+                found = self._scan_rings(lat, lng, k, min_capacity, vehicle_types, exclude)
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+        found.sort(key=lambda pair: pair[1])
+        return [(vehicle_id, km * self.matrix.road_factor) for vehicle_id, km in found[:k]]
+
+    def _scan_rings(self, lat, lng, k, min_capacity, vehicle_types, exclude) -> List[Tuple[str, float]]:
+        cy, cx = self._cell(lat, lng)
+        found: List[Tuple[str, float]] = []
+        scanned = 0
+        radius = 0
+        while True:
+            ring = [(cy + dy, cx + dx) for dy in (-radius, radius) for dx in range(-radius, radius + 1)] if radius else [(cy, cx)]
+            ring += [(cy + dy, cx + dx) for dx in (-radius, radius) for dy in range(-radius + 1, radius)] if radius else []
+            scanned += len(ring)
+            # Rings now cost more than scanning every occupied cell: finish with one full pass.
+            if scanned > 4 * len(self._cells):
+                return self._scan_all(lat, lng, min_capacity, vehicle_types, exclude)
+            candidates = [
+                self._vehicles[vehicle_id]
+                for cell in ring
+                for vehicle_id in self._cells.get(cell, ())
+                if self._feasible(self._vehicles[vehicle_id], min_capacity, vehicle_types, exclude)
+            ]
+            if candidates:
+                distances = haversine_matrix(
+                    [lat], [lng], [vehicle.lat for vehicle in candidates], [vehicle.lng for vehicle in candidates]
+                )[0]
+                found.extend(zip((vehicle.id for vehicle in candidates), distances.tolist()))
+            if len(found) >= k:
+                kth = sorted(distance for _, distance in found)[k - 1]
+                # Anything in the next ring is at least ``radius`` cells away along one axis.
+                widest_lat = min(abs(lat) + (radius + 2) * self.cell_deg, 89.9)
+                if kth <= radius * self.cell_deg * KM_PER_DEGREE * math.cos(math.radians(widest_lat)):
+                    return found
+            radius += 1
+
+    def _scan_all(self, lat, lng, min_capacity, vehicle_types, exclude) -> List[Tuple[str, float]]:
+        if self._arrays is None:
+            vehicles = list(self._vehicles.values())
+            self._arrays = (
+                [vehicle.id for vehicle in vehicles],
+                np.array([vehicle.lat for vehicle in vehicles], dtype=float),
+                np.array([vehicle.lng for vehicle in vehicles], dtype=float),
+                np.array([vehicle.capacity for vehicle in vehicles], dtype=int),
+            )
+        ids, lats, lngs, capacities = self._arrays
+        self.full_scans += 1
+        if not ids:
+            return []
+        mask = capacities >= min_capacity
+        if vehicle_types or exclude:
+            mask &= np.array([self._feasible(self._vehicles[vehicle_id], 0, vehicle_types, exclude) for vehicle_id in ids])
+        rows = np.flatnonzero(mask)
+        distances = haversine_matrix([lat], [lng], lats[rows], lngs[rows])[0]
+        return [(ids[row], distance) for row, distance in zip(rows.tolist(), distances.tolist())]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "vehicles": len(self._vehicles),
+                "cells": len(self._cells),
+                "updates": self.updates,
+                "queries": self.queries,
+                "full_scans": self.full_scans,
+                "avg_query_ms": round(self.query_seconds / self.queries * 1000, 4) if self.queries else 0.0,
+            }
+
+
+# Global instance
+fleet_index = FleetIndex()
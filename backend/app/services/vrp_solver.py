@@ -0,0 +1,447 @@
+"""Capacitated vehicle routing: Clarke-Wright savings, then 2-opt / Or-opt per route.
+
+Vehicles are grouped into depots by position and every stop is routed from its
+nearest depot. Within a depot, routes are built by the savings heuristic (limited to
+each stop's nearest neighbours so large instances stay near-linear), matched to
+vehicles by capacity, and improved with 2-opt and Or-opt moves. Stops are always
+visited in priority order (high before medium before low); moves that would break
+that order are never applied.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .distance_matrix import DistanceMatrixService, distance_matrix
+from .geo import haversine_matrix, merchant_depots, order_demand, order_location, order_priority, vehicle_position
+
+# Rows of the stop-to-stop matrix computed at once when searching neighbours.
+_CHUNK_ROWS = 512
+_EPSILON = 1e-9
+
+
+@dataclass
+class Stop:
+    id: str
+    lat: float
+    lng: float
+    demand: int = 1
+    priority: int = 1  # geo.PRIORITY_RANKS: lower is served first
+    label: str = ""
+
+
+@dataclass
+class Vehicle:
+    id: str
+    lat: float
+    lng: float
+    capacity: int
+    vehicle_type: str = ""
+
+
+@dataclass
+class PlannedRoute:
+    vehicle: Vehicle
+    stops: List[Stop]
+    distance_km: float
+    duration_min: float
+    baseline_km: float  # one out-and-back trip per stop
+
+    @property
+    def load(self) -> int:
+        return sum(stop.demand for stop in self.stops)
+
+    def route_points(self, depot: Tuple[float, float]) -> List[Dict[str, Any]]:
+        points = [{"lat": depot[0], "lng": depot[1], "address": "Depot"}]
+        points.extend(
+            {"lat": stop.lat, "lng": stop.lng, "address": stop.label or stop.id, "order_id": stop.id}
+            for stop in self.stops
+        )
+        return points
+
+    def as_assignment(self) -> Dict[str, Any]:
+        """Shape of the ``route_assignments`` entries ``create_route_assignments`` expects."""
+        score = 1.0 - self.distance_km / self.baseline_km if self.baseline_km > 0 else 0.0
+        order_ids = [stop.id for stop in self.stops]
+        return {
+            "vehicle_id": self.vehicle.id,
+            "vehicle_type": self.vehicle.vehicle_type,
+            "assigned_orders": order_ids,
+            "route_sequence": order_ids,
+            "estimated_duration": int(round(self.duration_min)),
+            "estimated_distance": round(self.distance_km, 2),
+            "optimization_score": round(max(score, 0.0), 3),
+            "reasoning": (
+                f"Savings route with 2-opt/Or-opt: {len(self.stops)} stops, load {self.load}/"
+                f"{self.vehicle.capacity}, {self.distance_km:.1f} km vs {self.baseline_km:.1f} km "
+                "for individual trips."
+            ),
+            "route_points": self.route_points((self.vehicle.lat, self.vehicle.lng)),
+        }
+
+
+@dataclass
+class VRPSolution:
+    routes: List[PlannedRoute] = field(default_factory=list)
+    unassigned: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routes": len(self.routes),
+            "stops_routed": sum(len(route.stops) for route in self.routes),
+            "unassigned": len(self.unassigned),
+            "distance_km": round(sum(route.distance_km for route in self.routes), 2),
+            "baseline_km": round(sum(route.baseline_km for route in self.routes), 2),
+            "seconds": round(self.seconds, 4),
+        }
+
+
+class VRPSolver:
+    def __init__(
+        self,
+        neighbours: Optional[int] = None,
+        matrix: Optional[DistanceMatrixService] = None,
+        service_minutes: Optional[float] = None,
+        depot_radius_km: Optional[float] = None,
+    ):
+        self.neighbours = neighbours or settings.ROUTING_SAVINGS_NEIGHBOURS
+        self.matrix = matrix or distance_matrix
+        self.service_minutes = service_minutes if service_minutes is not None else settings.ROUTING_SERVICE_MINUTES
+        self.depot_radius_km = depot_radius_km or settings.ROUTING_DEPOT_RADIUS_KM
+
+    def solve(self, stops: Sequence[Stop], vehicles: Sequence[Vehicle]) -> VRPSolution:
+        started = time.perf_counter()
+        solution = VRPSolution()
+        vehicles = [vehicle for vehicle in vehicles if vehicle.capacity > 0]
+        if not stops or not vehicles:
+            solution.unassigned = [stop.id for stop in stops]
+            return solution
+
+        depots = self._group_depots(vehicles)
+        nearest = np.argmin(
+            haversine_matrix(
+                [stop.lat for stop in stops], [stop.lng for stop in stops],
+                [depot[0] for depot in depots], [depot[1] for depot in depots],
+            ),
+            axis=1,
+        )
+        spare: List[List[Vehicle]] = []
+        for index, (lat, lng, group) in enumerate(depots):
+            members = [stops[i] for i in np.flatnonzero(nearest == index)]
+            routes, unassigned = self._solve_depot((lat, lng), members, group)
+            solution.routes.extend(routes)
+            solution.unassigned.extend(unassigned)
+            used = {route.vehicle.id for route in routes}
+            spare.append([vehicle for vehicle in group if vehicle.id not in used])
+
+        # Stops a depot could not fit overflow to the nearest depots that still have vehicles.
+        if solution.unassigned and any(spare):
+            by_id = {stop.id: stop for stop in stops}
+            leftover = [by_id[stop_id] for stop_id in solution.unassigned]
+            distance = haversine_matrix(
+                [np.mean([stop.lat for stop in leftover])], [np.mean([stop.lng for stop in leftover])],
+                [depot[0] for depot in depots], [depot[1] for depot in depots],
+            )[0]
+            for index in np.argsort(distance):
+                if not leftover:
+                    break
+                if spare[index]:
+                    routes, unassigned = self._solve_depot(depots[index][:2], leftover, spare[index])
+                    solution.routes.extend(routes)
+                    leftover = [by_id[stop_id] for stop_id in unassigned]
+            solution.unassigned = [stop.id for stop in leftover]
+        solution.seconds = time.perf_counter() - started
+        return solution
+
+    def _group_depots(self, vehicles: Sequence[Vehicle]) -> List[Tuple[float, float, List[Vehicle]]]:
+        """Vehicles parked within ``depot_radius_km`` of each other share a depot."""
+        depots: List[List[Any]] = []
+        for vehicle in vehicles:
+            for depot in depots:
+                if haversine_matrix([depot[0]], [depot[1]], [vehicle.lat], [vehicle.lng])[0, 0] <= self.depot_radius_km:
+                    depot[2].append(vehicle)
+                    count = len(depot[2])
+                    depot[0] += (vehicle.lat - depot[0]) / count
+                    depot[1] += (vehicle.lng - depot[1]) / count
+                    break
+            else:
+                depots.append([vehicle.lat, vehicle.lng, [vehicle]])
+        return [(lat, lng, group) for lat, lng, group in depots]
+
+    def _savings(self, lat: np.ndarray, lng: np.ndarray, to_depot: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Positive savings pairs ``(i, j)`` among each stop's nearest neighbours, best first."""
+        n = len(lat)
+        k = min(self.neighbours, n - 1)
+        if k <= 0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        firsts, seconds, values = [], [], []
+        for start in range(0, n, _CHUNK_ROWS):
+            rows = np.arange(start, min(start + _CHUNK_ROWS, n))
+            block = self.matrix.distances(lat[rows], lng[rows], lat, lng)
+            block[np.arange(len(rows)), rows] = np.inf
+            neighbours = np.argpartition(block, k - 1, axis=1)[:, :k]
+            pair_distance = np.take_along_axis(block, neighbours, axis=1)
+            saving = to_depot[rows][:, None] + to_depot[neighbours] - pair_distance
+            keep = saving > _EPSILON
+            i = np.broadcast_to(rows[:, None], neighbours.shape)[keep]
+            j = neighbours[keep]
+            firsts.append(np.minimum(i, j))
+            seconds.append(np.maximum(i, j))
+            values.append(saving[keep])
+        first, second, value = np.concatenate(firsts), np.concatenate(seconds), np.concatenate(values)
+        _, unique = np.unique(first * n + second, return_index=True)
+        order = unique[np.argsort(-value[unique], kind="stable")]
+        return first[order], second[order]
+
+    def _clarke_wright(
+        self, stops: Sequence[Stop], to_depot: np.ndarray, capacity: int
+    ) -> List[List[int]]:
+        n = len(stops)
+        lat = np.array([stop.lat for stop in stops])
+        lng = np.array([stop.lng for stop in stops])
+        priority = [stop.priority for stop in stops]
+        routes: Dict[int, List[int]] = {i: [i] for i in range(n)}
+        route_of = list(range(n))
+        load = {i: stops[i].demand for i in range(n)}
+
+        def oriented(route: List[int], node: int, at_end: bool) -> Optional[List[int]]:
+            if (route[-1] if at_end else route[0]) == node:
+                return route
+            # Reversing is only allowed when it keeps the priority order (uniform route).
+            if priority[route[0]] == priority[route[-1]]:
+                return route[::-1]
+            return None
+
+        for i, j in zip(*self._savings(lat, lng, to_depot)):
+            ri, rj = route_of[i], route_of[j]
+            if ri == rj or load[ri] + load[rj] > capacity:
+                continue
+            a, b = routes[ri], routes[rj]
+            if i not in (a[0], a[-1]) or j not in (b[0], b[-1]):
+                continue
+            merged = None
+            for first, last, x, y in ((a, b, i, j), (b, a, j, i)):
+                head, tail = oriented(first, x, True), oriented(last, y, False)
+                if head is not None and tail is not None and priority[head[-1]] <= priority[tail[0]]:
+                    merged = head + tail
+                    break
+            if merged is None:
+                continue
+            keep, drop = (ri, rj) if len(a) >= len(b) else (rj, ri)
+            for node in routes[drop]:
+                route_of[node] = keep
+            routes[keep] = merged
+            load[keep] += load.pop(drop)
+            del routes[drop]
+        return list(routes.values())
+
+    def _improve(self, distance: np.ndarray, priority: np.ndarray) -> np.ndarray:
+        """2-opt and Or-opt on a closed tour; node 0 is the depot and starts/ends the tour.
+
+        Returns the tour as positions ``[0, ..., 0]``.
+        """
+        m = len(distance) - 1
+        tour = np.concatenate([[0], np.arange(1, m + 1), [0]])
+        if m < 3:
+            return tour
+        node_priority = np.concatenate([[-1], priority[1:]])
+        for _ in range(20 * m):
+            if not (self._two_opt(tour, distance, node_priority) or self._or_opt(tour, distance, node_priority, m)):
+                break
+        return tour
+
+    @staticmethod
+    def _two_opt(tour: np.ndarray, distance: np.ndarray, priority: np.ndarray) -> bool:
+        m = len(tour) - 2
+        prev, cur, nxt = tour[:m], tour[1 : m + 1], tour[2:]
+        delta = (
+            distance[prev[:, None], cur[None, :]]
+            + distance[cur[:, None], nxt[None, :]]
+            - distance[prev, cur][:, None]
+            - distance[cur, nxt][None, :]
+        )
+        valid = np.triu(np.ones((m, m), dtype=bool), 1) & (priority[cur][:, None] == priority[cur][None, :])
+        delta = np.where(valid, delta, np.inf)
+        best = int(np.argmin(delta))
+        i, j = divmod(best, m)
+        if delta[i, j] >= -_EPSILON:
+            return False
+        tour[i + 1 : j + 2] = tour[i + 1 : j + 2][::-1]
+        return True
+
+    @staticmethod
+    def _or_opt(tour: np.ndarray, distance: np.ndarray, priority: np.ndarray, m: int) -> bool:
+        position_priority = priority[tour].copy()
+        position_priority[-1] = np.iinfo(position_priority.dtype).max
+        best: Tuple[float, int, int, int] = (-_EPSILON, 0, 0, 0)
+        edges = np.arange(m + 1)  # insert between positions q and q + 1
+        edge_cost = distance[tour[edges], tour[edges + 1]]
+        for length in (1, 2, 3):
+            starts = np.arange(1, m - length + 2)
+            if not len(starts):
+                continue
+            ends = starts + length - 1
+            first, last = tour[starts], tour[ends]
+            removal_gain = (
+                distance[tour[starts - 1], first] + distance[last, tour[ends + 1]] - distance[tour[starts - 1], tour[ends + 1]]
+            )
+            insertion = (
+                distance[tour[edges][None, :], first[:, None]]
+                + distance[last[:, None], tour[edges + 1][None, :]]
+                - edge_cost[None, :]
+            )
+            delta = insertion - removal_gain[:, None]
+            overlaps = (edges[None, :] >= starts[:, None] - 1) & (edges[None, :] <= ends[:, None])
+            ordered = (position_priority[edges][None, :] <= position_priority[starts][:, None]) & (
+                position_priority[ends][:, None] <= position_priority[edges + 1][None, :]
+            )
+            delta = np.where(~overlaps & ordered, delta, np.inf)
+            index = int(np.argmin(delta))
+            row, q = divmod(index, m + 1)
+            if delta[row, q] < best[0]:
+                best = (float(delta[row, q]), int(starts[row]), length, q)
+        if best[0] >= -_EPSILON:
+            return False
+        _, start, length, q = best
+        segment = tour[start : start + length].copy()
+        rest = np.concatenate([tour[:start], tour[start + length :]])
+        insert_at = q + 1 if q < start else q + 1 - length
+        tour[:] = np.concatenate([rest[:insert_at], segment, rest[insert_at:]])
+        return True
+
+    def _consolidate(self, stops: Sequence[Stop], routes: List[List[int]], capacity: int, limit: int) -> List[List[int]]:
+        """Merge the lightest routes into their nearest partner until ``limit`` vehicles suffice.
+
+        Merging interleaves the two routes by priority, so it is always order-feasible;
+        local search then repairs the geometry.
+        """
+        routes = list(routes)
+        loads = np.array([sum(stops[i].demand for i in route) for route in routes], dtype=float)
+        counts = np.array([len(route) for route in routes], dtype=float)
+        lat_sums = np.array([sum(stops[i].lat for i in route) for route in routes])
+        lng_sums = np.array([sum(stops[i].lng for i in route) for route in routes])
+        alive = np.ones(len(routes), dtype=bool)
+        while alive.sum() > limit:
+            lightest = int(np.argmin(np.where(alive, loads, np.inf)))
+            gap = haversine_matrix(
+                [lat_sums[lightest] / counts[lightest]], [lng_sums[lightest] / counts[lightest]],
+                lat_sums / counts, lng_sums / counts,
+            )[0]
+            gap[~alive | (loads + loads[lightest] > capacity)] = np.inf
+            gap[lightest] = np.inf
+            partner = int(np.argmin(gap))
+            if not np.isfinite(gap[partner]):
+                break
+            routes[partner] = list(heapq.merge(routes[partner], routes[lightest], key=lambda i: stops[i].priority))
+            for totals in (loads, counts, lat_sums, lng_sums):
+                totals[partner] += totals[lightest]
+            alive[lightest] = False
+        routes = [route for route, keep in zip(routes, alive) if keep]
+        return routes
+
+    def _solve_depot(
+        self, depot: Tuple[float, float], stops: List[Stop], vehicles: List[Vehicle]
+    ) -> Tuple[List[PlannedRoute], List[str]]:
+        fleet = sorted(vehicles, key=lambda vehicle: vehicle.capacity)
+        planned: List[PlannedRoute] = []
+        # Routes are built for the largest remaining vehicle; stops whose route did not
+        # fit any vehicle are rebuilt for the smaller ones left over.
+        while stops and fleet:
+            capacity = fleet[-1].capacity
+            oversized = [stop for stop in stops if stop.demand > capacity]
+            stops = [stop for stop in stops if stop.demand <= capacity]
+            if not stops:
+                stops = oversized
+                break
+            to_depot = self.matrix.distances(
+                [depot[0]], [depot[1]], [stop.lat for stop in stops], [stop.lng for stop in stops]
+            )[0]
+            routes = self._consolidate(stops, self._clarke_wright(stops, to_depot, capacity), capacity, len(fleet))
+
+            # Most urgent, then heaviest routes get a vehicle first; each takes the smallest vehicle that fits.
+            routes.sort(key=lambda route: (stops[route[0]].priority, -sum(stops[i].demand for i in route)))
+            capacities = [vehicle.capacity for vehicle in fleet]
+            leftover: List[Stop] = []
+            for route in routes:
+                load = sum(stops[i].demand for i in route)
+                slot = bisect.bisect_left(capacities, load)
+                if slot == len(fleet):
+                    leftover.extend(stops[i] for i in route)
+                    continue
+                vehicle = fleet.pop(slot)
+                capacities.pop(slot)
+                planned.append(self._plan(vehicle, [stops[i] for i in route]))
+            if len(leftover) == len(stops):
+                stops = leftover + oversized
+                break
+            stops = leftover + oversized
+        return planned, [stop.id for stop in stops]
+
+    def _plan(self, vehicle: Vehicle, stops: List[Stop]) -> PlannedRoute:
+        """Improve one route from the vehicle's own position and measure it."""
+        lat = np.array([vehicle.lat] + [stop.lat for stop in stops])
+        lng = np.array([vehicle.lng] + [stop.lng for stop in stops])
+        # Cached per route: a re-plan of the same stops, or after the vehicle moved
+        # (``track_positions`` refreshes its row), skips rebuilding the matrix.
+        distance = self.matrix.matrix([vehicle.id] + [stop.id for stop in stops], lat, lng).distance_km
+        priority = np.array([-1] + [stop.priority for stop in stops])
+        tour = self._improve(distance, priority)
+        length = float(distance[tour[:-1], tour[1:]].sum())
+        return PlannedRoute(
+            vehicle=vehicle,
+            stops=[stops[node - 1] for node in tour[1:-1]],
+            distance_km=length,
+            duration_min=float(self.matrix.travel_minutes(length)) + self.service_minutes * len(stops),
+            baseline_km=float(2.0 * distance[0, 1:].sum()),
+        )
+
+
+def vehicles_from_fleet(fleet: Sequence[Dict[str, Any]]) -> List[Vehicle]:
+    """Located fleet rows as solver vehicles (rows without coordinates are skipped)."""
+    vehicles = []
+    for row in fleet:
+        position = vehicle_position(row)
+        if position is None or not row.get("id"):
+            continue
+        vehicles.append(Vehicle(
+            id=row["id"],
+            lat=position[0],
+            lng=position[1],
+            capacity=int(row.get("capacity") or 0),
+            vehicle_type=row.get("vehicle_type") or "",
+        ))
+    return vehicles
+
+
+def stops_from_orders(
+    orders: Sequence[Dict[str, Any]], fleet: Sequence[Dict[str, Any]]
+) -> Tuple[List[Stop], List[str]]:
+    """Orders as solver stops, plus the ids of orders that could not be located."""
+    depots = merchant_depots(fleet)
+    stops, unlocated = [], []
+    for order in orders:
+        location = order_location(order, depots)
+        if location is None:
+            unlocated.append(order.get("id"))
+            continue
+        stops.append(Stop(
+            id=order["id"],
+            lat=location[0],
+            lng=location[1],
+            demand=order_demand(order),
+            priority=order_priority(order),
+            label=order.get("delivery_address") or "",
+        ))
+    return stops, unlocated
+
+
+# Global instance
+vrp_solver = VRPSolver()
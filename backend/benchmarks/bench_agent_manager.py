@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Measure full AgentManager throughput offline, against the mock LLM server.
+
+Runs every agent's ``process()`` concurrently for a number of cycles on a
+throw-away SQLite database and reports cycle latency, LLM traffic and the
+number of agent actions written.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_agent_manager --cycles 5 --scale 200 --latency lognormal:-1.5,0.4
+
+Pass ``--cassette-mode record`` once and ``--cassette-mode replay`` afterwards to
+rerun the same cycles deterministically (use ``--seed`` so the synthetic data
+and therefore the prompts match).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import socket
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_environment(port: int) -> None:
+    # Must run before any ``app`` import: settings and the DB engine read these at import time.
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("GROQ_API_KEY", "mock")
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "100000")
+    os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "100000000")
+    os.environ.setdefault("GROQ_RETRY_BASE_DELAY", "0.1")
+
+
+def _seed_scale(rows: int) -> None:
+    """Add synthetic inventory, orders and vehicles on top of the demo seed data."""
+    from app.db import models
+    from app.db.session import SessionLocal
+
+    def seeded_id() -> str:
+        return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
+    now = datetime.utcnow()
+    with SessionLocal() as session:
+        for index in range(rows):
+            session.add(models.Inventory(
+                id=seeded_id(),
+                item_name=f"Bench Item {index}",
+                quantity=random.randint(0, 200),
+                min_quantity=random.randint(20, 120),
+                location=random.choice(["New York Warehouse", "Chicago Warehouse", "Los Angeles Warehouse"]),
+            ))
+            session.add(models.Order(
+                id=seeded_id(),
+                items=f"Bench Item {index}: {random.randint(1, 30)}",
+                status=random.choice(["pending", "pending", "in_transit"]),
+                total_amount=round(random.uniform(50, 5000), 2),
+                route={"destination": {"lat": 40.7 + random.gauss(0, 0.08), "lng": -74.0 + random.gauss(0, 0.08)}},
+                created_at=now - timedelta(minutes=random.randint(0, 600)),
+            ))
+            session.add(models.Fleet(
+                id=seeded_id(),
+                vehicle_id=f"BENCH-{index:04d}",
+                vehicle_type=random.choice(["Cargo Van", "Delivery Truck"]),
+                capacity=random.choice([800, 1200, 2000]),
+                status="available",
+                geo_lat=40.7 + random.uniform(-0.2, 0.2),
+                geo_lng=-74.0 + random.uniform(-0.2, 0.2),
+            ))
+        session.commit()
+
+
+async def main() -> None:
+    port = _free_port()
+    _configure_environment(port)
+
+    from benchmarks.mock_llm_server import add_server_arguments, server_from_args, start_mock_server
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--scale", type=int, default=0, help="extra synthetic rows per table")
+    parser.add_argument("--seed", type=int, default=7, help="random seed for synthetic data")
+    parser.add_argument("--cassette", default="cassettes/bench_agent_manager.jsonl.gz")
+    parser.add_argument("--cassette-mode", choices=["off", "record", "replay"], default="off")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    from app.db.init_db import init_db
+
+    init_db()
+    if args.scale:
+        _seed_scale(args.scale)
+
+    mock = server_from_args(args)
+    runner = await start_mock_server(mock, port=port)
+
+    from app.agents.manager import agent_manager
+    from app.ai.cassette import llm_cassette
+    from app.ai.circuit_breaker import llm_breaker
+    from app.ai.decision_memory import decision_memory
+    from app.ai.model_router import model_router
+    from app.ai.rate_limiter import rate_limiter
+    from app.ai.usage import usage_ledger
+
+    llm_cassette.path = args.cassette
+    llm_cassette.mode = args.cassette_mode
+
+    from app.core.supabase import supabase_client
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await agent_manager.initialize_agents()
+    actions_before = len(supabase_client.get_client().table("agent_actions").select("id").execute().data)
+
+    cycle_times = []
+    try:
+        for _ in range(args.cycles):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                await asyncio.gather(*(agent.run_cycle() for agent in agent_manager.agents.values()))
+            cycle_times.append(time.perf_counter() - started)
+    finally:
+        await runner.cleanup()
+
+    actions_after = len(supabase_client.get_client().table("agent_actions").select("id").execute().data)
+    total = sum(cycle_times)
+    print(f"cycles:            {args.cycles}")
+    print(f"cycle p50 / max:   {statistics.median(cycle_times):.2f}s / {max(cycle_times):.2f}s")
+    print(f"agent cycles/s:    {args.cycles * len(agent_manager.agents) / total:.2f}")
+    print(f"LLM traffic:       {mock.counters}")
+    print(f"LLM requests/s:    {mock.counters['requests'] / total:.1f}")
+    print(f"actions written:   {actions_after - actions_before}")
+    print(f"rate limiter:      {rate_limiter.stats()}")
+    print(f"cassette:          {llm_cassette.stats()}")
+    print(f"LLM circuit:       {llm_breaker.stats()}")
+    print(f"decision memory:   {decision_memory.stats()}")
+    for model, metrics in model_router.stats()["models"].items():
+        print(f"model {model}: {metrics}")
+    for agent in agent_manager.agents.values():
+        if agent.total_counters:
+            print(f"{agent.agent_type}: {dict(agent.total_counters)}")
+        print(f"{agent.agent_type} tokens: {usage_ledger.agent_usage(agent.agent_type)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
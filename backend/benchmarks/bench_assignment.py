@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark the min-cost order-to-vehicle matching on synthetic fleets.
+
+Orders and vehicles are scattered around a few depots. Use a ``--vehicle-ratio``
+below 1 to exercise the priority-aware "stay pending" option.
+Each size reports how many orders of each priority got a vehicle, and small
+random instances are checked against exhaustive search.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_assignment --sizes 500 1000 2000
+"""
+import argparse
+import itertools
+import random
+import statistics
+
+from app.services.assignment import AssignmentEngine, min_cost_matching
+
+DEPOTS = [(40.7128, -74.0060), (40.6782, -73.9442), (40.7831, -73.9712)]
+CAPACITIES = [800, 1200, 2000]
+
+
+def build_instance(size: int, vehicles: int, seed: int):
+    rng = random.Random(seed)
+    orders, fleet = [], []
+    for index in range(size):
+        lat, lng = rng.choice(DEPOTS)
+        orders.append({
+            "id": f"order-{index}",
+            "items": f"Widgets: {rng.randint(1, 1000)}",
+            "priority": rng.choices(["high", "medium", "low"], weights=[1, 3, 2])[0],
+            "route": {"destination": {"lat": lat + rng.gauss(0, 0.05), "lng": lng + rng.gauss(0, 0.06)}},
+        })
+    for index in range(vehicles):
+        lat, lng = rng.choice(DEPOTS)
+        fleet.append({
+            "id": f"vehicle-{index}",
+            "geo_lat": lat + rng.gauss(0, 0.03),
+            "geo_lng": lng + rng.gauss(0, 0.03),
+            "capacity": rng.choice(CAPACITIES),
+            "status": "available",
+        })
+    return orders, fleet
+
+
+def exhaustive_cost(edges, columns, fallback) -> float:
+    best = float("inf")
+    choices = [[(column, cost) for column, cost in options] + [(-1 - row, fallback[row])] for row, options in enumerate(edges)]
+    for combination in itertools.product(*choices):
+        picked = [column for column, _ in combination]
+        if len(set(picked)) == len(picked):
+            best = min(best, sum(cost for _, cost in combination))
+    return best
+
+
+def verify(rounds: int, seed: int) -> int:
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(rounds):
+        rows, columns = rng.randint(1, 6), rng.randint(1, 6)
+        edges = [
+            [(column, rng.uniform(0, 50)) for column in rng.sample(range(columns), rng.randint(0, columns))]
+            for _ in range(rows)
+        ]
+        fallback = [rng.uniform(10, 60) for _ in range(rows)]
+        _, cost = min_cost_matching(edges, columns, fallback)
+        if abs(cost - exhaustive_cost(edges, columns, fallback)) > 1e-6:
+            mismatches += 1
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--vehicle-ratio", type=float, default=1.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verify", type=int, default=300, help="random small instances checked exhaustively")
+    args = parser.parse_args()
+
+    print(f"exhaustive check: {verify(args.verify, args.seed)} mismatches in {args.verify} instances")
+    engine = AssignmentEngine()
+    print(f"{'orders':>7} {'vehicles':>8} {'assigned':>8} {'p50 s':>7} {'avg km':>7}  assigned by priority")
+    for size in args.sizes:
+        orders, fleet = build_instance(size, int(size * args.vehicle_ratio), args.seed)
+        timings = []
+        for _ in range(args.repeat):
+            result = engine.solve(orders, fleet)
+            timings.append(result.seconds)
+        stats = result.stats()
+        assigned = {assignment["order_id"] for assignment in result.assignments}
+        by_priority = {
+            priority: f"{sum(1 for order in orders if order['priority'] == priority and order['id'] in assigned)}"
+            f"/{sum(1 for order in orders if order['priority'] == priority)}"
+            for priority in ("high", "medium", "low")
+        }
+        print(
+            f"{size:>7} {len(fleet):>8} {stats['assigned']:>8} {statistics.median(timings):>7.3f} "
+            f"{stats['distance_km'] / max(stats['assigned'], 1):>7.2f}  {by_priority}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compare per-decision overhead and memory of the AG2 conversation path and the
+direct single-turn path of AgenticDecisionEngine.
+
+Both modes talk to a local stand-in server that answers instantly, so the
+timings isolate engine overhead (agent construction, chat bookkeeping,
+serialisation) from model latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_decision_modes --decisions 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import time
+import tracemalloc
+
+# The stand-in never rate limits; keep the shared limiter out of the way.
+os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "1000000000")
+
+from app.ai.ag2_engine import AgenticDecisionEngine
+from app.ai.groq_client import completion_budget
+from app.ai.structured_output import extract_json
+from app.core.config import settings
+from benchmarks.bench_groq_transport import bound_url, start_stand_in
+
+CONTEXT = {
+    "inventory_summary": "4 total items",
+    "recent_inventory": [
+        {"id": f"I{i}", "item_name": f"Item {i}", "quantity": 10 * i, "min_quantity": 50}
+        for i in range(1, 4)
+    ],
+}
+PROMPT = "Analyze the low stock items and determine reorder quantities."
+RESPONSE_FORMAT = {
+    "type": "object",
+    "properties": {"reorder_recommendations": {"type": "array", "items": {"type": "object"}}},
+}
+
+
+async def ag2_sync_decision(engine: AgenticDecisionEngine, prompt: str):
+    """Drive the same AG2 agents through the synchronous chat API in a worker thread.
+
+    With ag2 0.9.x the async chat can terminate before the assistant replies, so this
+    variant is what shows the real cost of a reply-producing AG2 conversation.
+    """
+    assistant, controller, _ = engine._init_agents(max_tokens=completion_budget(RESPONSE_FORMAT, None))
+    result = await asyncio.to_thread(
+        controller.initiate_chat,
+        assistant,
+        clear_history=True,
+        silent=True,
+        max_turns=1,
+        message=prompt,
+    )
+    replies = [msg for msg in result.chat_history if msg.get("name") == assistant.name]
+    return extract_json(replies[-1]["content"], RESPONSE_FORMAT) if replies else None
+
+async def measure(mode: str, decisions: int) -> dict:
+    engine = AgenticDecisionEngine(f"bench_{mode}", mode="ag2" if mode.startswith("ag2") else mode)
+    tracemalloc.start()
+
+    started = time.perf_counter()
+    engine.warm_up()
+    warm_up_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    answered = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in range(decisions):
+            # Vary the prompt so AG2's response cache can't answer for the stand-in.
+            prompt = f"{PROMPT} (run {time.time_ns()}-{index})"
+            started = time.perf_counter()
+            if mode == "ag2-sync":
+                decision = await ag2_sync_decision(engine, prompt)
+            else:
+                decision = await engine.a_make_decision(
+                    context=CONTEXT, prompt=prompt, response_format=RESPONSE_FORMAT
+                )
+            timings.append((time.perf_counter() - started) * 1000)
+            answered += decision is not None
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "warm_up_ms": warm_up_ms,
+        "first_ms": timings[0],
+        "p50_ms": statistics.median(timings),
+        "mean_ms": statistics.fmean(timings),
+        "peak_kib": peak / 1024,
+        "answered": answered,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--decisions", type=int, default=50)
+    args = parser.parse_args()
+
+    runner = await start_stand_in(0.0)
+    settings.GROQ_API_KEY = "bench"
+    settings.GROQ_BASE_URL = bound_url(runner)
+
+    print(f"{'mode':<9} {'warm-up ms':>11} {'first ms':>9} {'p50 ms':>8} {'mean ms':>8} {'peak KiB':>9} {'answered':>9}")
+    try:
+        for mode in ("ag2", "ag2-sync", "direct"):
+            result = await measure(mode, args.decisions)
+            print(
+                f"{mode:<9} {result['warm_up_ms']:>11.1f} {result['first_ms']:>9.1f} "
+                f"{result['p50_ms']:>8.2f} {result['mean_ms']:>8.2f} {result['peak_kib']:>9.0f} "
+                f"{result['answered']:>5}/{args.decisions:<3}"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark cached per-route ETAs as the number of active routes grows.
+
+Each size is synced from scratch, then a small share of vehicles move and deliver
+their next stop. The incremental sync should only re-anchor those routes. A batch
+query for every tracked order is timed, and the cached ETAs are checked against a
+fresh engine that rebuilds every route from the same state.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_eta --routes 100 1000 10000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime
+
+from app.services.eta import EtaEngine
+from benchmarks.bench_replanner import build_instance
+
+
+def move_fleet(fleet, routes, open_orders, share: float, seed: int) -> int:
+    """Move ``share`` of the vehicles onto their next open stop and deliver it."""
+    rng = random.Random(seed)
+    moved = rng.sample(range(len(fleet)), int(len(fleet) * share))
+    for index in moved:
+        stops = [point for point in routes[index]["route_points"]["points"] if point.get("order_id") in open_orders]
+        if stops:
+            fleet[index]["geo_lat"], fleet[index]["geo_lng"] = stops[0]["lat"], stops[0]["lng"]
+            del open_orders[stops[0]["order_id"]]
+    return len(moved)
+
+
+def mismatches(engine: EtaEngine, routes, fleet, open_orders, now: datetime) -> int:
+    fresh = EtaEngine()
+    fresh.sync(routes, fleet, open_orders.keys(), now)
+    cached = {eta["order_id"]: eta["minutes_away"] for eta in engine.etas(now=now)[0]}
+    expected = {eta["order_id"]: eta["minutes_away"] for eta in fresh.etas(now=now)[0]}
+    return sum(1 for order_id in expected.keys() | cached.keys() if abs(cached.get(order_id, -1e9) - expected.get(order_id, 1e9)) > 0.1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--routes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--stops", type=int, default=8, help="stops per route")
+    parser.add_argument("--moved", type=float, default=0.02, help="share of vehicles that move between syncs")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'routes':>7} {'stops':>7} {'full ms':>8} {'update ms':>9} {'re-anchored':>11} {'query ms':>8} {'mismatches':>10}")
+    for size in args.routes:
+        fleet, routes, open_orders, _ = build_instance(size, args.stops, args.seed)
+        engine = EtaEngine()
+        now = datetime.utcnow()
+        started = time.perf_counter()
+        engine.sync(routes, fleet, open_orders.keys(), now)
+        full_ms = (time.perf_counter() - started) * 1000
+
+        update_timings, query_timings, reanchored = [], [], 0
+        for round_index in range(args.repeat):
+            move_fleet(fleet, routes, open_orders, args.moved, args.seed + round_index)
+            started = time.perf_counter()
+            reanchored = engine.sync(routes, fleet, open_orders.keys(), now)["reanchored"]
+            update_timings.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            engine.etas(list(open_orders), now)
+            query_timings.append((time.perf_counter() - started) * 1000)
+
+        print(
+            f"{size:>7} {len(open_orders):>7} {full_ms:>8.1f} {statistics.median(update_timings):>9.2f} "
+            f"{reanchored:>11} {statistics.median(query_timings):>8.1f} {mismatches(engine, routes, fleet, open_orders, now):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
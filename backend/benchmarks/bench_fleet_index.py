@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark k-nearest-feasible-vehicle queries on the fleet spatial index.
+
+Vehicles are scattered around a few depots; each query asks for the nearest
+vehicles able to carry a random demand. Results are checked against a brute-force
+scan of the whole fleet, and a share of the vehicles moves or changes status
+between query rounds to exercise incremental updates.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_fleet_index --vehicles 1000 10000 --queries 5000
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app.services.geo import haversine_matrix
+from app.services.spatial_index import FleetIndex
+
+DEPOTS = [(40.7128, -74.0060), (40.6782, -73.9442), (40.7831, -73.9712), (34.0522, -118.2437)]
+CAPACITIES = [800, 1200, 2000]
+
+
+def build_fleet(size: int, rng: random.Random) -> list:
+    fleet = []
+    for index in range(size):
+        lat, lng = rng.choice(DEPOTS)
+        fleet.append({
+            "id": f"vehicle-{index}",
+            "geo_lat": lat + rng.gauss(0, 0.05),
+            "geo_lng": lng + rng.gauss(0, 0.06),
+            "capacity": rng.choice(CAPACITIES),
+            "vehicle_type": "Cargo Van",
+            "status": "available",
+        })
+    return fleet
+
+
+def brute_force(fleet: list, lat: float, lng: float, k: int, demand: int) -> list:
+    rows = [row for row in fleet if row["status"] == "available" and row["capacity"] >= demand]
+    distances = haversine_matrix([lat], [lng], [row["geo_lat"] for row in rows], [row["geo_lng"] for row in rows])[0]
+    return [rows[i]["id"] for i in np.argsort(distances, kind="stable")[:k]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'vehicles':>8} {'queries':>8} {'p50 us':>8} {'p99 us':>8} {'update us':>9} {'full scans':>10}  mismatches")
+    for size in args.vehicles:
+        rng = random.Random(args.seed)
+        fleet = build_fleet(size, rng)
+        index = FleetIndex()
+        index.sync(fleet)
+        timings, update_timings, mismatches = [], [], 0
+        for _ in range(args.rounds):
+            for row in rng.sample(fleet, max(1, size // 20)):
+                row["geo_lat"] += rng.gauss(0, 0.005)
+                row["geo_lng"] += rng.gauss(0, 0.005)
+                row["status"] = rng.choice(["available", "available", "assigned"])
+                started = time.perf_counter()
+                index.upsert(row)
+                update_timings.append(time.perf_counter() - started)
+            for query in range(args.queries // args.rounds):
+                lat, lng = rng.choice(DEPOTS)
+                lat, lng = lat + rng.gauss(0, 0.05), lng + rng.gauss(0, 0.06)
+                demand = rng.choice([1, 500, 1000, 1500])
+                started = time.perf_counter()
+                found = index.nearest(lat, lng, k=args.k, min_capacity=demand)
+                timings.append(time.perf_counter() - started)
+                if query % 50 == 0 and [vehicle_id for vehicle_id, _ in found] != brute_force(fleet, lat, lng, args.k, demand):
+                    mismatches += 1
+        timings.sort()
+        print(
+            f"{size:>8} {len(timings):>8} {statistics.median(timings) * 1e6:>8.1f} "
+            f"{timings[int(len(timings) * 0.99)] * 1e6:>8.1f} {statistics.median(update_timings) * 1e6:>9.1f} "
+            f"{index.full_scans:>10}  {mismatches}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark the legacy thread-wrapped Groq transport against the pooled async one.
+
+A local aiohttp stand-in answers every chat-completions request after a fixed
+delay, so the numbers only reflect client-side overhead and concurrency limits.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_groq_transport --requests 256 --latency-ms 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from aiohttp import web
+from groq import AsyncGroq, Groq
+
+from app.ai.groq_client import build_http_client
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "bench-model",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "{\"ok\": true}"},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+async def start_stand_in(latency_s: float) -> web.AppRunner:
+    async def handle(request: web.Request) -> web.Response:
+        await request.read()
+        await asyncio.sleep(latency_s)
+        return web.json_response(COMPLETION)
+
+    app = web.Application()
+    app.router.add_post("/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+def bound_url(runner: web.AppRunner) -> str:
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+
+async def run_load(call, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "throughput": total / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    runner = await start_stand_in(args.latency_ms / 1000)
+    base_url = bound_url(runner)
+    sync_client = Groq(api_key="bench", base_url=base_url, max_retries=0)
+    async_client = AsyncGroq(
+        api_key="bench", base_url=base_url, max_retries=0, http_client=build_http_client()
+    )
+
+    async def legacy_call():
+        await asyncio.to_thread(
+            sync_client.chat.completions.create, messages=MESSAGES, model="bench-model"
+        )
+
+    async def pooled_call():
+        await async_client.chat.completions.create(messages=MESSAGES, model="bench-model")
+
+    print(f"{'transport':<10} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    try:
+        for concurrency in args.concurrency:
+            for name, call in (("thread", legacy_call), ("async", pooled_call)):
+                result = await run_load(call, args.requests, concurrency)
+                print(
+                    f"{name:<10} {concurrency:>5} {result['throughput']:>9.1f} "
+                    f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}"
+                )
+    finally:
+        await async_client.close()
+        sync_client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Check that JSON extraction from LLM replies stays linear on adversarial text.
+
+Each shape is extracted at doubling sizes: stray opening brackets, an unterminated
+string inside an object, a long chain of invalid nested arrays, and many small valid
+objects in prose. Doubling the input should roughly double the time; the run exits
+with an error when any doubling costs more than ``--max-growth`` times as much. A few
+typical replies are also checked for the expected candidates.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_json_extraction --sizes 16000 32000 64000 128000
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from app.ai.structured_output import extract_json, iter_json_candidates
+
+SHAPES = {
+    "stray brackets": lambda size: "x{" * (size // 2),
+    "open string": lambda size: '{"reason": "' + "y" * size,
+    "invalid nesting": lambda size: "[x " * (size // 4) + "]" * (size // 4),
+    "small objects": lambda size: 'ok {"a": [1]} ' * (size // 14),
+}
+
+REPLIES = [
+    ('Sure! {"action": "reorder", "quantity": 5}', {"action": "reorder", "quantity": 5}),
+    ('```json\n{"routes": [{"vehicle_id": "V1"}]}\n```', {"routes": [{"vehicle_id": "V1"}]}),
+    ('Schema {"type": "object", "properties": {}} then {"ok": true}', {"ok": True}),
+    ('Broken {"a": {"b": 1}, oops} tail', {"b": 1}),
+    ('Truncated {"a": 1, "b": {"c": 2}', {"c": 2}),
+]
+
+
+def timed(text: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        iter_json_candidates(text)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16000, 32000, 64000, 128000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-growth", type=float, default=3.0, help="allowed time ratio per doubling of the input")
+    args = parser.parse_args()
+
+    wrong = sum(1 for reply, expected in REPLIES if extract_json(reply) != expected)
+    print(f"typical replies: {wrong} wrong of {len(REPLIES)}")
+
+    print(f"{'shape':>16} " + " ".join(f"{size:>9}" for size in args.sizes) + f" {'growth':>7}")
+    worst = 0.0
+    for name, build in SHAPES.items():
+        timings = [timed(build(size), args.repeat) for size in args.sizes]
+        # Time ratio scaled to one doubling of the input; about 2 when linear, 4 when quadratic.
+        growth = max(
+            [later / max(earlier, 0.05) * 2 * previous / size
+             for earlier, later, previous, size in zip(timings, timings[1:], args.sizes, args.sizes[1:])],
+            default=0.0,
+        )
+        worst = max(worst, growth)
+        print(f"{name:>16} " + " ".join(f"{ms:>7.1f}ms" for ms in timings) + f" {growth:>7.2f}")
+
+    if wrong or worst > args.max_growth:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark capacity-feasible load planning of pending orders into available vehicles.
+
+Each size packs synthetic orders from a few merchants into their fleets, with and
+without the local improvement pass, and checks every plan: no vehicle over capacity,
+no order in another merchant's vehicle, no order packed twice.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_load_planner --sizes 100 1000 5000
+"""
+import argparse
+import random
+import statistics
+
+from app.services.geo import order_demand
+from app.services.load_planner import LoadPlanner
+
+MERCHANTS = ["merchant-a", "merchant-b", "merchant-c", "merchant-d"]
+CAPACITIES = [800, 1200, 2000]
+
+
+def build_instance(size: int, vehicle_ratio: float, seed: int):
+    rng = random.Random(seed)
+    orders = [
+        {
+            "id": f"order-{index}",
+            "merchant_id": rng.choice(MERCHANTS),
+            "items": f"Widgets: {rng.randint(20, 400)}, Gadgets: {rng.randint(0, 300)}",
+            "priority": rng.choices(["high", "medium", "low"], weights=[1, 3, 2])[0],
+        }
+        for index in range(size)
+    ]
+    fleet = [
+        {
+            "id": f"vehicle-{index}",
+            "merchant_id": rng.choice(MERCHANTS),
+            "capacity": rng.choice(CAPACITIES),
+            "status": "available",
+        }
+        for index in range(max(1, int(size * vehicle_ratio)))
+    ]
+    return orders, fleet
+
+
+def violations(plan, orders, fleet) -> int:
+    demand = {order["id"]: order_demand(order) for order in orders}
+    merchant = {order["id"]: order["merchant_id"] for order in orders}
+    vehicles = {vehicle["id"]: vehicle for vehicle in fleet}
+    seen, problems = set(), 0
+    for vehicle_id, order_ids in plan.loads.items():
+        problems += sum(demand[order_id] for order_id in order_ids) > vehicles[vehicle_id]["capacity"]
+        problems += sum(merchant[order_id] != vehicles[vehicle_id]["merchant_id"] for order_id in order_ids)
+        problems += len(seen.intersection(order_ids))
+        seen.update(order_ids)
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--vehicle-ratio", type=float, default=0.2, help="vehicles per order; below ~0.25 some orders wait")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    planners = {"ffd": LoadPlanner(improve_rounds=0), "ffd+local": LoadPlanner()}
+    print(f"{'orders':>7} {'vehicles':>8} {'planner':>9} {'packed':>7} {'used':>5} {'util':>6} {'high left':>9} {'p50 s':>7} {'bad':>4}")
+    for size in args.sizes:
+        orders, fleet = build_instance(size, args.vehicle_ratio, args.seed)
+        high = {order["id"] for order in orders if order["priority"] == "high"}
+        for name, planner in planners.items():
+            timings = []
+            for _ in range(args.repeat):
+                plan = planner.pack(orders, fleet)
+                timings.append(plan.seconds)
+            stats = plan.stats()
+            print(
+                f"{size:>7} {len(fleet):>8} {name:>9} {stats['orders_packed']:>7} {stats['vehicles_used']:>5} "
+                f"{stats['utilization']:>6.1%} {len(high.intersection(plan.unpacked)):>9} "
+                f"{statistics.median(timings):>7.3f} {violations(plan, orders, fleet):>4}"
+            )
+
+
+if __name__ == "__main__":
+    main()
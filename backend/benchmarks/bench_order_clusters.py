@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark incremental order clustering and per-cluster (batched) route solving.
+
+First, each size is clustered from scratch and then updated with a small churn of
+orders leaving and arriving; the incremental result is checked against a fresh
+clustering of the same orders. Then the VRP solver runs on the whole backlog and on
+the cluster batches in parallel threads, comparing wall time, route distance and
+stops routed (whole/batched) on the orders whose wave is due. The whole solve may
+load any vehicle at any depot, so its distance is a lower bound rather than a plan
+the merchants' fleets could run.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_order_clusters --sizes 1000 5000 --churn 0.02
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.services.order_clusters import OrderClusterer
+from app.services.vrp_solver import VRPSolution, VRPSolver, stops_from_orders, vehicles_from_fleet
+
+DEPOTS = [(40.7128, -74.0060), (40.6782, -73.9442), (40.7831, -73.9712)]
+CAPACITIES = [800, 1200, 2000]
+
+
+def make_order(rng: random.Random, index: int, now: datetime) -> dict:
+    depot = rng.randrange(len(DEPOTS))
+    lat, lng = DEPOTS[depot]
+    order = {
+        "id": f"order-{index}",
+        "merchant_id": f"merchant-{depot}",
+        "items": f"Widgets: {rng.randint(1, 60)}",
+        "priority": rng.choices(["high", "medium", "low"], weights=[1, 3, 2])[0],
+        "route": {"destination": {"lat": lat + rng.gauss(0, 0.05), "lng": lng + rng.gauss(0, 0.06)}},
+    }
+    if rng.random() < 0.3:
+        order["estimated_delivery_time"] = (now + timedelta(minutes=rng.randint(60, 300))).isoformat()
+    return order
+
+
+def build_instance(size: int, seed: int):
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 5, 9, 0)
+    orders = [make_order(rng, index, now) for index in range(size)]
+    demand = size * 30.5
+    fleet = []
+    while sum(vehicle["capacity"] for vehicle in fleet) < 1.2 * demand:
+        depot = len(fleet) % len(DEPOTS)
+        lat, lng = DEPOTS[depot]
+        fleet.append({
+            "id": f"vehicle-{len(fleet)}", "merchant_id": f"merchant-{depot}", "status": "available",
+            "capacity": rng.choice(CAPACITIES),
+            "geo_lat": lat + rng.uniform(-0.005, 0.005), "geo_lng": lng + rng.uniform(-0.005, 0.005),
+        })
+    return orders, fleet, rng, now
+
+
+def grouping(clusterer: OrderClusterer) -> set:
+    return {frozenset(cluster.order_ids) for cluster in clusterer.clusters()}
+
+
+def solve(orders, fleet) -> VRPSolution:
+    stops, _ = stops_from_orders(orders, fleet)
+    return VRPSolver().solve(stops, vehicles_from_fleet(fleet))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--churn", type=float, default=0.02, help="share of orders leaving and arriving per update")
+    parser.add_argument("--max-orders", type=int, default=None, help="orders per batch (default ROUTING_CLUSTER_MAX_ORDERS)")
+    parser.add_argument("--fleet-slack", type=float, default=None, help="default ROUTING_CLUSTER_FLEET_SLACK")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'orders':>7} {'clusters':>8} {'build ms':>9} {'update ms':>9} {'matches':>7} {'due now':>7} "
+          f"{'batches':>7} {'whole s':>8} {'batched s':>9} {'whole km':>9} {'batched km':>10} {'routed w/b':>13}")
+    for size in args.sizes:
+        orders, fleet, rng, now = build_instance(size, args.seed)
+        clusterer = OrderClusterer(max_orders=args.max_orders, fleet_slack=args.fleet_slack)
+        started = time.perf_counter()
+        clusterer.sync(orders, fleet)
+        build = time.perf_counter() - started
+
+        churn = max(1, int(size * args.churn))
+        orders = rng.sample(orders, size - churn) + [make_order(rng, size + index, now) for index in range(churn)]
+        started = time.perf_counter()
+        clusterer.sync(orders, fleet)
+        update = time.perf_counter() - started
+        fresh = OrderClusterer(max_orders=args.max_orders, fleet_slack=args.fleet_slack)
+        fresh.sync(orders, fleet)
+        matches = grouping(clusterer) == grouping(fresh)
+
+        # Both sides get the orders of the waves due now; later waves stay pending.
+        due = [order for batch in clusterer.partition(orders, fleet, now) for order in batch.orders]
+        started = time.perf_counter()
+        whole = solve(due, fleet)
+        whole_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        batches = [batch for batch in clusterer.partition(orders, fleet, now) if batch.fleet]
+        with ThreadPoolExecutor(args.workers) as pool:
+            parts = list(pool.map(lambda batch: solve(batch.orders, batch.fleet), batches))
+        batched_seconds = time.perf_counter() - started
+        batched = VRPSolution(routes=[route for part in parts for route in part.routes])
+        whole_stats, batched_stats = whole.stats(), batched.stats()
+        print(
+            f"{size:>7} {len(clusterer.clusters()):>8} {build * 1000:>9.1f} {update * 1000:>9.1f} {str(matches):>7} {len(due):>7} "
+            f"{len(batches):>7} {whole_seconds:>8.2f} {batched_seconds:>9.2f} {whole_stats['distance_km']:>9.0f} "
+            f"{batched_stats['distance_km']:>10.0f} {whole_stats['stops_routed']:>6}/{batched_stats['stops_routed']:<6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
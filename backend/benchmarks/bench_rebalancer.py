@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark idle-fleet rebalancing on synthetic demand.
+
+Recent orders gather around a few hotspots per merchant while the idle vehicles wait
+at the merchants' depots. Each size reports the forecast areas, the moves planned,
+the solve time, and how far the fleet is from its targets before and after. The
+transportation solution's km are compared with a greedy plan that fills each short
+area with the nearest surplus vehicles, most-wanted areas first. The flow is exact
+between area centres, so the two can differ by the spread of vehicles inside an area.
+Small random transportation problems are also checked against the min-cost matching
+over one slot per unit.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_rebalancer --vehicles 100 500 2000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.services.assignment import min_cost_matching
+from app.services.rebalancer import FleetRebalancer, transport
+
+DEPOTS = {"merchant-a": (40.7128, -74.0060), "merchant-b": (40.6782, -73.9442), "merchant-c": (40.7831, -73.9712)}
+
+
+def build_instance(vehicles: int, seed: int):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    orders, fleet = [], []
+    for merchant, (lat, lng) in DEPOTS.items():
+        hotspots = [(lat + rng.uniform(-0.15, 0.15), lng + rng.uniform(-0.15, 0.15)) for _ in range(4)]
+        for index in range(vehicles * 3 // len(DEPOTS)):
+            spot_lat, spot_lng = rng.choice(hotspots)
+            orders.append({
+                "id": f"{merchant}-order-{index}",
+                "merchant_id": merchant,
+                "items": f"Widgets: {rng.randint(10, 200)}",
+                "lat": spot_lat + rng.gauss(0, 0.01),
+                "lng": spot_lng + rng.gauss(0, 0.01),
+                "created_at": (now - timedelta(hours=rng.uniform(0, 24))).isoformat(),
+            })
+        for index in range(vehicles // len(DEPOTS)):
+            fleet.append({
+                "id": f"{merchant}-vehicle-{index}",
+                "merchant_id": merchant,
+                "capacity": 1000,
+                "status": "available",
+                "geo_lat": lat + rng.gauss(0, 0.01),
+                "geo_lng": lng + rng.gauss(0, 0.01),
+            })
+    return orders, fleet, now
+
+
+def imbalance(rebalancer: FleetRebalancer, plan, fleet) -> int:
+    """Vehicles still needed to meet every area's target after ``plan``."""
+    moved = {move.vehicle_id: move.destination for move in plan.moves}
+    count = {}
+    for vehicle in fleet:
+        lat, lng = moved.get(vehicle["id"], (vehicle["geo_lat"], vehicle["geo_lng"]))
+        area = rebalancer._area(vehicle["merchant_id"], lat, lng)
+        count[area] = count.get(area, 0) + 1
+    return sum(max(area.target - count.get(area.area, 0), 0) for area in plan.areas)
+
+
+def greedy_km(rebalancer: FleetRebalancer, plan, fleet) -> float:
+    total = 0.0
+    for merchant in DEPOTS:
+        areas = [area for area in plan.areas if area.merchant_id == merchant]
+        home = {}
+        for vehicle in fleet:
+            if vehicle["merchant_id"] == merchant:
+                home.setdefault(rebalancer._area(merchant, vehicle["geo_lat"], vehicle["geo_lng"]), []).append(vehicle)
+        target = {area.area: area.target for area in areas}
+        spare = [vehicle for key, members in home.items() for vehicle in members[target.get(key, 0):]]
+        for area in sorted(areas, key=lambda area: -area.units):
+            for _ in range(max(area.target - len(home.get(area.area, [])), 0)):
+                if not spare:
+                    break
+                lat = np.array([vehicle["geo_lat"] for vehicle in spare])
+                lng = np.array([vehicle["geo_lng"] for vehicle in spare])
+                km = rebalancer.matrix.distances([area.lat], [area.lng], lat, lng)[0]
+                nearest = int(np.argmin(km))
+                if km[nearest] > rebalancer.max_km:
+                    break
+                total += float(km[nearest])
+                spare.pop(nearest)
+    return total
+
+
+def verify(rounds: int, seed: int) -> int:
+    rng = random.Random(seed)
+    mismatches = 0
+    unmet_cost = 1000.0
+    for _ in range(rounds):
+        supply = np.array([rng.randint(1, 4) for _ in range(rng.randint(1, 5))])
+        demand = np.array([rng.randint(1, 4) for _ in range(rng.randint(1, 5))])
+        cost = np.array([[rng.uniform(0, 50) if rng.random() < 0.8 else np.inf for _ in demand] for _ in supply])
+        flow = transport(supply, demand, cost)
+        total = float((flow * np.where(np.isfinite(cost), cost, 0.0)).sum()) + unmet_cost * (supply.sum() - flow.sum())
+        slots = [column for column, units in enumerate(demand) for _ in range(units)]
+        edges = [
+            [(slot, cost[row, column]) for slot, column in enumerate(slots) if np.isfinite(cost[row, column])]
+            for row, units in enumerate(supply) for _ in range(units)
+        ]
+        _, expected = min_cost_matching(edges, len(slots), [unmet_cost] * len(edges))
+        mismatches += abs(total - expected) > 1e-6
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verify", type=int, default=300, help="random small transportation problems checked")
+    args = parser.parse_args()
+
+    print(f"exact check: {verify(args.verify, args.seed)} mismatches in {args.verify} problems")
+    print(f"{'vehicles':>8} {'orders':>7} {'areas':>6} {'moves':>6} {'solve s':>8} {'short before':>12} "
+          f"{'short after':>11} {'km':>8} {'greedy km':>9}")
+    for size in args.vehicles:
+        orders, fleet, now = build_instance(size, args.seed)
+        rebalancer = FleetRebalancer()
+        plan = rebalancer.plan(orders, fleet, now=now)
+        before = sum(max(area.target - area.idle, 0) for area in plan.areas)
+        stats = plan.stats()
+        print(
+            f"{len(fleet):>8} {len(orders):>7} {stats['areas']:>6} {stats['moves']:>6} {stats['seconds']:>8.3f} "
+            f"{before:>12} {imbalance(rebalancer, plan, fleet):>11} {stats['distance_km']:>8.0f} "
+            f"{greedy_km(rebalancer, plan, fleet):>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark incremental re-planning of active routes as the fleet grows.
+
+Every size gets the same change: a few vehicle breakdowns, late stops and new urgent
+orders. Re-plan time should stay flat while the fleet grows; after the first cycle,
+``sync`` and ``detect`` only compare stored routes and due times with what they saw. Each result is checked: no route over capacity,
+and every open order on exactly one route or released back to pending.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_replanner --fleets 100 1000 10000
+"""
+import argparse
+import copy
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.services.geo import order_demand
+from app.services.replanner import IncrementalReplanner
+
+CENTER = (40.7128, -74.0060)
+
+
+def build_instance(vehicles: int, stops_per_route: int, seed: int):
+    rng = random.Random(seed)
+    spread = 0.02 * vehicles ** 0.5  # keep route density constant as the fleet grows
+    fleet, routes, open_orders = [], [], {}
+    later = (datetime.utcnow() + timedelta(hours=2)).isoformat()
+    for index in range(vehicles):
+        lat, lng = CENTER[0] + rng.uniform(-spread, spread), CENTER[1] + rng.uniform(-spread, spread)
+        fleet.append({"id": f"vehicle-{index}", "capacity": 1000, "status": "in_transit", "geo_lat": lat, "geo_lng": lng})
+        points = [{"lat": lat, "lng": lng, "address": "Depot"}]
+        for stop in range(stops_per_route):
+            order_id = f"order-{index}-{stop}"
+            open_orders[order_id] = {"id": order_id, "status": "in_transit", "items": f"Widgets: {rng.randint(20, 90)}",
+                                     "vehicle_id": f"vehicle-{index}", "estimated_delivery_time": later}
+            points.append({"lat": lat + rng.gauss(0, 0.01), "lng": lng + rng.gauss(0, 0.01), "address": order_id, "order_id": order_id})
+        routes.append({"id": f"route-{index}", "vehicle_id": f"vehicle-{index}", "status": "active", "route_points": {"points": points}})
+    return fleet, routes, open_orders, spread
+
+
+def apply_change(fleet, open_orders, spread, breakdowns, delays, urgent, seed):
+    rng = random.Random(seed + 1)
+    for vehicle in rng.sample(fleet, breakdowns):
+        vehicle["status"] = "maintenance"
+    earlier = (datetime.utcnow() - timedelta(minutes=10)).isoformat()
+    for order_id in rng.sample(sorted(open_orders), delays):
+        open_orders[order_id]["estimated_delivery_time"] = earlier
+    return [
+        {"id": f"urgent-{index}", "status": "pending", "priority": "high", "items": "Widgets: 30",
+         "lat": CENTER[0] + rng.uniform(-spread, spread), "lng": CENTER[1] + rng.uniform(-spread, spread)}
+        for index in range(urgent)
+    ]
+
+
+def violations(planner, result, fleet, open_orders, pending) -> int:
+    demand = {order_id: order_demand(order) for order_id, order in {**open_orders, **{o["id"]: o for o in pending}}.items()}
+    capacity = {vehicle["id"]: vehicle["capacity"] for vehicle in fleet}
+    placed = {}
+    problems = 0
+    for state in planner._routes.values():
+        open_ids = [stop["order_id"] for stop in state.stops if stop["order_id"] in open_orders or stop["order_id"] in result.order_updates]
+        problems += sum(demand[order_id] for order_id in open_ids) > capacity[state.vehicle_id]
+        for order_id in open_ids:
+            problems += order_id in placed
+            placed[order_id] = state.route_id
+    problems += sum(1 for order_id in open_orders if order_id not in placed and order_id not in result.released)
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fleets", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--stops", type=int, default=8, help="open stops per route")
+    parser.add_argument("--breakdowns", type=int, default=3)
+    parser.add_argument("--delays", type=int, default=10)
+    parser.add_argument("--urgent", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'routes':>7} {'first cycle s':>13} {'resync ms':>9} {'detect ms':>9} {'replan ms':>9} {'touched':>7} {'moved':>5} {'released':>8} {'bad':>4}")
+    for size in args.fleets:
+        timings, resyncs, detects = [], [], []
+        for repeat in range(args.repeat):
+            fleet, routes, open_orders, spread = build_instance(size, args.stops, args.seed + repeat)
+            planner = IncrementalReplanner()
+            started = time.perf_counter()
+            planner.sync(routes)
+            planner.detect(fleet, open_orders, [])
+            first_sync = time.perf_counter() - started
+            # Later cycles read fresh rows from the database.
+            routes = copy.deepcopy(routes)
+            pending = apply_change(fleet, open_orders, spread, args.breakdowns, args.delays, args.urgent, args.seed + repeat)
+            started = time.perf_counter()
+            planner.sync(routes)
+            resyncs.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            events = planner.detect(fleet, open_orders, pending)
+            detects.append(time.perf_counter() - started)
+            result = planner.replan(events, fleet, open_orders, pending)
+            timings.append(result.seconds)
+        stats = result.stats()
+        print(
+            f"{size:>7} {first_sync:>13.3f} {statistics.median(resyncs) * 1000:>9.2f} {statistics.median(detects) * 1000:>9.2f} "
+            f"{statistics.median(timings) * 1000:>9.2f} {stats['routes_replanned']:>7} {stats['orders_moved']:>5} "
+            f"{stats['orders_released']:>8} {violations(planner, result, fleet, open_orders, pending):>4}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Measure vehicle double-booking with and without transactional route commits.
+
+Several routing cycles read the same snapshot of available vehicles and pending
+orders, each plans its own one-order-per-vehicle assignments, and then they commit
+one after another, as overlapping cycles (or an LLM that reuses a vehicle) would. The
+unconditional writes of the old commit path are compared with the agent's
+transactional commit, which claims vehicles only while ``available``. Runs on a
+throw-away SQLite database and reports conflict rates, double-booked vehicles and
+commit time.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_route_commit --vehicles 200 --orders 400 --cycles 4
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+
+def _configure_environment() -> None:
+    # Must run before any ``app`` import: settings and the DB engine read these at import time.
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ.setdefault("GROQ_API_KEY", "mock")
+    os.environ.setdefault("ROUTING_ENGINE", "local")
+
+
+def seed(client, vehicles: int, orders: int, rng: random.Random) -> None:
+    client.table("fleet").insert([
+        {"vehicle_id": f"V-{index}", "vehicle_type": "van", "capacity": 1000, "status": "available",
+         "geo_lat": 40.7 + rng.uniform(-0.1, 0.1), "geo_lng": -74.0 + rng.uniform(-0.1, 0.1)}
+        for index in range(vehicles)
+    ]).execute()
+    client.table("orders").insert([
+        {"items": f"Widgets: {rng.randint(1, 50)}", "status": "pending",
+         "route": {"destination": {"lat": 40.7 + rng.uniform(-0.1, 0.1), "lng": -74.0 + rng.uniform(-0.1, 0.1)}}}
+        for _ in range(orders)
+    ]).execute()
+
+
+def plan_cycles(client, cycles: int, rng: random.Random):
+    """Every cycle plans from the same stale snapshot."""
+    fleet = client.table("fleet").select("*").eq("status", "available").execute().data
+    orders = client.table("orders").select("*").eq("status", "pending").execute().data
+    plans = []
+    for _ in range(cycles):
+        picked = rng.sample(orders, min(len(orders), len(fleet)))
+        plans.append([
+            {"order_id": order["id"], "vehicle_id": vehicle["id"]}
+            for order, vehicle in zip(picked, rng.sample(fleet, len(picked)))
+        ])
+    return plans
+
+
+def double_booked(client) -> int:
+    orders = client.table("orders").select("*").eq("status", "assigned").execute().data
+    return sum(1 for count in Counter(order["vehicle_id"] for order in orders).values() if count > 1)
+
+
+def naive_commit(client, assignments) -> None:
+    """The previous commit path: unconditional writes, one statement at a time."""
+    for assignment in assignments:
+        client.table("orders").update({"vehicle_id": assignment["vehicle_id"], "status": "assigned"}).eq("id", assignment["order_id"]).execute()
+        client.table("fleet").update({"status": "assigned"}).eq("id", assignment["vehicle_id"]).execute()
+
+
+def reset(client) -> None:
+    client.table("orders").update({"vehicle_id": None, "status": "pending"}).execute()
+    client.table("fleet").update({"status": "available"}).execute()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=400)
+    parser.add_argument("--cycles", type=int, default=4, help="overlapping cycles planning from one snapshot")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    _configure_environment()
+    from app.agents.routing_agent import RoutingAgent
+    from app.core.supabase import get_supabase_client
+    from app.db.init_db import init_db
+    from app.services.route_commit import commit_stats
+
+    init_db()
+    client = get_supabase_client()
+    rng = random.Random(args.seed)
+    seed(client, args.vehicles, args.orders, rng)
+
+    plans = plan_cycles(client, args.cycles, random.Random(args.seed))
+    started = time.perf_counter()
+    for assignments in plans:
+        naive_commit(client, assignments)
+    naive_seconds = time.perf_counter() - started
+    naive_double = double_booked(client)
+    reset(client)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = RoutingAgent()
+    plans = plan_cycles(client, args.cycles, random.Random(args.seed))
+    attempted = sum(len(assignments) for assignments in plans)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for assignments in plans:
+            asyncio.run(agent.execute_vehicle_assignments(assignments, resolve=False))
+    guarded_seconds = time.perf_counter() - started
+    stats = commit_stats.as_dict()["vehicle_assignments"]
+
+    print(f"{'mode':>12} {'attempted':>9} {'committed':>9} {'conflict rate':>13} {'double-booked':>13} {'ms/assign':>9}")
+    print(f"{'naive':>12} {attempted:>9} {attempted:>9} {'-':>13} {naive_double:>13} {naive_seconds / attempted * 1000:>9.2f}")
+    print(
+        f"{'transaction':>12} {attempted:>9} {stats['committed']:>9} {stats['conflict_rate']:>13.3f} "
+        f"{double_booked(client):>13} {guarded_seconds / attempted * 1000:>9.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
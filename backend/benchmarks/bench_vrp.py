@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark the local VRP solver (Clarke-Wright savings + 2-opt/Or-opt) on
+synthetic city instances from 100 to 10k stops.
+
+Stops are scattered around a few depots with random demand and priority; the
+fleet carries about 10% more than the total demand. Each run is checked for
+capacity and priority-order violations and compared with one out-and-back trip
+per stop.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_vrp --sizes 100 1000 10000
+"""
+import argparse
+import random
+import statistics
+
+from app.services.vrp_solver import Stop, VRPSolver, Vehicle
+
+DEPOTS = [(40.7128, -74.0060), (40.6782, -73.9442), (40.7831, -73.9712)]
+CAPACITIES = [800, 1200, 2000]
+
+
+def build_instance(size: int, seed: int):
+    rng = random.Random(seed)
+    stops = []
+    for index in range(size):
+        lat, lng = rng.choice(DEPOTS)
+        stops.append(Stop(
+            id=f"order-{index}",
+            lat=lat + rng.gauss(0, 0.05),
+            lng=lng + rng.gauss(0, 0.06),
+            demand=rng.randint(1, 60),
+            priority=rng.choices([0, 1, 2], weights=[1, 3, 2])[0],
+        ))
+    demand = sum(stop.demand for stop in stops)
+    vehicles = []
+    while sum(vehicle.capacity for vehicle in vehicles) < 1.1 * demand:
+        lat, lng = DEPOTS[len(vehicles) % len(DEPOTS)]
+        vehicles.append(Vehicle(
+            id=f"vehicle-{len(vehicles)}",
+            lat=lat + rng.uniform(-0.005, 0.005),
+            lng=lng + rng.uniform(-0.005, 0.005),
+            capacity=rng.choice(CAPACITIES),
+            vehicle_type="Cargo Van",
+        ))
+    return stops, vehicles
+
+
+def check(solution) -> dict:
+    capacity_violations = sum(1 for route in solution.routes if route.load > route.vehicle.capacity)
+    priority_violations = sum(
+        1
+        for route in solution.routes
+        for a, b in zip(route.stops, route.stops[1:])
+        if a.priority > b.priority
+    )
+    return {"capacity_violations": capacity_violations, "priority_violations": priority_violations}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    solver = VRPSolver()
+    print(f"{'stops':>7} {'vehicles':>8} {'routes':>6} {'routed':>7} {'p50 s':>8} {'km':>10} {'direct km':>11} {'saving':>7}  checks")
+    for size in args.sizes:
+        stops, vehicles = build_instance(size, args.seed)
+        timings = []
+        for _ in range(args.repeat):
+            solution = solver.solve(stops, vehicles)
+            timings.append(solution.seconds)
+        stats = solution.stats()
+        saving = 1 - stats["distance_km"] / stats["baseline_km"] if stats["baseline_km"] else 0.0
+        print(
+            f"{size:>7} {len(vehicles):>8} {stats['routes']:>6} {stats['stops_routed']:>7} "
+            f"{statistics.median(timings):>8.3f} {stats['distance_km']:>10.1f} {stats['baseline_km']:>11.1f} "
+            f"{saving:>7.1%}  {check(solution)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Offline OpenAI-compatible chat-completions server for load-testing the agents.
+
+Replies are generated from the JSON schema embedded in each request (the
+``response_format`` the inventory, routing and pricing agents send), so every
+answer parses and validates without touching Groq. Latency follows a
+configurable distribution, and 5xx / 429 responses can be injected.
+Structured output is honoured like the real API: ``response_format``
+``json_object`` replies with bare JSON and a forced tool call is answered with
+``tool_calls`` built from the function's parameter schema. ``--no-structured``
+rejects both with a 400 to exercise the scraping fallback. Replies longer than
+``max_tokens`` are cut off with ``finish_reason == "length"``.
+
+Usage (from the backend directory):
+    python -m benchmarks.mock_llm_server --port 8001 --latency lognormal:-1.5,0.5 --rate-limit-rate 0.05
+    GROQ_BASE_URL=http://127.0.0.1:8001 GROQ_API_KEY=mock uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from app.ai.rate_limiter import TokenBucket
+
+ALIAS_TOKEN = re.compile(r"\b([IOVMRX])(\d+)\b")
+UUID_TOKEN = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b")
+# Which alias prefix an identifier field should draw from.
+ID_FIELD_PREFIXES = {
+    "item_id": "I",
+    "target_items": "I",
+    "order_id": "O",
+    "assigned_orders": "O",
+    "vehicle_id": "V",
+    "merchant_id": "M",
+}
+
+
+class LatencyModel:
+    """Parse and sample ``fixed:S``, ``uniform:LO,HI``, ``normal:MU,SIGMA`` or ``lognormal:MU,SIGMA``."""
+
+    def __init__(self, spec: str):
+        kind, _, raw = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in raw.split(",") if value]
+        if kind not in {"fixed", "uniform", "normal", "lognormal"}:
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return random.uniform(*self.params[:2])
+        if self.kind == "normal":
+            return max(0.0, random.gauss(*self.params[:2]))
+        return random.lognormvariate(*self.params[:2])
+
+
+def find_schema(messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Locate the response schema embedded in the prompt (system or user message)."""
+    decoder = json.JSONDecoder()
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, str):
+            continue
+        for match in re.finditer(r"\{", content):
+            try:
+                candidate, _ = decoder.raw_decode(content, match.start())
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(candidate, dict):
+                continue
+            if isinstance(candidate.get("response_schema"), dict):
+                return candidate["response_schema"]
+            if candidate.get("type") == "object" and "properties" in candidate:
+                return candidate
+    return None
+
+
+class SchemaFaker:
+    """Generate a value conforming to a (small) JSON schema subset."""
+
+    def __init__(self, prompt_text: str, max_items: int = 3):
+        self.max_items = max_items
+        self.ids: Dict[str, List[str]] = {}
+        for prefix, number in ALIAS_TOKEN.findall(prompt_text):
+            self.ids.setdefault(prefix, [])
+            token = f"{prefix}{number}"
+            if token not in self.ids[prefix]:
+                self.ids[prefix].append(token)
+        self.uuids = sorted(set(UUID_TOKEN.findall(prompt_text)))
+
+    def identifier(self, field: str) -> str:
+        pool = self.ids.get(ID_FIELD_PREFIXES.get(field, ""), []) or self.uuids
+        return random.choice(pool) if pool else f"{field}-{random.randint(1, 999)}"
+
+    def value(self, schema: Dict[str, Any], field: str = "") -> Any:
+        if "enum" in schema:
+            return random.choice(schema["enum"])
+        kind = schema.get("type", "string")
+        if kind == "object":
+            return {
+                name: self.value(sub_schema, name)
+                for name, sub_schema in (schema.get("properties") or {}).items()
+            }
+        if kind == "array":
+            items = schema.get("items") or {"type": "string"}
+            count = random.randint(1, self.max_items)
+            if field in ID_FIELD_PREFIXES:
+                return [self.identifier(field) for _ in range(count)]
+            return [self.value(items, field) for _ in range(count)]
+        if kind == "integer":
+            return random.randint(1, 200)
+        if kind == "number":
+            return round(random.uniform(1, 500), 2)
+        if kind == "boolean":
+            return random.random() < 0.5
+        if field in ID_FIELD_PREFIXES:
+            return self.identifier(field)
+        return f"mock {field or 'value'}"
+
+
+class MockLLMServer:
+    def __init__(
+        self,
+        latency: LatencyModel,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        requests_per_minute: Optional[int] = None,
+        max_items: int = 3,
+        structured: bool = True,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.quota = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.max_items = max_items
+        self.structured = structured
+        self.counters = {
+            "requests": 0,
+            "completions": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "json_mode": 0,
+            "tool_calls": 0,
+            "unsupported": 0,
+            "truncated": 0,
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_post("/{tail:.*chat/completions}", self.handle_completion)
+        return app
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.counters)
+
+    def _rate_limited(self) -> web.Response:
+        self.counters["rate_limited"] += 1
+        return web.json_response(
+            {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+            status=429,
+            headers={"retry-after": f"{self.retry_after:g}"},
+        )
+
+    async def handle_completion(self, request: web.Request) -> web.Response:
+        self.counters["requests"] += 1
+        body = await request.json()
+        messages = body.get("messages") or []
+
+        if self.quota is not None:
+            if self.quota.wait_time(1) > 0:
+                return self._rate_limited()
+            self.quota.take(1)
+        if random.random() < self.rate_limit_rate:
+            return self._rate_limited()
+
+        tools = body.get("tools") or []
+        if not self.structured and (tools or body.get("response_format")):
+            self.counters["unsupported"] += 1
+            return web.json_response(
+                {"error": {"message": "response_format and tools are not supported (mock)", "type": "invalid_request_error"}},
+                status=400,
+            )
+
+        await asyncio.sleep(self.latency.sample())
+        if random.random() < self.error_rate:
+            self.counters["errors"] += 1
+            return web.json_response({"error": {"message": "Injected failure (mock)"}}, status=500)
+
+        prompt_text = "\n".join(str(message.get("content", "")) for message in messages)
+        tool = tools[0]["function"] if tools and body.get("tool_choice") else None
+        schema = (tool or {}).get("parameters") or find_schema(messages)
+        schema = schema or {"type": "object", "properties": {"status": {"type": "string"}}}
+        content = json.dumps(SchemaFaker(prompt_text, self.max_items).value(schema))
+        finish_reason = "tool_calls" if tool else "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and len(content) // 4 > max_tokens:
+            # Cut the reply at the budget like a real model would.
+            self.counters["truncated"] += 1
+            content = content[: max_tokens * 4]
+            finish_reason = "length"
+        message: Dict[str, Any] = {"role": "assistant", "content": content}
+        if tool:
+            self.counters["tool_calls"] += 1
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_mock_{self.counters['requests']}",
+                        "type": "function",
+                        "function": {"name": tool.get("name"), "arguments": content},
+                    }
+                ],
+            }
+        elif (body.get("response_format") or {}).get("type") == "json_object":
+            self.counters["json_mode"] += 1
+
+        prompt_tokens = len(prompt_text) // 4
+        completion_tokens = len(content) // 4
+        self.counters["completions"] += 1
+        return web.json_response(
+            {
+                "id": f"chatcmpl-mock-{self.counters['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": finish_reason,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+
+async def start_mock_server(server: MockLLMServer, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", default="fixed:0.05", help="fixed:S | uniform:LO,HI | normal:MU,SIGMA | lognormal:MU,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--rpm", type=int, default=None, help="enforce a requests-per-minute quota with 429s")
+    parser.add_argument("--max-items", type=int, default=3, help="maximum array length in generated replies")
+    parser.add_argument("--no-structured", action="store_true", help="reject response_format/tools with 400")
+
+
+def server_from_args(args: argparse.Namespace) -> MockLLMServer:
+    return MockLLMServer(
+        LatencyModel(args.latency),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        requests_per_minute=args.rpm,
+        max_items=args.max_items,
+        structured=not args.no_structured,
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    runner = await start_mock_server(server_from_args(args), args.host, args.port)
+    print(f"🧪 Mock LLM server listening on http://{args.host}:{args.port} (GET /stats for counters)")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass